@@ -0,0 +1,308 @@
+# Send path benchmark against a local fake SES (py_basic_ses.transports.FakeSESServer), no AWS account needed.
+#
+# Every scenario runs in its own interpreter, so peak RSS is per scenario and one scenario's warm caches don't
+# flatter the next. Reports messages/second, p50/p95/p99 latency per message, and peak RSS.
+#
+#   construct            SESSender construction + build_payload(), no sending
+#   validate             construction + ses_validate() against a credentials file
+#   client_per_message   a new boto3 client for every message (what every send did before clients were shared)
+#   pooled_client        one shared, pooled client for every message
+#   threads_<n>          send_many() with n worker threads
+#   asyncio_<n>          send_many_async() with concurrency n
+#   large_html           1 MB HTML body per message
+#   large_attachment     5 MB attachment per message, sent with SendRawEmail
+#
+# Save a run with --output and compare a later run against it with --baseline. The benchmark exits 1 if any
+# scenario's throughput drops, or its p95 latency grows, by more than --max-regression. It also exits 1 if a
+# higher concurrency isn't faster than the lowest one (threads_32 vs threads_1), since then the fan-out numbers
+# measure the test setup rather than the library.
+#
+# usage: python benchmarks/send_path.py [--messages 1000] [--latency-ms 10] [--concurrency 1 8 32]
+#                                       [--scenarios ...] [--output run.json] [--baseline run.json] [--max-regression 0.25]
+
+import argparse, asyncio, io, json, os, subprocess, sys, tempfile, time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+FROM_ADDRESS = "sender@example.com"
+AWS_REGION = "us-west-2"
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    if resource == None:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def _timed_classes():
+    from py_basic_ses.emailing import SESSender
+    from py_basic_ses.attachments import RawSESSender
+
+    class _Timed:
+        # records how long each send_email_result() takes in self.latencies
+        def send_email_result(self):
+            start = time.perf_counter()
+            try:
+                return super().send_email_result()
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    class TimedSESSender(_Timed, SESSender):
+        pass
+
+    class TimedRawSESSender(_Timed, RawSESSender):
+        pass
+
+    return TimedSESSender, TimedRawSESSender
+
+
+def _message(index: int, **kwargs) -> dict:
+    options = {"sendto": f"user{index}@example.com", "fromaddr": FROM_ADDRESS, "message_txt": f"message number {index}",
+               "aws_region": AWS_REGION, "msgsubject": "benchmark"}
+    options.update(kwargs)
+    return options
+
+
+def _senders(sender_class, count: int, latencies: list, **kwargs):
+    for index in range(count):
+        sender = sender_class(**_message(index, **kwargs))
+        sender.latencies = latencies
+        yield sender
+
+
+def _send_sequential(senders) -> int:
+    errors = 0
+    for sender in senders:
+        try:
+            sender.send_email_result()
+        except Exception:
+            errors += 1
+    return errors
+
+
+def run_scenario(name: str, args) -> dict:
+    # runs in the child interpreter, returns the scenario's measurements
+    from py_basic_ses.clients import SESClientRegistry
+    from py_basic_ses.emailing import SESSender
+    from py_basic_ses.transports import FakeSESServer, FakeSESTransport
+    TimedSESSender, TimedRawSESSender = _timed_classes()
+
+    latencies = []
+    errors = 0
+    server = None
+    sequential_count = max(20, args.messages // 10)
+
+    if name in ("construct", "validate"):
+        count = args.messages * 10
+        start = time.perf_counter()
+        for index in range(count):
+            message_start = time.perf_counter()
+            sender = SESSender(**_message(index))
+            if name == "validate":
+                sender.ses_validate()
+            sender.build_payload()
+            latencies.append(time.perf_counter() - message_start)
+        elapsed = time.perf_counter() - start
+
+    else:
+        server = FakeSESServer(FakeSESTransport(latency=args.latency_ms / 1000, keep_messages=0)).start()
+        registry = SESClientRegistry(max_pool_connections=max(args.concurrency + [10]), endpoint_url=server.url)
+
+        if name == "client_per_message":
+            count = sequential_count
+            start = time.perf_counter()
+            for sender in _senders(TimedSESSender, count, latencies):
+                sender.client_registry = SESClientRegistry(endpoint_url=server.url)
+                errors += _send_sequential([sender])
+                sender.client_registry.close()
+            elapsed = time.perf_counter() - start
+
+        elif name == "pooled_client":
+            count = sequential_count
+            start = time.perf_counter()
+            errors = _send_sequential(_senders(TimedSESSender, count, latencies, client_registry=registry))
+            elapsed = time.perf_counter() - start
+
+        elif name.startswith("threads_"):
+            from py_basic_ses.bulk import send_many
+            count = args.messages
+            start = time.perf_counter()
+            results = send_many(_senders(TimedSESSender, count, latencies, client_registry=registry), max_workers=int(name.split("_")[1]))
+            errors = sum(1 for result in results if not result.ok)
+            elapsed = time.perf_counter() - start
+
+        elif name.startswith("asyncio_"):
+            from py_basic_ses.aio import send_many_async
+            count = args.messages
+            concurrency = int(name.split("_")[1])
+            start = time.perf_counter()
+            results = asyncio.run(send_many_async(list(_senders(TimedSESSender, count, latencies, client_registry=registry)), concurrency=concurrency))
+            errors = sum(1 for result in results if not result.ok)
+            elapsed = time.perf_counter() - start
+
+        elif name == "large_html":
+            count = sequential_count
+            html = "<p>" + "x" * (1024 * 1024) + "</p>"
+            start = time.perf_counter()
+            errors = _send_sequential(_senders(TimedSESSender, count, latencies, client_registry=registry, message_html=html))
+            elapsed = time.perf_counter() - start
+
+        elif name == "large_attachment":
+            count = max(10, args.messages // 50)
+            data = os.urandom(5 * 1024 * 1024)
+            start = time.perf_counter()
+            senders = (
+                TimedRawSESSender(**_message(index, client_registry=registry, attachments=[io.BytesIO(data)]))
+                for index in range(count)
+            )
+
+            def with_latencies(senders):
+                for sender in senders:
+                    sender.latencies = latencies
+                    yield sender
+
+            errors = _send_sequential(with_latencies(senders))
+            elapsed = time.perf_counter() - start
+
+        else:
+            raise ValueError(f"unknown scenario {name}")
+
+        registry.close()
+        server.stop()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "messages": count,
+        "errors": errors,
+        "seconds": elapsed,
+        "msgs_per_sec": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_in_child(name: str, args, home: str) -> dict:
+    # a fresh interpreter per scenario, with a throwaway home directory holding fake credentials
+    env = dict(os.environ, HOME=home, USERPROFILE=home)
+    env.pop("AWS_ACCESS_KEY_ID", None)
+    env.pop("AWS_SECRET_ACCESS_KEY", None)
+    env.pop("AWS_PROFILE", None)
+    command = [sys.executable, os.path.abspath(__file__), "--run-scenario", name, "--messages", str(args.messages),
+               "--latency-ms", str(args.latency_ms), "--concurrency"] + [str(level) for level in args.concurrency]
+    completed = subprocess.run(command, capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        raise RuntimeError(f"scenario {name} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def compare(results: list, baseline: list, max_regression: float) -> list:
+    # return a description of every scenario that got worse than the baseline by more than max_regression
+    baseline_by_name = {result["scenario"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline_by_name.get(result["scenario"])
+        if before == None:
+            continue
+        if result["msgs_per_sec"] < before["msgs_per_sec"] * (1 - max_regression):
+            regressions.append(f"{result['scenario']}: {result['msgs_per_sec']:.1f} msgs/sec, was {before['msgs_per_sec']:.1f}")
+        if result["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{result['scenario']}: p95 {result['p95_ms']:.2f} ms, was {before['p95_ms']:.2f}")
+    return regressions
+
+
+def fan_out_problems(results: list) -> list:
+    # More threads (or more concurrent tasks) against a fixed per call latency has to be faster. When
+    # threads_<n> isn't faster than the lowest concurrency measured, something other than the library
+    # (like the fake server's accept queue) is the bottleneck, and the fan-out numbers can't be trusted.
+    problems = []
+    for prefix in ("threads_", "asyncio_"):
+        runs = sorted((int(result["scenario"][len(prefix):]), result) for result in results if result["scenario"].startswith(prefix))
+        if len(runs) < 2:
+            continue
+        lowest_level, lowest = runs[0]
+        for level, result in runs[1:]:
+            if result["msgs_per_sec"] <= lowest["msgs_per_sec"]:
+                problems.append(f"{result['scenario']}: {result['msgs_per_sec']:.1f} msgs/sec, not faster than "
+                                f"{lowest['scenario']} at {lowest['msgs_per_sec']:.1f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="py-basic-ses send path benchmark")
+    parser.add_argument("--messages", type=int, default=1000, help="messages per fan-out scenario, others scale from this")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="latency of the fake SES per call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--scenarios", nargs="+", default=None)
+    parser.add_argument("--output", default=None, help="save the results as json")
+    parser.add_argument("--baseline", default=None, help="results json from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--run-scenario", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario != None:
+        print(json.dumps(run_scenario(args.run_scenario, args)))
+        return
+
+    scenarios = args.scenarios
+    if scenarios == None:
+        scenarios = ["construct", "validate", "client_per_message", "pooled_client"]
+        scenarios += [f"threads_{level}" for level in args.concurrency]
+        scenarios += [f"asyncio_{level}" for level in args.concurrency]
+        scenarios += ["large_html", "large_attachment"]
+
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        os.makedirs(os.path.join(home, ".aws"))
+        with open(os.path.join(home, ".aws", "credentials"), "w") as cred_file:
+            cred_file.write("[default]\naws_access_key_id = fakekey\naws_secret_access_key = fakesecret\n")
+
+        print(f"{'scenario':<20} {'messages':>8} {'errors':>6} {'msgs/sec':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>8}")
+        for name in scenarios:
+            result = run_in_child(name, args, home)
+            results.append(result)
+            peak = "n/a" if result["peak_rss_mb"] == None else f"{result['peak_rss_mb']:.1f}"
+            print(f"{name:<20} {result['messages']:>8} {result['errors']:>6} {result['msgs_per_sec']:>10.1f} {result['p50_ms']:>8.2f} "
+                  f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {peak:>8}")
+
+    if args.output != None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    failed = any(result["errors"] for result in results)
+    if failed:
+        print("FAIL: some sends returned errors")
+
+    problems = fan_out_problems(results)
+    for problem in problems:
+        print(f"SANITY: {problem}")
+    failed = failed or bool(problems)
+
+    if args.baseline != None:
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        failed = failed or bool(regressions)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
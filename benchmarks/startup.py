@@ -0,0 +1,65 @@
+# Cold start benchmark for the send-test and send-email console scripts.
+#
+# Runs `python -X importtime -c "import py_basic_ses.entry"` in fresh interpreters and reports the
+# cumulative import time of py_basic_ses.entry, plus the wall time of `send-email --help`.
+# Exits 1 if the median import time is over the threshold or if boto3/botocore get imported,
+# so a change that pulls heavy imports back onto the startup path shows up right away.
+#
+# usage: python benchmarks/startup.py [--runs 10] [--threshold-ms 150]
+
+import argparse, os, re, statistics, subprocess, sys, time
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(\S.*)$")
+
+
+def entry_import_time_us() -> int:
+    # cumulative microseconds spent importing py_basic_ses.entry in a fresh interpreter
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import py_basic_ses.entry"],
+                               capture_output=True, text=True, check=True)
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and match.group(2).strip() == "py_basic_ses.entry":
+            return int(match.group(1))
+    raise RuntimeError("py_basic_ses.entry not found in -X importtime output")
+
+
+def heavy_modules_imported() -> list:
+    # heavy modules that importing py_basic_ses.entry drags in, should be empty
+    code = "import sys, py_basic_ses.entry; print(' '.join(m for m in ('boto3', 'botocore') if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def help_wall_time_s() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "from py_basic_ses.entry import send_email; send_email(['--help'])"],
+                   capture_output=True, check=False)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="py-basic-ses CLI cold start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--threshold-ms", type=float, default=float(os.environ.get("PY_BASIC_SES_STARTUP_THRESHOLD_MS", 150)))
+    args = parser.parse_args()
+
+    import_times_ms = sorted(entry_import_time_us() / 1000 for i in range(args.runs))
+    help_times_ms = sorted(help_wall_time_s() * 1000 for i in range(args.runs))
+    heavy_modules = heavy_modules_imported()
+
+    print(f"import py_basic_ses.entry: median {statistics.median(import_times_ms):.1f} ms, min {import_times_ms[0]:.1f} ms, max {import_times_ms[-1]:.1f} ms")
+    print(f"send-email --help wall time: median {statistics.median(help_times_ms):.1f} ms, min {help_times_ms[0]:.1f} ms, max {help_times_ms[-1]:.1f} ms")
+
+    failed = False
+    if heavy_modules:
+        print(f"FAIL: importing py_basic_ses.entry also imports {', '.join(heavy_modules)}")
+        failed = True
+    if statistics.median(import_times_ms) > args.threshold_ms:
+        print(f"FAIL: median import time is over the {args.threshold_ms} ms threshold")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,8 @@ setup(
     packages=['py_basic_ses'],
     package_dir={'':'src'},
     entry_points = { 'console_scripts' : ['send-test=py_basic_ses.entry:send_test_email',
-                    'send-email=py_basic_ses.entry:send_email']},
+                    'send-email=py_basic_ses.entry:send_email',
+                    'ses-relay=py_basic_ses.entry:ses_relay']},
     install_requires=[
         'boto3>=1.17',
         'click'    
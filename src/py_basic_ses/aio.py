@@ -0,0 +1,86 @@
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.bulk import _send_one
+from py_basic_ses.clients import DEFAULT_MAX_POOL_CONNECTIONS
+from py_basic_ses.results import SendResult
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, threading
+
+# Number of threads in the executor the async helpers hand blocking boto3 calls to.
+# boto3 has no native asyncio support, so the SES round trip runs on this dedicated executor
+# instead of the event loop's default one, where it could starve other blocking work.
+DEFAULT_ASYNC_WORKERS = DEFAULT_MAX_POOL_CONNECTIONS
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # create the shared executor on first use
+    global _executor, _executor_workers
+    if _executor == None:
+        with _executor_lock:
+            if _executor == None:
+                _executor = ThreadPoolExecutor(max_workers=DEFAULT_ASYNC_WORKERS, thread_name_prefix="py-basic-ses")
+                _executor_workers = DEFAULT_ASYNC_WORKERS
+    return _executor
+
+
+def configure_executor(max_workers: int):
+    # replace the shared executor with one that has max_workers threads
+    global _executor, _executor_workers
+    with _executor_lock:
+        old_executor = _executor
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="py-basic-ses")
+        _executor_workers = max_workers
+
+    if old_executor != None:
+        old_executor.shutdown(wait=False)
+
+
+def shutdown_executor(wait: bool = True):
+    global _executor
+    with _executor_lock:
+        old_executor = _executor
+        _executor = None
+
+    if old_executor != None:
+        old_executor.shutdown(wait=wait)
+
+
+class AsyncSESSender(SESSender):
+    # SESSender that can be awaited from an event loop. The payload is built by SESSender.build_payload(),
+    # so async and sync sends produce identical requests.
+
+    async def send_email_async(self) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), self.send_email)
+
+
+async def send_many_async(messages, concurrency: int = 10) -> list:
+    # Send every message concurrently and return a list of SendResult objects in input order.
+    # messages can be SESSender objects or dicts of SESSender keyword arguments. No more than
+    # concurrency sends are in flight at once. Errors are returned in the results, never raised,
+    # so a single bad message does not cancel the rest of the batch.
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    # the shared executor would quietly cap the sends in flight at its thread count,
+    # so a higher concurrency gets an executor of its own for this call
+    own_executor = None
+    if concurrency > _executor_workers:
+        executor = own_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="py-basic-ses")
+    semaphore = asyncio.Semaphore(concurrency)
+    max_pool_connections = max(concurrency, DEFAULT_MAX_POOL_CONNECTIONS)
+
+    async def send_bounded(index: int, message) -> SendResult:
+        async with semaphore:
+            return await loop.run_in_executor(executor, _send_one, index, message, max_pool_connections)
+
+    try:
+        return await asyncio.gather(*(send_bounded(index, message) for index, message in enumerate(messages)))
+    finally:
+        if own_executor != None:
+            own_executor.shutdown(wait=False)
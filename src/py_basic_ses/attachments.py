@@ -0,0 +1,268 @@
+from py_basic_ses.emailing import SESSender, _address_list
+from py_basic_ses.dedup import message_key
+from py_basic_ses.exceptions import MessageSizeError
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid, encode_rfc2231, parseaddr
+import base64, hashlib, mimetypes, os, uuid
+
+# SES rejects raw messages bigger than 10 MB, after MIME encoding
+MAX_RAW_MESSAGE_SIZE = 10 * 1024 * 1024
+
+# read attachments 57 KiB at a time, a multiple of 57 bytes so every chunk encodes to complete 76 character base64 lines
+_READ_CHUNK_SIZE = 57 * 1024
+
+
+class Attachment:
+    # A file to attach. source is a path or a binary file-like object. filename is the name the
+    # recipient sees, it defaults to the file's name. content_type is guessed from filename when not given.
+    def __init__(self, source, filename: str = None, content_type: str = None):
+        self.source = source
+        # remember where a file object starts, so it can be read again when a message is split into several sends
+        self._start = None
+        if not isinstance(source, (str, os.PathLike)) and hasattr(source, "seekable") and source.seekable():
+            self._start = source.tell()
+        # set once a file object that can't be rewound has been read, a second read would silently get nothing
+        self._used = False
+        if filename == None:
+            if isinstance(source, (str, os.PathLike)):
+                filename = os.path.basename(source)
+            else:
+                filename = os.path.basename(getattr(source, "name", "attachment"))
+        self.filename = filename
+
+        if content_type == None:
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        self.content_type = content_type
+
+
+    def size_hint(self) -> int:
+        # size of the file in bytes if we can tell without reading it, otherwise None
+        if isinstance(self.source, (str, os.PathLike)):
+            return os.path.getsize(self.source)
+        return None
+
+
+    @property
+    def rereadable(self) -> bool:
+        # a path or a seekable file object can be read more than once
+        return isinstance(self.source, (str, os.PathLike)) or self._start != None
+
+
+    def content_key(self):
+        # Something that changes when the content does, for the default dedup key: a sha256 of the bytes, read in
+        # chunks from a path or a seekable file object (which is rewound afterwards).
+        # None for a file object that can't be rewound, its content can't be looked at without using it up.
+        if not self.rereadable:
+            return None
+        digest = hashlib.sha256()
+        with self.open() as attachment_file:
+            while True:
+                data = attachment_file.read(_READ_CHUNK_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+        if self._start != None:
+            self.source.seek(self._start)
+        return digest.hexdigest()
+
+
+    def open(self):
+        if isinstance(self.source, (str, os.PathLike)):
+            return open(self.source, "rb")
+        if self._start != None:
+            self.source.seek(self._start)
+        elif self._used:
+            raise ValueError(f"attachment {self.filename} was already read and can't be rewound")
+        else:
+            self._used = True
+        return _NoCloseFile(self.source)
+
+
+class _NoCloseFile:
+    # wraps a caller's file object so our with block doesn't close it
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def __enter__(self):
+        return self.fileobj
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+def _encode_address(address: str) -> str:
+    # "Name <address>" with a display name outside ASCII encoded the same way the From name is, headers must be ascii
+    return formataddr(parseaddr(address), charset='utf-8')
+
+
+def _encode_header(value: str) -> str:
+    # headers must be ascii, anything else is sent as an RFC 2047 encoded word
+    if value.isascii():
+        return value
+    return Header(value, "utf-8").encode()
+
+
+def _encoded_size(raw_size: int) -> int:
+    # bytes needed to base64 encode raw_size bytes in 76 character lines ending in \r\n
+    encoded = ((raw_size + 2) // 3) * 4
+    return encoded + 2 * ((encoded + 75) // 76)
+
+
+def _write_base64(message: bytearray, data: bytes):
+    # append data to message as base64 in 76 character lines
+    encoded = base64.b64encode(data)
+    for start in range(0, len(encoded), 76):
+        message += encoded[start:start + 76]
+        message += b"\r\n"
+
+
+class RawSESSender(SESSender):
+    # SESSender that sends a raw MIME message with the SES SendRawEmail API, so files can be attached.
+    # The message is written straight into one growing buffer, and attachments are read and base64
+    # encoded a chunk at a time, so peak memory stays close to one copy of the finished message.
+    api_operation = 'send_raw_email'
+
+    def __init__(self, *args, attachments: list = None, max_message_size: int = MAX_RAW_MESSAGE_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        # attachments can be Attachment objects, paths, or binary file-like objects
+        self.attachments = []
+        for attachment in attachments or []:
+            if not isinstance(attachment, Attachment):
+                attachment = Attachment(attachment)
+            self.attachments.append(attachment)
+        self.max_message_size = max_message_size
+        # fail now rather than at send time, see dedup_key()
+        if self.dedup_cache != None and self.idempotency_key == None:
+            for attachment in self.attachments:
+                if not attachment.rereadable:
+                    raise ValueError(f"attachment {attachment.filename} can't be read twice, pass an idempotency_key to use a dedup_cache")
+
+
+    def dedup_key(self) -> str:
+        # the default key covers the attachments by name, type, and content (see Attachment.content_key()).
+        # A file object that can't be rewound can't be covered, so it needs an explicit idempotency_key.
+        if self.idempotency_key != None:
+            return self.idempotency_key
+        attachment_parts = []
+        for attachment in self.attachments:
+            content_key = attachment.content_key()
+            if content_key == None:
+                raise ValueError(f"attachment {attachment.filename} can't be read twice, pass an idempotency_key to use a dedup_cache")
+            attachment_parts.append((attachment.filename, attachment.content_type, content_key))
+        return message_key(super().dedup_key(), attachment_parts)
+
+
+    def recipient_chunks(self, to: list = None, cc: list = None, bcc: list = None) -> list:
+        # every chunk is a separate send with its own copy of the attachments, so they must be readable more than once
+        chunks = super().recipient_chunks(to, cc, bcc)
+        if len(chunks) > 1:
+            for attachment in self.attachments:
+                if not attachment.rereadable:
+                    error = ValueError(f"attachment {attachment.filename} can't be read again for each of the {len(chunks)} sends "
+                                       f"this message needs, pass a path or a seekable file object")
+                    error.attempts = 0
+                    raise error
+        return chunks
+
+
+    def to_dict(self) -> dict:
+        # attachments can be open file objects, which can't be turned into plain data
+        raise TypeError("RawSESSender messages can't be converted to a dict")
+
+
+    def _check_size(self, size: int):
+        if size > self.max_message_size:
+            raise MessageSizeError(f'raw message is larger than the {self.max_message_size} byte limit')
+
+
+    def build_raw_message(self, to: list = None, cc: list = None) -> bytearray:
+        # to and cc are the addresses for the To and Cc headers, they default to every To and CC recipient.
+        # BCC recipients are never written into the message, they only go in the SES Destinations list.
+        if to == None and cc == None:
+            to = _address_list(self.sendto)
+            cc = _address_list(self.cc)
+
+        # Fail before reading anything if the attachments we can measure are already too big
+        known_size = sum(_encoded_size(attachment.size_hint() or 0) for attachment in self.attachments)
+        self._check_size(known_size)
+
+        # subject and bodies are worked out from the EmailMessage, the same way SESSender.build_payload() does it
+        email_message = self.message()
+
+        message = bytearray()
+        mixed_boundary = "mixed-" + uuid.uuid4().hex
+        alternative_boundary = "alt-" + uuid.uuid4().hex
+
+        def write(text: str):
+            message.extend(text.encode("ascii"))
+
+        # ---- top level headers ----
+        if self.fromname == None or self.fromname == "":
+            write(f"From: {self.fromaddr}\r\n")
+        else:
+            write(f"From: {formataddr((self.fromname, self.fromaddr), charset='utf-8')}\r\n")
+        if to:
+            write(f"To: {', '.join(_encode_address(address) for address in to)}\r\n")
+        if cc:
+            write(f"Cc: {', '.join(_encode_address(address) for address in cc)}\r\n")
+        write(f"Subject: {_encode_header(email_message.subject)}\r\n")
+        write(f"Date: {formatdate(localtime=True)}\r\n")
+        write(f"Message-ID: {make_msgid()}\r\n")
+        write("MIME-Version: 1.0\r\n")
+        write(f'Content-Type: multipart/mixed; boundary="{mixed_boundary}"\r\n\r\n')
+
+        # ---- text and html bodies ----
+        write(f"--{mixed_boundary}\r\n")
+        write(f'Content-Type: multipart/alternative; boundary="{alternative_boundary}"\r\n\r\n')
+        for subtype, body in (("plain", email_message.message_txt), ("html", email_message.html_body)):
+            write(f"--{alternative_boundary}\r\n")
+            write(f'Content-Type: text/{subtype}; charset="{self.CHARSET}"\r\n')
+            write("Content-Transfer-Encoding: base64\r\n\r\n")
+            _write_base64(message, body.encode(self.CHARSET))
+            self._check_size(len(message) + known_size)
+        write(f"--{alternative_boundary}--\r\n")
+
+        # ---- attachments ----
+        for attachment in self.attachments:
+            if attachment.filename.isascii():
+                filename_param = f'filename="{attachment.filename}"'
+            else:
+                filename_param = f"filename*={encode_rfc2231(attachment.filename, 'utf-8')}"
+            write(f"--{mixed_boundary}\r\n")
+            write(f"Content-Type: {attachment.content_type}\r\n")
+            write(f"Content-Disposition: attachment; {filename_param}\r\n")
+            write("Content-Transfer-Encoding: base64\r\n\r\n")
+
+            # this attachment is now being written, stop counting its estimate
+            known_size -= _encoded_size(attachment.size_hint() or 0)
+            with attachment.open() as fileobj:
+                while True:
+                    chunk = fileobj.read(_READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    _write_base64(message, chunk)
+                    self._check_size(len(message) + known_size)
+
+        write(f"--{mixed_boundary}--\r\n")
+        self._check_size(len(message))
+
+        return message
+
+
+    def build_payload(self, to: list = None, cc: list = None, bcc: list = None) -> dict:
+        # Build the keyword arguments for the SES SendRawEmail API call.
+        # The bytearray is handed to boto3 as is, so the message is never copied into a bytes object.
+        if to == None and cc == None and bcc == None:
+            to = _address_list(self.sendto)
+            cc = _address_list(self.cc)
+            bcc = _address_list(self.bcc)
+
+        raw_message = self.build_raw_message(to, cc)
+        return {
+            'Source': self.SENDER,
+            'Destinations': [_encode_address(address) for address in to + cc + bcc],
+            'RawMessage': {
+                'Data': raw_message,
+            },
+            **self.request_options(),
+        }
@@ -0,0 +1,75 @@
+import csv, json
+
+# record field names match the send-email command line options, and map to SESSender arguments
+FIELD_TO_ARGUMENT = {
+    "to": "sendto",
+    "fromaddr": "fromaddr",
+    "awsregion": "aws_region",
+    "message_txt": "message_txt",
+    "message_html": "message_html",
+    "subject": "msgsubject",
+    "fromname": "fromname",
+    "cc": "cc",
+    "bcc": "bcc",
+}
+
+REQUIRED_FIELDS = ("to", "fromaddr", "awsregion", "message_txt")
+
+
+class MalformedRecord:
+    # a batch input row that could not be turned into a message
+    def __init__(self, line: int, error: str):
+        self.line = line
+        self.error = error
+
+
+def _record_to_message(record, defaults: dict) -> dict:
+    # merge a record over the defaults and convert it to SESSender keyword arguments, raises ValueError if it's unusable
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+
+    unknown_fields = [field for field in record if field not in FIELD_TO_ARGUMENT]
+    if unknown_fields:
+        raise ValueError(f"unknown field(s): {', '.join(sorted(str(field) for field in unknown_fields))}")
+
+    merged = dict(defaults)
+    # empty values (like blank csv cells) fall back to the defaults
+    merged.update({field: value for field, value in record.items() if value not in (None, "")})
+
+    missing_fields = [field for field in REQUIRED_FIELDS if not merged.get(field)]
+    if missing_fields:
+        raise ValueError(f"missing required field(s): {', '.join(missing_fields)}")
+
+    return {FIELD_TO_ARGUMENT[field]: value for field, value in merged.items() if value not in (None, "")}
+
+
+def read_records(stream, batch_format: str, defaults: dict = None):
+    # Read batch input one record at a time and yield (line number, SESSender keyword arguments) for good
+    # records and MalformedRecord objects for bad ones, so a bad row never stops the rest of the batch.
+    # batch_format is "jsonl" (one json object per line) or "csv" (header row of field names).
+    # defaults fill in any field a record leaves out.
+    if defaults == None:
+        defaults = {}
+
+    if batch_format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, _record_to_message(json.loads(line), defaults)
+            except ValueError as e:
+                yield MalformedRecord(line_number, str(e))
+
+    elif batch_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            try:
+                # DictReader puts extra cells under the None key
+                if None in record:
+                    raise ValueError("row has more cells than the header")
+                yield reader.line_num, _record_to_message(record, defaults)
+            except ValueError as e:
+                yield MalformedRecord(reader.line_num, str(e))
+
+    else:
+        raise ValueError(f"unsupported batch format: {batch_format}")
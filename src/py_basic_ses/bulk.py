@@ -0,0 +1,86 @@
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.clients import DEFAULT_MAX_POOL_CONNECTIONS
+from py_basic_ses.results import SendResult
+from py_basic_ses.ratelimit import TokenBucket
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+
+
+def _send_one(index: int, message, max_pool_connections: int, pool = None) -> SendResult:
+    # runs in a worker thread, never raises, any problem is returned in the result
+    try:
+        if pool != None:
+            result = pool.send_email_result(message)
+            result.index = index
+            return result
+
+        if isinstance(message, SESSender):
+            sender = message
+        else:
+            # build the sender from a dict of SESSender keyword arguments
+            options = dict(message)
+            options.setdefault("max_pool_connections", max_pool_connections)
+            sender = SESSender(**options)
+
+        result = sender.send_email_result()
+        result.index = index
+        return result
+
+    except Exception as e:
+        return SendResult(error=e, index=index, attempts=getattr(e, "attempts", 1), endpoint=getattr(e, "endpoint", None))
+
+
+def send_many(messages, max_workers: int = 10, rate_limit = None, ordered: bool = True, pool = None):
+    # Send every message in messages on a thread pool and yield a SendResult for each one.
+    # messages can be any iterable (including a generator) of SESSender objects, or dicts of
+    # SESSender keyword arguments. All senders for the same region and profile share one pooled client.
+    #
+    # max_workers - number of sends in flight at the same time
+    # rate_limit  - optional cap on messages started per second, either a number or a shared limiter
+    #               such as py_basic_ses.ratelimit.SESQuotaRateLimiter
+    # ordered     - yield results in input order if True, otherwise as soon as each send completes
+    # pool        - optional py_basic_ses.pool.SenderPool that picks the region/account for every message
+    #
+    # At most 2 * max_workers messages are pulled from the iterable ahead of the results being consumed,
+    # so memory stays flat no matter how large the input is.
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    # a plain number becomes a bucket with no burst, so sends are evenly spaced
+    if isinstance(rate_limit, (int, float)):
+        rate_limit = TokenBucket(rate_limit, capacity=1)
+
+    # make sure the shared connection pool is big enough for every worker
+    max_pool_connections = max(max_workers, DEFAULT_MAX_POOL_CONNECTIONS)
+    max_in_flight = max_workers * 2
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if ordered:
+            in_flight = deque()
+            for index, message in enumerate(messages):
+                # wait for the oldest send before pulling more work off the iterable
+                while len(in_flight) >= max_in_flight:
+                    yield in_flight.popleft().result()
+                if rate_limit != None:
+                    rate_limit.acquire()
+                in_flight.append(executor.submit(_send_one, index, message, max_pool_connections, pool))
+
+            while in_flight:
+                yield in_flight.popleft().result()
+
+        else:
+            in_flight = set()
+            for index, message in enumerate(messages):
+                # wait for any send to finish before pulling more work off the iterable
+                while len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                if rate_limit != None:
+                    rate_limit.acquire()
+                in_flight.add(executor.submit(_send_one, index, message, max_pool_connections, pool))
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
@@ -0,0 +1,131 @@
+import boto3
+from botocore.config import Config
+import os, threading, weakref
+
+# default size of the urllib3 connection pool each client keeps open to SES
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+
+class SESClientRegistry:
+    # Process wide cache of boto3 clients keyed by (service, region, profile, max pool connections, botocore retries).
+    # Building a boto3 client redoes loader work, endpoint resolution, and credential lookup, and
+    # opens a brand new https connection pool. Reusing one client per key lets repeated sends share
+    # warm connections. boto3 clients are thread safe, so a single client can be shared across threads.
+    # endpoint_url points every client at another endpoint, like py_basic_ses.transports.FakeSESServer.
+    # botocore_retries=False builds a client that makes a single attempt per call, for senders with a
+    # RetryPolicy, so botocore doesn't retry underneath the policy and every attempt is counted.
+    def __init__(self, max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS, endpoint_url: str = None):
+        self.max_pool_connections = max_pool_connections
+        self.endpoint_url = endpoint_url
+        self._clients = {}
+        self._lock = threading.Lock()
+        _registries.add(self)
+
+
+    def _after_fork(self):
+        # A forked child process must not use the parent's https connections. The cached clients are
+        # dropped without closing them, closing would shut the sockets the parent is still using.
+        self._clients = {}
+        self._lock = threading.Lock()
+
+
+    def _build_client(self, service: str, aws_region: str, aws_profile: str, max_pool_connections: int, botocore_retries: bool = True):
+        if botocore_retries:
+            config = Config(max_pool_connections=max_pool_connections)
+        else:
+            config = Config(max_pool_connections=max_pool_connections, retries={'total_max_attempts': 1})
+
+        # use the default boto3 session unless a named credential profile was requested
+        options = {'region_name': aws_region, 'config': config}
+        if self.endpoint_url != None:
+            options['endpoint_url'] = self.endpoint_url
+        if aws_profile == None:
+            return boto3.client(service, **options)
+        else:
+            return boto3.session.Session(profile_name=aws_profile).client(service, **options)
+
+
+    def get_client(self, aws_region: str, aws_profile: str = None, service: str = 'ses', max_pool_connections: int = None, botocore_retries: bool = True):
+        if max_pool_connections == None:
+            max_pool_connections = self.max_pool_connections
+
+        key = (service, aws_region, aws_profile, max_pool_connections, botocore_retries)
+
+        # fast path, the client has already been built
+        client = self._clients.get(key)
+        if client != None:
+            return client
+
+        # slow path, build the client while holding the lock so two threads don't build the same client
+        with self._lock:
+            client = self._clients.get(key)
+            if client == None:
+                client = self._build_client(service, aws_region, aws_profile, max_pool_connections, botocore_retries)
+                self._clients[key] = client
+            return client
+
+
+    def refresh_client(self, aws_region: str, aws_profile: str = None, service: str = 'ses', max_pool_connections: int = None, botocore_retries: bool = True):
+        # throw away the cached client (for example after rotating credentials) and build a new one
+        if max_pool_connections == None:
+            max_pool_connections = self.max_pool_connections
+
+        key = (service, aws_region, aws_profile, max_pool_connections, botocore_retries)
+
+        with self._lock:
+            old_client = self._clients.pop(key, None)
+
+        if old_client != None:
+            _close_client(old_client)
+
+        return self.get_client(aws_region, aws_profile=aws_profile, service=service, max_pool_connections=max_pool_connections, botocore_retries=botocore_retries)
+
+
+    def close(self):
+        # close every cached client and empty the registry
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+
+        for client in clients:
+            _close_client(client)
+
+
+    def __len__(self):
+        return len(self._clients)
+
+
+# every registry, so forked children (py_basic_ses.procpool) start with empty ones
+_registries = weakref.WeakSet()
+
+
+def _reset_registries_after_fork():
+    for registry in list(_registries):
+        registry._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_registries_after_fork)
+
+
+def _close_client(client):
+    # client.close() was added in botocore 1.29, older versions don't have a way to release the pool
+    close = getattr(client, "close", None)
+    if callable(close):
+        close()
+
+
+# the registry SESSender uses by default
+default_registry = SESClientRegistry()
+
+
+def get_client(aws_region: str, aws_profile: str = None, service: str = 'ses', max_pool_connections: int = None, botocore_retries: bool = True):
+    return default_registry.get_client(aws_region, aws_profile=aws_profile, service=service, max_pool_connections=max_pool_connections, botocore_retries=botocore_retries)
+
+
+def refresh_client(aws_region: str, aws_profile: str = None, service: str = 'ses', max_pool_connections: int = None, botocore_retries: bool = True):
+    return default_registry.refresh_client(aws_region, aws_profile=aws_profile, service=service, max_pool_connections=max_pool_connections, botocore_retries=botocore_retries)
+
+
+def close_clients():
+    default_registry.close()
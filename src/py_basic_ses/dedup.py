@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import hashlib, json, sqlite3, threading, time
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def message_key(*parts) -> str:
+    # sha256 over the given parts (recipients, subject, bodies, ...), used as the default idempotency key.
+    # parts must be json serialisable, lists keep their order so the same message always hashes the same way.
+    encoded = json.dumps(parts, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class DedupCache:
+    # In memory cache of idempotency key -> MessageIds for messages that were already sent.
+    # Keys are forgotten ttl seconds after they were stored, and the least recently used key is dropped
+    # once there are more than max_entries, so memory stays bounded. Safe to share between threads.
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key: str) -> list:
+        # the MessageIds stored for key, or None if it wasn't sent in the last ttl seconds
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry == None or entry[0] <= now:
+                if entry != None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+
+    def put(self, key: str, message_ids: list):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, list(message_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteDedupCache:
+    # Same interface as DedupCache, stored in a SQLite file so several processes (job runners, cron
+    # workers) share one dedup window. Expired keys are purged on every purge_every puts.
+    #
+    # Two processes sending the same message at the same moment can both miss the cache, so this
+    # catches replays and retries rather than guaranteeing exactly once delivery.
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL, purge_every: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._puts = 0
+        # sqlite connections can't be shared between threads, every thread gets its own
+        self._local = threading.local()
+        self._connection().execute("CREATE TABLE IF NOT EXISTS sent (key TEXT PRIMARY KEY, message_ids TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection == None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+    def get(self, key: str) -> list:
+        # wall clock time, not monotonic, because the expiry is shared with other processes
+        row = self._connection().execute("SELECT message_ids FROM sent WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        if row == None:
+            return None
+        return json.loads(row[0])
+
+
+    def put(self, key: str, message_ids: list):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO sent (key, message_ids, expires_at) VALUES (?, ?, ?)", (key, json.dumps(list(message_ids)), now + self.ttl))
+        self._puts += 1
+        if self._puts % self.purge_every == 0:
+            connection.execute("DELETE FROM sent WHERE expires_at <= ?", (now,))
+
+
+    def clear(self):
+        self._connection().execute("DELETE FROM sent")
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sent WHERE expires_at > ?", (time.time(),)).fetchone()[0]
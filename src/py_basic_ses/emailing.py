@@ -1,21 +1,112 @@
-import boto3
-from py_basic_ses.exceptions import CredError
-import os, platform
+from py_basic_ses.clients import default_registry, SESClientRegistry
+from py_basic_ses.dedup import message_key
+from py_basic_ses.exceptions import CredError, SuppressedRecipientError, PayloadValidationError
+from py_basic_ses.message import EmailMessage, default_payload_builder
+from py_basic_ses.validation import validate_message, MAX_MESSAGE_SIZE, MAX_MESSAGE_SIZE_V2
+from py_basic_ses.results import SendResult
+from py_basic_ses.retry import RetryPolicy
+import os, platform, threading
 
-class SESSender:
-    def __init__(self,sendto: str, fromaddr: str, message_txt: str, aws_region: str, fromname: str = None, msgsubject: str = None, message_html: str = None):
-        # set instance variables based on what was passed into __init__()
-        self.sendto = sendto
-        self.fromaddr = fromaddr
-        self.message_txt = message_txt
+# SES accepts at most 50 recipients (To, CC, and BCC combined) in one message
+MAX_RECIPIENTS_PER_MESSAGE = 50
+
+# the APIs a sender can send through, see SESBase
+BACKENDS = ('ses', 'sesv2')
+
+
+def _address_list(addresses) -> list:
+    # accept a single address, None, or any iterable of addresses
+    if addresses == None:
+        return []
+    if isinstance(addresses, str):
+        return [addresses]
+    return list(addresses)
+
+
+def _merge_chunks(chunks: list) -> tuple:
+    # the (to, cc, bcc) lists of several recipient chunks put back together
+    to, cc, bcc = [], [], []
+    for chunk_to, chunk_cc, chunk_bcc in chunks:
+        to += chunk_to
+        cc += chunk_cc
+        bcc += chunk_bcc
+    return to, cc, bcc
+
+
+def _unsent_message(message: dict, unsent_recipients: tuple) -> dict:
+    # message (SESSender keyword arguments) with its recipients replaced by the (to, cc, bcc) lists that weren't sent to
+    to, cc, bcc = unsent_recipients
+    message = {field: value for field, value in message.items() if field not in ('sendto', 'cc', 'bcc')}
+    message['sendto'] = to
+    if cc:
+        message['cc'] = cc
+    if bcc:
+        message['bcc'] = bcc
+    return message
+
+# Credentials files that have already passed validation, keyed on (path, profile, mtime, size).
+# Editing the file changes its mtime/size, so a changed file is validated again.
+_validated_credentials = set()
+_validated_credentials_lock = threading.Lock()
+
+
+def clear_validation_cache():
+    # forget every validated credentials file, so the next send validates again
+    with _validated_credentials_lock:
+        _validated_credentials.clear()
+
+
+def _credentials_cache_key(credpath: str, aws_profile: str):
+    # returns None if the file can't be stat'ed, the full validation below will report the problem
+    try:
+        stat_result = os.stat(credpath)
+    except (OSError, ValueError):
+        return None
+    return (credpath, aws_profile, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+class SESBase:
+    # Everything needed to talk to SES that isn't about one particular message: region and credentials,
+    # credential validation, the shared client, rate limiting, and retries. SESSender and the other
+    # senders build on this class.
+
+    def __init__(self, aws_region: str, aws_profile: str = None, client_registry: SESClientRegistry = None, max_pool_connections: int = None,
+                 rate_limiter = None, retry_policy: RetryPolicy = None, transport = None, instrumentation = None,
+                 backend: str = 'ses', configuration_set: str = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
         self.aws_region = aws_region
-        self.fromname = fromname
-        self.msgsubject = msgsubject
-        self.message_html = message_html
+        # named credential profile to build the boto3 client with, None uses the default credential chain
+        self.aws_profile = aws_profile
+        # registry that hands out shared boto3 clients, so repeated sends reuse warm connections
+        if client_registry == None:
+            self.client_registry = default_registry
+        else:
+            self.client_registry = client_registry
+        # size of the client's connection pool, None uses the registry default
+        self.max_pool_connections = max_pool_connections
+        # optional limiter shared between senders (see py_basic_ses.ratelimit), acquire() is called before every SES call
+        self.rate_limiter = rate_limiter
+        # optional policy for retrying throttled and transient errors, None sends exactly once
+        self.retry_policy = retry_policy
+        # optional transport (see py_basic_ses.transports) the client comes from instead of client_registry,
+        # like SESv2Transport or FakeSESTransport. backend='sesv2' is a shortcut for an SESv2Transport.
+        if transport == None and backend == 'sesv2':
+            # imported here so a plain SES send doesn't load the transports module (and the fake server's http.server)
+            from py_basic_ses.transports import SESv2Transport
+            transport = SESv2Transport(self.client_registry)
+        self.backend = backend
+        self.transport = transport
+        # SES configuration set every message from this sender is sent with, for event publishing and tracking
+        self.configuration_set = configuration_set
+        # optional py_basic_ses.instrumentation.Instrumentation, times each phase of a send and counts the outcomes
+        self.instrumentation = instrumentation
+
 
-    
-    def ses_validate(self):
+    def ses_validate(self, force: bool = False):
         # Returning False indicates an error. Returning True indicates everything was validated.
+        # A credentials file that passed validation is remembered for the life of the process (until it changes),
+        # so the file is only read once instead of before every email. Pass force=True to validate again anyway.
       
         # ---- AWS Credentials Validations ----        
         # Check for environment variables first
@@ -26,17 +117,22 @@ class SESSender:
         # Start by determining the OS of the system running this application to determine the expected path to
         # the credentials file.                      
         # If the OS is not Linux or Windows, raise exception and stop routine.
-        if platform.system() != "Linux" and platform.system() != "Windows":
+        operating_system = platform.system()
+        if operating_system != "Linux" and operating_system != "Windows":
             raise OSError("unrecognized operating system. py-basic-ses supports Windows or Linux")
 
         # determine the expected path to the credentials file based on the operating system
-        if platform.system() == "Linux":
+        if operating_system == "Linux":
             # using expanduser() method to convert ~ into /home/<username>
             self.credpath = os.path.expanduser("~/.aws/credentials")
                     
-        if platform.system() == "Windows":
+        if operating_system == "Windows":
             self.credpath = "C:\\Users\\" + os.getlogin() + "\\.aws\\credentials"
 
+        # has this exact file already been validated?
+        cache_key = _credentials_cache_key(self.credpath, self.aws_profile)
+        if not force and cache_key != None and cache_key in _validated_credentials:
+            return True
         
         # since no environment variables, does the cred file path exist? If not, raise an exception
         if not os.path.isfile(self.credpath):
@@ -54,84 +150,308 @@ class SESSender:
                 # to make sure that the key and = are present. If they are not, then the boto3 library will throw an error
                 with open(self.credpath, "r") as cred_file:
                     cred_content = cred_file.read().replace(" ","")
+
+                # the section we need is [default], or the named profile if one was given
+                if self.aws_profile == None:
+                    section = "[default]"
+                else:
+                    section = "[" + self.aws_profile + "]"
                     
                 # look for aws_access_key_id= and aws_secret_access_key=
-                if cred_content.find("aws_access_key_id=") != -1 and cred_content.find("aws_secret_access_key=") != -1 and cred_content.find("[default]") != -1:
+                if cred_content.find("aws_access_key_id=") != -1 and cred_content.find("aws_secret_access_key=") != -1 and cred_content.find(section) != -1:
+                    if cache_key != None:
+                        with _validated_credentials_lock:
+                            _validated_credentials.add(cache_key)
                     return True
                 else:
                     raise CredError('malformed credentials file, for help setting up aws ses credentials see https://github.com/shinyshoes404/py-basic-ses#readme')
         
         
 
-    def send_email(self) -> str:
-        # make sure we have all of the required parameters before attempting to send an email
-        self.ses_validate()
+    def request_options(self) -> dict:
+        # options every SES request from this sender carries
+        if self.configuration_set == None:
+            return {}
+        return {'ConfigurationSetName': self.configuration_set}
+
 
-        # Replace sender@example.com with your "From" address.
-        # This address must be verified with Amazon SES.
-        # if a fromname was provided build out 'Sender Name <senderaddr@email.com>' format
-        if self.fromname == None or self.fromname == "":
-            self.SENDER = self.fromaddr
+    def validate_credentials(self):
+        # check the credentials before sending, unless the transport doesn't use AWS credentials (like the fake SES)
+        if not getattr(self.transport, 'requires_credentials', True):
+            return
+        if self.instrumentation == None:
+            self.ses_validate()
         else:
-            self.SENDER = self.fromname + " <" + self.fromaddr + ">"        
+            with self.instrumentation.phase("validate"):
+                self.ses_validate()
 
-        # Replace recipient@example.com with a "To" address. If your account 
-        # is still in the sandbox, this address must be verified.
-        self.RECIPIENT = self.sendto
-        
-        # If necessary, replace us-west-2 with the AWS Region you're using for Amazon SES.
-        self.AWS_REGION = self.aws_region
 
-        # The subject line for the email.
-        if self.msgsubject == None:
-            self.SUBJECT = ""
+    def get_client(self, service: str = 'ses'):
+        # Get the shared client for this region and profile. The client is only built on the first send.
+        # With a retry policy, botocore's own retries are turned off so the policy counts every attempt.
+        source = self.client_registry if self.transport == None else self.transport
+        options = {'aws_profile': self.aws_profile, 'service': service, 'max_pool_connections': self.max_pool_connections}
+        if self.retry_policy != None:
+            options['botocore_retries'] = False
+        if self.instrumentation == None:
+            self.client = source.get_client(self.aws_region, **options)
         else:
-            self.SUBJECT = self.msgsubject
+            with self.instrumentation.phase("client"):
+                self.client = source.get_client(self.aws_region, **options)
+        return self.client
 
-        # The email body for recipients with non-HTML email clients.
-        self.BODY_TEXT = self.message_txt
-                    
-        # The HTML body of the email.
-        if self.message_html == None:
-            self.BODY_HTML = self.message_txt
-        else:
-            self.BODY_HTML = self.message_html                        
-
-        # The character encoding for the email.
-        self.CHARSET = "UTF-8"
-
-        # Create a new SES resource and specify a region.
-        self.client = boto3.client('ses',region_name=self.AWS_REGION)
-
-
-        #Provide the contents of the email.
-        response = self.client.send_email(
-                Destination={
-                    'ToAddresses': [
-                        self.RECIPIENT,
-                    ],
-                },
-                Message={
-                    'Body': {
-                        'Html': {
-                            'Charset': self.CHARSET,
-                            'Data': self.BODY_HTML,
-                        },
-                        'Text': {
-                            'Charset': self.CHARSET,
-                            'Data': self.BODY_TEXT,
-                        },
-                    },
-                    'Subject': {
-                        'Charset': self.CHARSET,
-                        'Data': self.SUBJECT,
-                    },
-                },
-                Source=self.SENDER,
-            
-            )
-
-
-        return response['MessageId']
-
-    
\ No newline at end of file
+
+    def message_count(self, payload: dict) -> int:
+        # how many messages one API call with payload sends, bulk senders send several per call
+        return 1
+
+
+    def _call_once(self, operation: str, payload: dict) -> dict:
+        # wait for our turn, so we stay under the account's send rate instead of getting throttled
+        if self.rate_limiter != None:
+            self.rate_limiter.acquire(self.message_count(payload))
+
+        if self.instrumentation == None:
+            return getattr(self.client, operation)(**payload)
+
+        try:
+            return getattr(self.client, operation)(**payload)
+        except Exception as e:
+            self.instrumentation.attempt_failed(operation, e)
+            raise
+
+
+    def call_api(self, operation: str, payload: dict):
+        # call a client method with payload as its keyword arguments, retrying if we have a retry policy.
+        # returns (response, attempts)
+        if self.instrumentation != None:
+            return self.instrumentation.call(self, operation, payload, self._call_api)
+        return self._call_api(operation, payload)
+
+
+    def _call_api(self, operation: str, payload: dict):
+        if self.retry_policy == None:
+            return self._call_once(operation, payload), 1
+
+        return self.retry_policy.call(self._call_once, operation, payload)
+
+
+class SESSender(SESBase):
+    # name of the boto3 client method build_payload()'s output is sent with
+    api_operation = 'send_email'
+
+    # the constructor arguments that describe the message itself, see to_dict()
+    message_fields = ('sendto', 'fromaddr', 'message_txt', 'aws_region', 'fromname', 'msgsubject', 'message_html', 'cc', 'bcc', 'aws_profile', 'idempotency_key', 'configuration_set',
+                      'backend')
+
+    def __init__(self,sendto, fromaddr: str, message_txt: str, aws_region: str, fromname: str = None, msgsubject: str = None, message_html: str = None,
+                 aws_profile: str = None, client_registry: SESClientRegistry = None, max_pool_connections: int = None,
+                 rate_limiter = None, retry_policy: RetryPolicy = None, cc = None, bcc = None, dedup_cache = None, idempotency_key: str = None,
+                 transport = None, instrumentation = None, backend: str = 'ses', configuration_set: str = None, suppression_list = None,
+                 preflight: bool = True):
+        super().__init__(aws_region, aws_profile=aws_profile, client_registry=client_registry, max_pool_connections=max_pool_connections,
+                         rate_limiter=rate_limiter, retry_policy=retry_policy, transport=transport, instrumentation=instrumentation,
+                         backend=backend, configuration_set=configuration_set)
+        # set instance variables based on what was passed into __init__()
+        # sendto, cc, and bcc can each be a single address or a list of addresses
+        self.sendto = sendto
+        self.cc = cc
+        self.bcc = bcc
+        self.fromaddr = fromaddr
+        self.message_txt = message_txt
+        self.fromname = fromname
+        self.msgsubject = msgsubject
+        self.message_html = message_html
+        # optional DedupCache or SQLiteDedupCache (see py_basic_ses.dedup), a message already sent within the
+        # cache's window is not sent again. idempotency_key defaults to a hash of the message, see dedup_key().
+        self.dedup_cache = dedup_cache
+        self.idempotency_key = idempotency_key
+        # optional SuppressionList (see py_basic_ses.suppression), suppressed recipients are taken out before
+        # sending and listed in the result's suppressed
+        self.suppression_list = suppression_list
+        # check the message locally before sending (see preflight_check()), so a bad message fails in
+        # microseconds instead of after a round trip to SES
+        self.preflight = preflight
+
+
+    def dedup_key(self) -> str:
+        if self.idempotency_key != None:
+            return self.idempotency_key
+        return message_key(self.fromaddr, _address_list(self.sendto), _address_list(self.cc), _address_list(self.bcc),
+                           self.msgsubject, self.message_txt, self.message_html)
+
+
+    @classmethod
+    def from_message(cls, message: EmailMessage, aws_region: str, **kwargs):
+        # a sender for an EmailMessage, kwargs are the other SESSender arguments (aws_profile, retry_policy, ...)
+        return cls(sendto=list(message.sendto), fromaddr=message.fromaddr, message_txt=message.message_txt, aws_region=aws_region,
+                   fromname=message.fromname, msgsubject=message.msgsubject, message_html=message.message_html,
+                   cc=list(message.cc), bcc=list(message.bcc), **kwargs)
+
+
+    def message(self) -> EmailMessage:
+        # the message this sender sends, as an immutable EmailMessage
+        return EmailMessage(self.sendto, self.fromaddr, self.message_txt, fromname=self.fromname, msgsubject=self.msgsubject,
+                            message_html=self.message_html, cc=self.cc, bcc=self.bcc)
+
+
+    # The values the request is built from. They used to be set on the sender by every build_payload() call,
+    # they are worked out from the message fields now, so senders stay small.
+    @property
+    def SENDER(self) -> str:
+        return self.message().source
+
+    @property
+    def RECIPIENT(self):
+        return self.sendto
+
+    @property
+    def SUBJECT(self) -> str:
+        return "" if self.msgsubject == None else self.msgsubject
+
+    @property
+    def BODY_TEXT(self) -> str:
+        return self.message_txt
+
+    @property
+    def BODY_HTML(self) -> str:
+        return self.message_txt if self.message_html == None else self.message_html
+
+    @property
+    def CHARSET(self) -> str:
+        return default_payload_builder.charset
+
+    @property
+    def AWS_REGION(self) -> str:
+        return self.aws_region
+
+
+    def to_dict(self) -> dict:
+        # the message as plain keyword arguments, SESSender(**sender.to_dict()) rebuilds it.
+        # Shared objects like the client registry, rate limiter, and retry policy are not included.
+        options = {field: getattr(self, field) for field in self.message_fields if getattr(self, field) != None}
+        # the default backend is left out, like the other defaults, so a backend given with the sender_options
+        # of a queue worker or pool endpoint still applies
+        if options.get('backend') == 'ses':
+            del options['backend']
+        return options
+
+
+    def preflight_check(self) -> list:
+        # The problems SES would reject this message for, as a list of py_basic_ses.validation.FieldErrors,
+        # found without calling SES. Empty when the message looks sendable.
+        max_size = getattr(self, 'max_message_size', None)
+        if max_size == None:
+            max_size = MAX_MESSAGE_SIZE_V2 if self.backend == 'sesv2' else MAX_MESSAGE_SIZE
+        return validate_message(self, max_size=max_size)
+
+
+    def filter_recipients(self) -> tuple:
+        # (to, cc, bcc, suppressed) with the addresses on the suppression list taken out
+        to, cc, bcc = _address_list(self.sendto), _address_list(self.cc), _address_list(self.bcc)
+        if self.suppression_list == None:
+            return to, cc, bcc, []
+        to, suppressed_to = self.suppression_list.filter(to)
+        cc, suppressed_cc = self.suppression_list.filter(cc)
+        bcc, suppressed_bcc = self.suppression_list.filter(bcc)
+        return to, cc, bcc, suppressed_to + suppressed_cc + suppressed_bcc
+
+
+    def recipient_chunks(self, to: list = None, cc: list = None, bcc: list = None) -> list:
+        # Split the To, CC, and BCC recipients into groups of no more than 50, the most SES accepts in one message.
+        # Returns a list of (to, cc, bcc) tuples, one per SES call. The recipients default to this sender's.
+        if to == None and cc == None and bcc == None:
+            to, cc, bcc = _address_list(self.sendto), _address_list(self.cc), _address_list(self.bcc)
+        recipients = [('to', address) for address in to or []]
+        recipients += [('cc', address) for address in cc or []]
+        recipients += [('bcc', address) for address in bcc or []]
+        if not recipients:
+            raise ValueError("at least one recipient is required")
+
+        chunks = []
+        for start in range(0, len(recipients), MAX_RECIPIENTS_PER_MESSAGE):
+            chunk = recipients[start:start + MAX_RECIPIENTS_PER_MESSAGE]
+            chunks.append((
+                [address for kind, address in chunk if kind == 'to'],
+                [address for kind, address in chunk if kind == 'cc'],
+                [address for kind, address in chunk if kind == 'bcc'],
+            ))
+        return chunks
+
+
+    def build_payload(self, to: list = None, cc: list = None, bcc: list = None) -> dict:
+        # Build the keyword arguments for the SES SendEmail API call. Every sending path (sync, async, bulk)
+        # goes through this method, so they all produce identical payloads.
+        # to, cc, and bcc default to every recipient of this sender, send_email_result() passes one chunk at a time.
+        if to == None and cc == None and bcc == None:
+            to = _address_list(self.sendto)
+            cc = _address_list(self.cc)
+            bcc = _address_list(self.bcc)
+
+        return default_payload_builder.build(self.message(), to, cc, bcc, self.request_options())
+
+
+    def send_email_result(self) -> SendResult:
+        # Send the email and return a SendResult with the MessageId and the number of attempts it took.
+        # More than 50 recipients are sent as several messages, one SES call each, and message_ids lists
+        # the MessageId of every call in order. If a call fails, the error is raised with a message_ids
+        # attribute listing the calls that had already gone out, and an unsent_recipients attribute with the
+        # (to, cc, bcc) lists that were not sent to yet, so a retry can send to only them.
+        # With a dedup_cache, a message that was already sent returns the original MessageIds without calling SES.
+        # With a suppression_list, suppressed recipients are left out, and SuppressedRecipientError is raised
+        # when that leaves nobody to send to. A message that fails preflight_check() raises PayloadValidationError.
+        if self.instrumentation != None:
+            with self.instrumentation.phase("total", **{"aws.region": self.aws_region}):
+                return self._send_email_result()
+        return self._send_email_result()
+
+
+    def _send_email_result(self) -> SendResult:
+        if self.preflight:
+            errors = self.preflight_check()
+            if errors:
+                error = PayloadValidationError(errors)
+                error.attempts = 0
+                raise error
+
+        if self.dedup_cache != None:
+            key = self.dedup_key()
+            sent_ids = self.dedup_cache.get(key)
+            if sent_ids:
+                return SendResult(message_id=sent_ids[0], attempts=0, message_ids=sent_ids, duplicate=True)
+
+        # suppressed recipients never reach SES, a message with nobody left isn't sent at all
+        to, cc, bcc, suppressed = self.filter_recipients()
+        if suppressed and not (to or cc or bcc):
+            error = SuppressedRecipientError(suppressed)
+            error.attempts = 0
+            raise error
+
+        # make sure we have all of the required parameters before attempting to send an email
+        self.validate_credentials()
+
+        chunks = self.recipient_chunks(to, cc, bcc)
+
+        self.get_client()
+
+        message_ids = []
+        total_attempts = 0
+        for to, cc, bcc in chunks:
+            try:
+                response, attempts = self.call_api(self.api_operation, self.build_payload(to, cc, bcc))
+            except Exception as e:
+                e.message_ids = message_ids
+                e.unsent_recipients = _merge_chunks(chunks[len(message_ids):])
+                raise
+            message_ids.append(response['MessageId'])
+            total_attempts += attempts
+
+        # only a fully sent message is remembered, a partly sent one raised above and can be retried
+        if self.dedup_cache != None:
+            self.dedup_cache.put(key, message_ids)
+
+        return SendResult(message_id=message_ids[0], attempts=total_attempts, message_ids=message_ids, suppressed=suppressed)
+
+
+    def send_email(self) -> str:
+        return self.send_email_result().message_id
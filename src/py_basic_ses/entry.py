@@ -1,7 +1,35 @@
-import click, sys
-from py_basic_ses.emailing import SESSender
-from py_basic_ses.exceptions import CredError
-from botocore.exceptions import ClientError
+import click, sys, json, time
+from collections import deque
+from py_basic_ses.exceptions import CredError, SuppressedRecipientError, PayloadValidationError
+from py_basic_ses.batch import read_records, MalformedRecord
+
+# boto3 and botocore take most of the startup time of send-test and send-email. They are only imported
+# once we are actually sending, so --help and argument errors return right away.
+_LAZY_IMPORTS = {
+    "SESSender": ("py_basic_ses.emailing", "SESSender"),
+    "send_many": ("py_basic_ses.bulk", "send_many"),
+    "send_many_processes": ("py_basic_ses.procpool", "send_many_processes"),
+    "ClientError": ("botocore.exceptions", "ClientError"),
+    "SESRelay": ("py_basic_ses.relay", "SESRelay"),
+    "TokenBucket": ("py_basic_ses.ratelimit", "TokenBucket"),
+    "SuppressionList": ("py_basic_ses.suppression", "SuppressionList"),
+    "validate_message": ("py_basic_ses.validation", "validate_message"),
+    "SendResult": ("py_basic_ses.results", "SendResult"),
+}
+
+
+def __getattr__(name):
+    # module level attribute lookup (PEP 562) for the lazy imports, so py_basic_ses.entry.SESSender still works
+    if name in _LAZY_IMPORTS:
+        module_name, attribute = _LAZY_IMPORTS[name]
+        module = __import__(module_name, fromlist=[attribute])
+        return getattr(module, attribute)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _lazy(name):
+    # look the name up through the module, so anything patched onto py_basic_ses.entry is picked up
+    return getattr(sys.modules[__name__], name)
 
 @click.command()
 @click.option("--to", default="", help="Address you are sending to. Required")
@@ -18,6 +46,9 @@ def send_test_email(to, fromaddr, awsregion):
         click.echo("You need to provide your AWS region.")
         sys.exit(1)
 
+    SESSender = _lazy("SESSender")
+    ClientError = _lazy("ClientError")
+
     try:              
         # instantiate the object
         ses_send_obj = SESSender(sendto=to,fromaddr=fromaddr, message_txt="Test message from py-basic-ses",aws_region=awsregion,msgsubject="Test py-basic-ses")
@@ -51,6 +82,12 @@ def send_test_email(to, fromaddr, awsregion):
         click.echo(e.response['Error']['Message'])
         sys.exit(4)
 
+    except PayloadValidationError as e:
+        click.echo("invalid message")
+        for error in e.errors:
+            click.echo(f"{error.field}: {error.message}")
+        sys.exit(8)
+
     except Exception as e:
         click.echo("unexpected error")
         click.echo(e.__str__())
@@ -66,7 +103,26 @@ def send_test_email(to, fromaddr, awsregion):
 @click.option("--message_html", default=None, help="html version of your message body. Optional")
 @click.option("--subject", default=None, help="Email subject. Optional")
 @click.option("--fromname", default=None, help="Name to list in from line. Optional")
-def send_email(to, fromaddr, awsregion, message_txt, message_html, subject, fromname):
+@click.option("--batch", default=None, help="Send every message in this JSONL or CSV file, use - to read from stdin. The other options become defaults for fields a message leaves out. Optional")
+@click.option("--batch_format", default=None, type=click.Choice(["jsonl", "csv"]), help="Format of the --batch input. Defaults to csv for .csv files and jsonl for everything else. Optional")
+@click.option("--workers", default=10, type=click.IntRange(min=1), help="Number of emails to send at the same time in batch mode. Optional")
+@click.option("--rate_limit", default=None, type=click.FloatRange(min=0, min_open=True), help="Maximum emails started per second in batch mode. Optional")
+@click.option("--processes", default=None, type=click.IntRange(min=1), help="Send the batch from this many worker processes, each with --workers threads. Optional")
+@click.option("--suppression_list", default=None, help="File of addresses (one per line) that are never sent to. Optional")
+@click.option("--validate_only", is_flag=True, default=False, help="Check the message, or every message of the --batch input, without sending anything. Optional")
+def send_email(to, fromaddr, awsregion, message_txt, message_html, subject, fromname, batch, batch_format, workers, rate_limit, processes, suppression_list, validate_only):
+    suppression = None
+    if suppression_list:
+        try:
+            suppression = _lazy("SuppressionList").from_file(suppression_list)
+        except OSError as e:
+            click.echo(f"error: {e.__str__()}")
+            sys.exit(1)
+
+    if batch:
+        defaults = {"to": to, "fromaddr": fromaddr, "awsregion": awsregion, "message_txt": message_txt, "message_html": message_html, "subject": subject, "fromname": fromname}
+        _send_batch(batch, batch_format, workers, rate_limit, defaults, processes, suppression, validate_only)
+
     if not to or to == "":
         click.echo("You need to provide an email address to send to.")
         sys.exit(1)
@@ -80,14 +136,29 @@ def send_email(to, fromaddr, awsregion, message_txt, message_html, subject, from
         click.echo("You need to provide an email message, at least in plain text.")
         sys.exit(1)
 
+    SESSender = _lazy("SESSender")
+    ClientError = _lazy("ClientError")
+
     try:
         # instantiate the object
-        ses_send_obj = SESSender(sendto=to,fromaddr=fromaddr, aws_region=awsregion, message_txt=message_txt, message_html=message_html, msgsubject=subject, fromname=fromname)
+        ses_send_obj = SESSender(sendto=to,fromaddr=fromaddr, aws_region=awsregion, message_txt=message_txt, message_html=message_html, msgsubject=subject, fromname=fromname,
+                                 suppression_list=suppression)
     except Exception as e:
         click.echo("unexpected exception")
         click.echo(e)
         sys.exit(1)
 
+    if validate_only:
+        # only run the preflight checks on the message, nothing is sent
+        errors = _lazy("validate_message")(ses_send_obj)
+        if errors:
+            click.echo("invalid message")
+            for error in errors:
+                click.echo(f"{error.field}: {error.message}")
+            sys.exit(8)
+        click.echo("message is valid, nothing was sent")
+        sys.exit(0)
+
     try:
         # try to send the email
         click.echo("Attempting to send an email to {0}".format(to))        
@@ -112,7 +183,134 @@ def send_email(to, fromaddr, awsregion, message_txt, message_html, subject, from
         click.echo(e.response['Error']['Message'])
         sys.exit(4)
 
+    except SuppressedRecipientError as e:
+        click.echo(f"not sent: {e.__str__()}")
+        sys.exit(7)
+
+    except PayloadValidationError as e:
+        click.echo("invalid message")
+        for error in e.errors:
+            click.echo(f"{error.field}: {error.message}")
+        sys.exit(8)
+
     except Exception as e:
         click.echo("unexpected error")
         click.echo(e.__str__())
-        sys.exit(5)    
\ No newline at end of file
+        sys.exit(5)    
+
+
+def _send_batch(batch, batch_format, workers, rate_limit, defaults, processes = None, suppression = None, validate_only = False):
+    # Send every record in the batch input over a shared client, writing one json line per input record
+    # and a final summary line. Exits 0 if every message was sent (or was only to suppressed addresses),
+    # 6 if any record failed, was invalid, or was malformed.
+    # With processes, the records are sent from that many worker processes with workers threads each.
+    # With validate_only, nothing is sent, every record is only run through the preflight checks.
+    if batch_format == None:
+        batch_format = "csv" if batch.lower().endswith(".csv") else "jsonl"
+
+    if validate_only:
+        validate_message = _lazy("validate_message")
+        SendResult = _lazy("SendResult")
+        def send_many(messages, max_workers, rate_limit):
+            for message in messages:
+                errors = validate_message(message)
+                yield SendResult(error=PayloadValidationError(errors) if errors else None, attempts=0)
+    elif processes == None:
+        send_many = _lazy("send_many")
+    else:
+        send_many_processes = _lazy("send_many_processes")
+        # the suppression list goes to each worker once, not with every message
+        sender_options = {} if suppression == None else {"suppression_list": suppression}
+        def send_many(messages, max_workers, rate_limit):
+            return send_many_processes(messages, processes=processes, threads_per_process=max_workers, rate_limit=rate_limit, **sender_options)
+    ClientError = _lazy("ClientError")
+
+    counts = {"sent": 0, "failed": 0, "malformed": 0, "suppressed": 0, "invalid": 0}
+    if validate_only:
+        counts["valid"] = 0
+    # line number and recipient of every record handed to send_many, results come back in the same order
+    pending = deque()
+    start = time.monotonic()
+
+    try:
+        with click.open_file(batch, "r", encoding="utf-8") as stream:
+            def messages():
+                for record in read_records(stream, batch_format, defaults):
+                    if isinstance(record, MalformedRecord):
+                        counts["malformed"] += 1
+                        click.echo(json.dumps({"line": record.line, "status": "malformed", "error": record.error}))
+                    else:
+                        line, message = record
+                        pending.append((line, message["sendto"]))
+                        if suppression != None and processes == None:
+                            message["suppression_list"] = suppression
+                        yield message
+
+            for result in send_many(messages(), max_workers=workers, rate_limit=rate_limit):
+                line, sendto = pending.popleft()
+                if result.ok and validate_only:
+                    counts["valid"] += 1
+                    click.echo(json.dumps({"line": line, "to": sendto, "status": "valid"}))
+                elif result.ok:
+                    counts["sent"] += 1
+                    output = {"line": line, "to": sendto, "status": "sent", "message_id": result.message_id, "attempts": result.attempts}
+                    if result.suppressed:
+                        output["suppressed"] = result.suppressed
+                    click.echo(json.dumps(output))
+                elif isinstance(result.error, SuppressedRecipientError):
+                    counts["suppressed"] += 1
+                    click.echo(json.dumps({"line": line, "to": sendto, "status": "suppressed", "suppressed": result.error.suppressed}))
+                elif isinstance(result.error, PayloadValidationError):
+                    counts["invalid"] += 1
+                    click.echo(json.dumps({"line": line, "to": sendto, "status": "invalid", "errors": [error.to_dict() for error in result.error.errors]}))
+                else:
+                    counts["failed"] += 1
+                    if isinstance(result.error, ClientError):
+                        error_message = result.error.response['Error'].get('Message', str(result.error))
+                    else:
+                        error_message = str(result.error)
+                    click.echo(json.dumps({"line": line, "to": sendto, "status": "failed", "error_type": type(result.error).__name__, "error": error_message}))
+
+    except OSError as e:
+        click.echo(f"error: {e.__str__()}")
+        sys.exit(1)
+
+    elapsed = time.monotonic() - start
+    total = sum(counts.values())
+    summary = dict(total=total, seconds=round(elapsed, 3), messages_per_second=round(counts["sent"] / elapsed, 2) if elapsed > 0 else None, **counts)
+    click.echo(json.dumps({"summary": summary}))
+
+    if counts["failed"] or counts["malformed"] or counts["invalid"]:
+        sys.exit(6)
+    sys.exit(0)
+
+
+@click.command()
+@click.option("--queue", default="ses-relay.sqlite3", help="SQLite file messages wait in until they are sent. Optional")
+@click.option("--host", default="127.0.0.1", help="Address to listen on. Optional")
+@click.option("--port", default=8025, type=click.IntRange(min=0, max=65535), help="Port for the HTTP/JSON API. Optional")
+@click.option("--smtp_port", default=None, type=click.IntRange(min=0, max=65535), help="Also accept SMTP on this port. Optional")
+@click.option("--awsregion", default=None, help="AWS region for messages that don't name one. Optional")
+@click.option("--fromaddr", default=None, help="From address for messages that don't have one. Optional")
+@click.option("--workers", default=10, type=click.IntRange(min=1), help="Number of emails to send at the same time. Optional")
+@click.option("--rate_limit", default=None, type=click.FloatRange(min=0, min_open=True), help="Maximum emails started per second. Optional")
+def ses_relay(queue, host, port, smtp_port, awsregion, fromaddr, workers, rate_limit):
+    SESRelay = _lazy("SESRelay")
+
+    defaults = {field: value for field, value in (("aws_region", awsregion), ("fromaddr", fromaddr)) if value != None}
+    sender_options = {}
+    if rate_limit != None:
+        sender_options["rate_limiter"] = _lazy("TokenBucket")(rate_limit, capacity=1)
+
+    try:
+        relay = SESRelay(queue, host=host, port=port, smtp_port=smtp_port, defaults=defaults, max_workers=workers, sender_options=sender_options)
+    except OSError as e:
+        click.echo(f"error: {e.__str__()}")
+        sys.exit(1)
+
+    click.echo(f"ses-relay listening on {relay.http_url}" + ("" if smtp_port == None else f", smtp on {host}:{relay.smtp_address[1]}"))
+    try:
+        relay.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
@@ -1,4 +1,42 @@
 
 class CredError(Exception):
     # raised when there is a problem with the aws credentials in the environment
-    pass
\ No newline at end of file
+    pass
+
+class MessageSizeError(Exception):
+    # raised when a raw MIME message would be larger than SES allows
+    pass
+
+
+class BulkDestinationError(Exception):
+    # raised (or returned in a SendResult) when SES reports a failure for one destination of a bulk send
+    def __init__(self, status: str, message: str = None):
+        self.status = status
+        self.detail = message
+        super().__init__(f"{status}: {message}" if message else status)
+
+    def __reduce__(self):
+        # results cross process boundaries (py_basic_ses.procpool), rebuild from the original arguments
+        return (BulkDestinationError, (self.status, self.detail))
+
+
+class SuppressedRecipientError(Exception):
+    # raised (or returned in a SendResult) when every recipient of a message is on the suppression list,
+    # nothing was sent. suppressed lists the addresses.
+    def __init__(self, suppressed: list):
+        self.suppressed = list(suppressed)
+        super().__init__(f"every recipient is suppressed: {', '.join(self.suppressed)}")
+
+    def __reduce__(self):
+        return (SuppressedRecipientError, (self.suppressed,))
+
+
+class PayloadValidationError(ValueError):
+    # raised (or returned in a SendResult) when a message fails the local checks before sending, see
+    # py_basic_ses.validation. errors is the list of FieldErrors.
+    def __init__(self, errors: list):
+        self.errors = list(errors)
+        super().__init__("invalid message: " + "; ".join(f"{error.field}: {error.message}" for error in self.errors))
+
+    def __reduce__(self):
+        return (PayloadValidationError, (self.errors,))
@@ -0,0 +1,266 @@
+from botocore.exceptions import ClientError
+from contextlib import contextmanager
+import bisect, threading, time
+
+# seconds, from a fast local call to a slow retried one
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# error codes counted as throttling
+THROTTLING_ERROR_CODES = frozenset(['Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled', 'TooManyRequestsException'])
+
+
+def error_code(error: Exception) -> str:
+    # the AWS error code for a ClientError, otherwise the exception's class name
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') or 'Unknown'
+    return type(error).__name__
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    # a value that goes up and down, like a queue depth
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry == None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_label_key(labels))
+        return 0 if entry == None else entry[2]
+
+
+    def sum(self, **labels) -> float:
+        entry = self._values.get(_label_key(labels))
+        return 0.0 if entry == None else entry[1]
+
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    # In process counters, gauges, and histograms. render() returns them in the Prometheus text format, so they can be
+    # served from a /metrics endpoint. Safe to share between threads.
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+
+    def _get(self, metric_class, name: str, *args):
+        metric = self._metrics.get(name)
+        if metric == None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric == None:
+                    metric = self._metrics[name] = metric_class(name, *args)
+        if not isinstance(metric, metric_class):
+            raise ValueError(f"{name} is already registered as a {type(metric).__name__}")
+        return metric
+
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get(Gauge, name, help)
+
+
+    def histogram(self, name: str, help: str = "", buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+# the registry Instrumentation records to by default
+default_metrics = MetricsRegistry()
+
+
+def opentelemetry_tracer(name: str = "py_basic_ses"):
+    # an OpenTelemetry tracer if opentelemetry-api is installed, otherwise None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer(name)
+
+
+class Instrumentation:
+    # Pass to a sender (instrumentation=...) to time every phase of a send and count the outcomes.
+    # Senders without instrumentation skip all of this, so it costs nothing when it isn't used.
+    #
+    # Phases, recorded in py_basic_ses_phase_seconds{phase=...}:
+    #   validate - checking the credentials
+    #   client   - getting (or building) the boto3 client
+    #   send     - one SES API call, including retries
+    #   total    - the whole send_email_result() call
+    #
+    # registry  - MetricsRegistry to record to, default_metrics by default
+    # tracer    - optional OpenTelemetry tracer (see opentelemetry_tracer()), every phase becomes a span
+    # pre_send  - optional callback(sender, operation, payload), called before each SES API call
+    # post_send - optional callback(sender, operation, response, error, seconds), called after each SES API call,
+    #             exactly one of response or error is set
+    def __init__(self, registry: MetricsRegistry = None, tracer = None, pre_send = None, post_send = None):
+        if registry == None:
+            registry = default_metrics
+        self.registry = registry
+        self.tracer = tracer
+        self.pre_send = pre_send
+        self.post_send = post_send
+
+        self.phase_seconds = registry.histogram("py_basic_ses_phase_seconds", "Time spent in each phase of a send")
+        self.send_seconds = registry.histogram("py_basic_ses_send_seconds", "SES API call latency, including retries")
+        self.sent = registry.counter("py_basic_ses_sent_total", "SES API calls that succeeded")
+        self.failed = registry.counter("py_basic_ses_failed_total", "SES API calls that failed, by error code")
+        self.throttled = registry.counter("py_basic_ses_throttled_total", "Attempts SES throttled, including ones that were retried")
+        self.retries = registry.counter("py_basic_ses_retries_total", "Extra attempts made by retry policies")
+
+
+    @contextmanager
+    def phase(self, name: str, **attributes):
+        # time the block as phase name, in a span if there is a tracer
+        start = time.perf_counter()
+        try:
+            if self.tracer == None:
+                yield
+            else:
+                with self.tracer.start_as_current_span(f"ses.{name}") as span:
+                    for key, value in attributes.items():
+                        if value != None:
+                            span.set_attribute(key, value)
+                    yield
+        finally:
+            self.phase_seconds.observe(time.perf_counter() - start, phase=name)
+
+
+    def attempt_failed(self, operation: str, error: Exception):
+        # called for every failed attempt, before the retry policy decides whether to try again
+        if error_code(error) in THROTTLING_ERROR_CODES:
+            self.throttled.inc(operation=operation)
+
+
+    def call(self, sender, operation: str, payload: dict, call_api) -> tuple:
+        # wraps SESBase._call_api, returns (response, attempts) like it does
+        if self.pre_send != None:
+            self.pre_send(sender, operation, payload)
+
+        start = time.perf_counter()
+        try:
+            with self.phase("send", **{"aws.region": sender.aws_region, "ses.operation": operation}):
+                response, attempts = call_api(operation, payload)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self.send_seconds.observe(elapsed, operation=operation)
+            self.failed.inc(operation=operation, error_code=error_code(e))
+            attempts = getattr(e, "attempts", 1)
+            if attempts > 1:
+                self.retries.inc(attempts - 1, operation=operation)
+            if self.post_send != None:
+                self.post_send(sender, operation, None, e, elapsed)
+            raise
+
+        elapsed = time.perf_counter() - start
+        self.send_seconds.observe(elapsed, operation=operation)
+        self.sent.inc(operation=operation)
+        if attempts > 1:
+            self.retries.inc(attempts - 1, operation=operation)
+        if self.post_send != None:
+            self.post_send(sender, operation, response, None, elapsed)
+        return response, attempts
@@ -0,0 +1,167 @@
+def _address_tuple(addresses) -> tuple:
+    # accept a single address, None, or any iterable of addresses
+    if addresses == None:
+        return ()
+    if isinstance(addresses, str):
+        return (addresses,)
+    return tuple(addresses)
+
+
+class EmailMessage:
+    # One email, separate from anything about how it's sent (region, credentials, client, retries).
+    # Immutable, with __slots__ and recipients stored as tuples, so hundreds of thousands of queued messages
+    # cost a small fixed amount each and can be shared between threads. The field names match the SESSender
+    # arguments. Use replace() to get a changed copy.
+    __slots__ = ('sendto', 'fromaddr', 'message_txt', 'fromname', 'msgsubject', 'message_html', 'cc', 'bcc')
+
+    def __init__(self, sendto, fromaddr: str, message_txt: str, fromname: str = None, msgsubject: str = None, message_html: str = None,
+                 cc = None, bcc = None):
+        setfield = object.__setattr__
+        setfield(self, 'sendto', _address_tuple(sendto))
+        setfield(self, 'fromaddr', fromaddr)
+        setfield(self, 'message_txt', message_txt)
+        setfield(self, 'fromname', fromname)
+        setfield(self, 'msgsubject', msgsubject)
+        setfield(self, 'message_html', message_html)
+        setfield(self, 'cc', _address_tuple(cc))
+        setfield(self, 'bcc', _address_tuple(bcc))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EmailMessage is immutable, use replace()")
+
+
+    def __delattr__(self, name):
+        raise AttributeError("EmailMessage is immutable")
+
+
+    def _fields(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+
+    def __eq__(self, other):
+        if not isinstance(other, EmailMessage):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+
+    def __hash__(self):
+        return hash(self._fields())
+
+
+    def __repr__(self):
+        return f"EmailMessage(sendto={self.sendto!r}, fromaddr={self.fromaddr!r}, msgsubject={self.msgsubject!r})"
+
+
+    def __reduce__(self):
+        # pickle (for process pools) through the constructor, since __setattr__ is blocked
+        return (EmailMessage, self._fields())
+
+
+    def replace(self, **changes) -> "EmailMessage":
+        fields = {field: getattr(self, field) for field in self.__slots__}
+        fields.update(changes)
+        return EmailMessage(**fields)
+
+
+    def to_dict(self) -> dict:
+        # SESSender keyword arguments (without the region) for this message, with lists for the recipients
+        result = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if isinstance(value, tuple):
+                if value:
+                    result[field] = list(value)
+            elif value != None:
+                result[field] = value
+        return result
+
+
+    @property
+    def source(self) -> str:
+        # 'Sender Name <senderaddr@email.com>' when there is a fromname, otherwise just the address
+        if self.fromname == None or self.fromname == "":
+            return self.fromaddr
+        return self.fromname + " <" + self.fromaddr + ">"
+
+
+    @property
+    def subject(self) -> str:
+        return "" if self.msgsubject == None else self.msgsubject
+
+
+    @property
+    def html_body(self) -> str:
+        # without an HTML body, the text body is sent as both
+        return self.message_txt if self.message_html == None else self.message_html
+
+
+class PayloadBuilder:
+    # Builds SES SendEmail keyword arguments from EmailMessage objects. Parts that are the same across
+    # messages (the charset, the Source string, and the {'Charset': ..., 'Data': ...} dict for a subject or
+    # body that repeats) are built once and shared, so a big batch holds one copy of each instead of one per
+    # message. Treat the payloads as read only, shared parts show up in more than one payload.
+    #
+    # max_cached_parts bounds the shared part cache, it is emptied when it fills up. Only strings up to
+    # max_cached_length characters are cached, so a run of big unique bodies never piles up in the cache.
+    def __init__(self, charset: str = "UTF-8", max_cached_parts: int = 1024, max_cached_length: int = 1024):
+        self.charset = charset
+        self.max_cached_parts = max_cached_parts
+        self.max_cached_length = max_cached_length
+        self._parts = {}
+        self._sources = {}
+
+
+    def _part(self, data: str) -> dict:
+        if data == None or len(data) > self.max_cached_length:
+            return {'Charset': self.charset, 'Data': data}
+        part = self._parts.get(data)
+        if part == None:
+            if len(self._parts) >= self.max_cached_parts:
+                self._parts.clear()
+            part = self._parts[data] = {'Charset': self.charset, 'Data': data}
+        return part
+
+
+    def _source(self, message: EmailMessage) -> str:
+        key = (message.fromname, message.fromaddr)
+        source = self._sources.get(key)
+        if source == None:
+            if len(self._sources) >= self.max_cached_parts:
+                self._sources.clear()
+            source = self._sources[key] = message.source
+        return source
+
+
+    def build(self, message: EmailMessage, to = None, cc = None, bcc = None, options: dict = None) -> dict:
+        # to, cc, and bcc default to every recipient of the message. options are extra top level keyword
+        # arguments, like ConfigurationSetName.
+        if to == None and cc == None and bcc == None:
+            to, cc, bcc = message.sendto, message.cc, message.bcc
+
+        destination = {}
+        if to:
+            destination['ToAddresses'] = list(to)
+        if cc:
+            destination['CcAddresses'] = list(cc)
+        if bcc:
+            destination['BccAddresses'] = list(bcc)
+
+        payload = {
+            'Destination': destination,
+            'Message': {
+                'Body': {
+                    'Html': self._part(message.html_body),
+                    'Text': self._part(message.message_txt),
+                },
+                'Subject': self._part(message.subject),
+            },
+            'Source': self._source(message),
+        }
+        if options:
+            payload.update(options)
+        return payload
+
+
+# the builder SESSender uses
+default_payload_builder = PayloadBuilder()
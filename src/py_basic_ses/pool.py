@@ -0,0 +1,252 @@
+from py_basic_ses.bulk import send_many
+from py_basic_ses.emailing import SESSender, _unsent_message
+from py_basic_ses.exceptions import CredError
+from py_basic_ses.message import EmailMessage
+from py_basic_ses.ratelimit import SESQuotaRateLimiter
+from py_basic_ses.results import SendResult
+from py_basic_ses.retry import is_retryable
+from botocore.exceptions import ClientError
+import random, threading, time
+
+ROUTING = ('weighted', 'least_loaded')
+
+# errors that say something is wrong with the region or account, rather than with the message
+ENDPOINT_ERROR_CODES = frozenset([
+    'AccountSendingPausedException',
+    'AccountSuspendedException',
+    'SendingPausedException',
+    'MailFromDomainNotVerifiedException',
+    'ConfigurationSetDoesNotExist',
+    'InvalidClientTokenId',
+    'UnrecognizedClientException',
+    'SignatureDoesNotMatch',
+    'AccessDenied',
+    'AccessDeniedException',
+])
+
+
+def is_endpoint_error(error: Exception) -> bool:
+    # True if another region or account might well send the message that failed here
+    if is_retryable(error) or isinstance(error, CredError):
+        return True
+    if isinstance(error, ClientError):
+        error_info = error.response.get('Error', {})
+        if error_info.get('Code') in ENDPOINT_ERROR_CODES:
+            return True
+        if 'daily message quota exceeded' in str(error_info.get('Message', '')).lower():
+            return True
+    return False
+
+
+class SenderEndpoint:
+    # One region/account a SenderPool can send through, with its own pooled client and rate limiter.
+    #
+    # weight            - share of the traffic, defaults to the account's MaxSendRate when quota_aware, otherwise 1
+    # quota_aware       - pace sends with an SESQuotaRateLimiter for this region/account, built on the first send
+    # rate_limiter      - use this limiter instead
+    # failure_threshold - consecutive endpoint errors (throttling, 5xx, credentials, paused sending) before the
+    #                     endpoint is taken out of rotation for cooldown seconds. After the cooldown it gets
+    #                     traffic again, and one more failure takes it straight back out.
+    # sender_options    - any other SESSender keyword arguments for sends through this endpoint, like retry_policy
+    def __init__(self, aws_region: str, aws_profile: str = None, weight: float = None, quota_aware: bool = True, headroom: float = 1.0,
+                 rate_limiter = None, failure_threshold: int = 3, cooldown: float = 30.0, **sender_options):
+        self.aws_region = aws_region
+        self.aws_profile = aws_profile
+        self.name = aws_region if aws_profile == None else f"{aws_region}/{aws_profile}"
+        self._weight = weight
+        self.quota_aware = quota_aware
+        self.headroom = headroom
+        self.rate_limiter = rate_limiter
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.sender_options = sender_options
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+
+    def limiter(self):
+        # the endpoint's rate limiter, reading the quota the first time it's needed
+        if self.rate_limiter == None and self.quota_aware:
+            with self._lock:
+                if self.rate_limiter == None:
+                    # the transport, if there is one, hands out clients the same way a client registry does
+                    registry = self.sender_options.get('transport') or self.sender_options.get('client_registry')
+                    self.rate_limiter = SESQuotaRateLimiter(self.aws_region, aws_profile=self.aws_profile, headroom=self.headroom, client_registry=registry)
+        return self.rate_limiter
+
+
+    @property
+    def weight(self) -> float:
+        if self._weight != None:
+            return self._weight
+        rate = getattr(self.rate_limiter, 'rate', None)
+        return rate if rate else 1.0
+
+
+    def healthy(self, now: float = None) -> bool:
+        if now == None:
+            now = time.monotonic()
+        return self.unhealthy_until <= now
+
+
+    def load(self) -> float:
+        # sends in flight per unit of weight, lower is less loaded
+        return self.in_flight / self.weight
+
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+
+    def succeeded(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.sent += 1
+            self.consecutive_failures = 0
+
+
+    def failed_send(self, endpoint_error: bool):
+        # endpoint_error is False when the message itself was the problem, which says nothing about the endpoint
+        with self._lock:
+            self.in_flight -= 1
+            self.failed += 1
+            if endpoint_error:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.failure_threshold:
+                    self.unhealthy_until = time.monotonic() + self.cooldown
+
+
+    def metrics(self) -> dict:
+        return {
+            "endpoint": self.name,
+            "healthy": self.healthy(),
+            "weight": self.weight,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class SenderPool:
+    # Spreads sends over several regions and/or accounts, so the pool can send faster than a single
+    # account's MaxSendRate, and moves traffic away from an endpoint that throttles or fails.
+    #
+    # routing       - 'weighted' picks endpoints at random in proportion to their weight, 'least_loaded' picks
+    #                 the endpoint with the fewest sends in flight for its weight
+    # max_failovers - how many other endpoints to try when a send fails with an endpoint error, default all of them
+    # sender_class  - class the senders are built with, SESSender or a subclass of it
+    #
+    # Messages are SESSender objects, EmailMessage objects, or dicts of SESSender keyword arguments, their aws_region and
+    # aws_profile are replaced with the endpoint's. An SESSender also keeps its sender_settings, unless the endpoint's
+    # sender_options set them. Its client_registry, transport, and instrumentation are the endpoint's.
+    # SESSender settings that aren't part of to_dict() but change what is sent, kept when an SESSender is rebuilt
+    # for an endpoint. A suppressed recipient must never be sent to, and a retry policy or dedup cache still applies.
+    sender_settings = ('retry_policy', 'dedup_cache', 'preflight', 'suppression_list')
+
+    def __init__(self, endpoints: list, routing: str = 'weighted', max_failovers: int = None, sender_class = SESSender, seed: int = None):
+        if not endpoints:
+            raise ValueError("at least one endpoint is required")
+        if routing not in ROUTING:
+            raise ValueError(f"routing must be one of {', '.join(ROUTING)}")
+        self.endpoints = list(endpoints)
+        self.routing = routing
+        if max_failovers == None:
+            max_failovers = len(self.endpoints) - 1
+        self.max_failovers = max_failovers
+        self.sender_class = sender_class
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+
+    def choose(self, exclude: list = ()) -> SenderEndpoint:
+        # pick an endpoint for the next send, skipping exclude. Healthy endpoints first, if none are healthy,
+        # the one that comes back soonest.
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in candidates if endpoint.healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda endpoint: endpoint.unhealthy_until)
+
+        if self.routing == 'least_loaded':
+            return min(healthy, key=lambda endpoint: endpoint.load())
+        with self._random_lock:
+            return self._random.choices(healthy, weights=[endpoint.weight for endpoint in healthy])[0]
+
+
+    def _message_options(self, message) -> dict:
+        # the SESSender keyword arguments for message, before the endpoint's are added
+        settings = {}
+        if isinstance(message, SESSender):
+            settings = {name: getattr(message, name) for name in self.sender_settings if getattr(message, name) != None}
+        if isinstance(message, (SESSender, EmailMessage)):
+            message = message.to_dict()
+        options = dict(message)
+        options.update(settings)
+        return options
+
+
+    def _sender(self, message, endpoint: SenderEndpoint) -> SESSender:
+        options = self._message_options(message)
+        options.update(endpoint.sender_options)
+        options['aws_region'] = endpoint.aws_region
+        options['aws_profile'] = endpoint.aws_profile
+        options['rate_limiter'] = endpoint.limiter()
+        return self.sender_class(**options)
+
+
+    def send_email_result(self, message) -> SendResult:
+        # Send one message through the pool and return its SendResult, with endpoint set to the endpoint
+        # that sent it. Endpoint errors fail over to another endpoint, any other error is raised right away.
+        # When every endpoint tried has failed, the last error is raised.
+        # A message over 50 recipients that an endpoint partly sent only fails over the recipients it didn't reach,
+        # message_ids (of the result, or of the error) lists the calls every endpoint made.
+        options = self._message_options(message)
+        sent_ids = []
+        tried = []
+        while True:
+            endpoint = self.choose(tried)
+            tried.append(endpoint)
+            endpoint.begin()
+            try:
+                result = self._sender(options, endpoint).send_email_result()
+            except Exception as e:
+                endpoint_error = is_endpoint_error(e)
+                endpoint.failed_send(endpoint_error)
+                if getattr(e, 'message_ids', None):
+                    sent_ids += e.message_ids
+                    options = _unsent_message(options, e.unsent_recipients)
+                if sent_ids:
+                    e.message_ids = list(sent_ids)
+                if not endpoint_error or len(tried) > self.max_failovers or len(tried) == len(self.endpoints):
+                    e.endpoint = endpoint.name
+                    raise
+                continue
+
+            endpoint.succeeded()
+            if sent_ids:
+                result.message_ids = sent_ids + result.message_ids
+                result.message_id = result.message_ids[0]
+            result.endpoint = endpoint.name
+            return result
+
+
+    def send_email(self, message) -> str:
+        return self.send_email_result(message).message_id
+
+
+    def send_many(self, messages, **kwargs):
+        # py_basic_ses.bulk.send_many() through this pool, takes the same keyword arguments
+        return send_many(messages, pool=self, **kwargs)
+
+
+    def metrics(self) -> list:
+        return [endpoint.metrics() for endpoint in self.endpoints]
@@ -0,0 +1,181 @@
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.clients import DEFAULT_MAX_POOL_CONNECTIONS
+from py_basic_ses.message import EmailMessage
+from py_basic_ses.results import SendResult
+from py_basic_ses.ratelimit import TokenBucket
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from itertools import islice
+import os, pickle
+
+# set in every worker process by _init_worker()
+_worker = None
+
+
+class _WorkerState:
+    # what one worker process needs to send a chunk, built once per process
+    def __init__(self, sender_class, sender_options: dict, render, threads: int, rate: float = None):
+        self.sender_class = sender_class
+        self.sender_options = sender_options
+        self.render = render
+        self.threads = threads
+        self.executor = None
+        if threads > 1:
+            self.executor = ThreadPoolExecutor(max_workers=threads)
+        # this worker's share of the rate limit, taken one message at a time by every thread of the worker
+        self.rate_limiter = None
+        if rate != None:
+            self.rate_limiter = TokenBucket(rate, capacity=1)
+
+
+def _init_worker(sender_class, sender_options: dict, render, threads: int, rate: float = None):
+    global _worker
+    _worker = _WorkerState(sender_class, sender_options, render, threads, rate)
+
+
+def _picklable_error(error: Exception) -> Exception:
+    # the error goes back to the parent process in the result, replace anything that can't make the trip
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return Exception(f"{type(error).__name__}: {error}")
+
+
+def _send_item(index: int, item) -> SendResult:
+    # runs in a worker process, never raises, any problem is returned in the result
+    try:
+        message = item if _worker.render == None else _worker.render(item)
+        if isinstance(message, SESSender):
+            sender = message
+        else:
+            if isinstance(message, EmailMessage):
+                message = message.to_dict()
+            options = dict(_worker.sender_options)
+            options.update(message)
+            options.setdefault("max_pool_connections", max(_worker.threads, DEFAULT_MAX_POOL_CONNECTIONS))
+            sender = _worker.sender_class(**options)
+
+        if _worker.rate_limiter != None:
+            _worker.rate_limiter.acquire()
+        result = sender.send_email_result()
+        result.index = index
+        return result
+
+    except Exception as e:
+        return SendResult(error=e, index=index, attempts=getattr(e, "attempts", 1))
+
+
+def _send_chunk(start: int, items: list) -> list:
+    # runs in a worker process, sends one chunk and returns its results in order
+    if _worker.executor == None:
+        results = [_send_item(start + offset, item) for offset, item in enumerate(items)]
+    else:
+        results = list(_worker.executor.map(_send_item, range(start, start + len(items)), items))
+    for result in results:
+        if result.error != None:
+            result.error = _picklable_error(result.error)
+    return results
+
+
+def _dispatchable(message):
+    # SESSender objects hold a client registry and locks, only their message fields are sent to the workers,
+    # plus the suppression list, which pickles as a copy of its addresses
+    if isinstance(message, SESSender):
+        options = message.to_dict()
+        if message.suppression_list != None:
+            options['suppression_list'] = message.suppression_list
+        return options
+    return message
+
+
+def send_many_processes(messages, processes: int = None, chunk_size: int = 32, threads_per_process: int = 4, rate_limit = None, ordered: bool = True,
+                        render = None, sender_class = SESSender, mp_context = None, **sender_options):
+    # Send every message from a pool of worker processes and yield a SendResult for each one, like
+    # py_basic_ses.bulk.send_many(). Use it when building the messages (HTML rendering, MIME encoding,
+    # attachments) keeps one process busy on the GIL before the SES quota is reached. Each worker process
+    # has its own pooled client and sends with threads_per_process threads.
+    #
+    # messages            - any iterable (including a generator) of dicts of SESSender keyword arguments,
+    #                       EmailMessage objects, SESSender objects (sent as their to_dict()), or, with render,
+    #                       anything render accepts. Everything must pickle.
+    # processes           - number of worker processes, defaults to the number of CPUs
+    # chunk_size          - messages per hand off to a worker, larger chunks mean less inter process traffic
+    # rate_limit          - optional cap on messages started per second for all the workers together. A number is
+    #                       split evenly between the workers, and each one paces its own sends one message at a
+    #                       time. A limiter with acquire(tokens) can't be shared between processes, so it is
+    #                       applied here to whole chunks as they are handed out, and a chunk can start in a burst.
+    # ordered             - yield results in input order if True, otherwise as soon as each chunk completes
+    # render              - optional function run in the worker on every message, it returns what is sent.
+    #                       It must be importable by the workers (a module level function, not a lambda).
+    # sender_class        - class the senders are built with in the workers, SESSender or a subclass of it
+    # mp_context          - multiprocessing context for the pool, the platform default when None
+    # sender_options      - default SESSender keyword arguments for every message, like aws_region or retry_policy
+    #
+    # At most 2 * processes chunks are pulled from the iterable ahead of the results being consumed, so
+    # memory stays flat no matter how large the input is.
+    if processes == None:
+        processes = os.cpu_count() or 1
+    if processes < 1:
+        raise ValueError("processes must be at least 1")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if threads_per_process < 1:
+        raise ValueError("threads_per_process must be at least 1")
+
+    # a plain number is paced in the workers, every worker gets an even share
+    worker_rate = None
+    if isinstance(rate_limit, (int, float)):
+        if rate_limit <= 0:
+            raise ValueError("rate_limit must be greater than 0")
+        worker_rate = rate_limit / processes
+        rate_limit = None
+
+    max_in_flight = processes * 2
+    messages = iter(messages)
+
+    def chunks():
+        start = 0
+        while True:
+            chunk = [_dispatchable(message) for message in islice(messages, chunk_size)]
+            if not chunk:
+                return
+            if rate_limit != None:
+                rate_limit.acquire(len(chunk))
+            yield start, chunk
+            start += len(chunk)
+
+    def chunk_results(start: int, count: int, future) -> list:
+        # a worker that died takes its chunk with it, report that on every message of the chunk
+        try:
+            return future.result()
+        except Exception as e:
+            return [SendResult(error=e, index=start + offset, attempts=0) for offset in range(count)]
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context, initializer=_init_worker,
+                             initargs=(sender_class, sender_options, render, threads_per_process, worker_rate)) as executor:
+        if ordered:
+            in_flight = deque()
+            for start, chunk in chunks():
+                # wait for the oldest chunk before pulling more work off the iterable
+                while len(in_flight) >= max_in_flight:
+                    yield from chunk_results(*in_flight.popleft())
+                in_flight.append((start, len(chunk), executor.submit(_send_chunk, start, chunk)))
+
+            while in_flight:
+                yield from chunk_results(*in_flight.popleft())
+
+        else:
+            in_flight = {}
+            for start, chunk in chunks():
+                # wait for any chunk to finish before pulling more work off the iterable
+                while len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from chunk_results(*in_flight.pop(future), future)
+                in_flight[executor.submit(_send_chunk, start, chunk)] = (start, len(chunk))
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from chunk_results(*in_flight.pop(future), future)
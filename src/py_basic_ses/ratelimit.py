@@ -0,0 +1,158 @@
+from py_basic_ses.clients import default_registry, SESClientRegistry
+import threading, time
+
+
+class TokenBucket:
+    # Thread safe token bucket. Tokens refill continuously at rate per second, up to capacity.
+    # acquire() takes tokens and sleeps for however long it takes for them to be available.
+    # A caller that has to wait reserves its tokens before sleeping, so waiting threads are
+    # served in the order they arrived and the long run rate never exceeds rate.
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        # default to a one second burst
+        if capacity == None:
+            self.capacity = max(1.0, self.rate)
+        else:
+            self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+        # metrics
+        self.acquired = 0
+        self.waits = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+
+    def _refill(self, now: float):
+        # must be called while holding the lock
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+    def set_rate(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            if capacity == None:
+                self.capacity = max(1.0, self.rate)
+            else:
+                self.capacity = float(capacity)
+            self._tokens = min(self._tokens, self.capacity)
+
+
+    def acquire(self, tokens: float = 1) -> float:
+        # take tokens from the bucket, sleeping if needed, and return the number of seconds waited
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            wait_time = 0.0
+            if self._tokens < 0:
+                wait_time = -self._tokens / self.rate
+                self.waits += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            self.acquired += 1
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        # take tokens only if they are available right now
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.acquired += 1
+                return True
+            return False
+
+
+    @property
+    def tokens(self) -> float:
+        # tokens available right now, 0 while callers are waiting on reserved tokens
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, self._tokens)
+
+
+    def metrics(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": max(0.0, self._tokens),
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "total_wait_time": self.total_wait_time,
+                "max_wait_time": self.max_wait_time,
+            }
+
+
+class SESQuotaRateLimiter(TokenBucket):
+    # Token bucket that paces sends to the account's SES MaxSendRate. The quota is read with GetSendQuota
+    # when the limiter is created, cached, and read again every refresh_interval seconds.
+    # headroom scales the rate, for example 0.9 to stay 10% under the quota.
+    def __init__(self, aws_region: str, aws_profile: str = None, refresh_interval: float = 300, headroom: float = 1.0, client_registry: SESClientRegistry = None):
+        self.aws_region = aws_region
+        self.aws_profile = aws_profile
+        self.refresh_interval = refresh_interval
+        self.headroom = headroom
+        if client_registry == None:
+            self.client_registry = default_registry
+        else:
+            self.client_registry = client_registry
+        self._refresh_lock = threading.Lock()
+        self.max_send_rate = None
+        self.max_24_hour_send = None
+        self.sent_last_24_hours = None
+        self.quota_read_at = None
+
+        super().__init__(self._read_quota())
+
+
+    def _read_quota(self) -> float:
+        client = self.client_registry.get_client(self.aws_region, aws_profile=self.aws_profile)
+        quota = client.get_send_quota()
+        self.max_send_rate = float(quota['MaxSendRate'])
+        self.max_24_hour_send = quota['Max24HourSend']
+        self.sent_last_24_hours = quota['SentLast24Hours']
+        self.quota_read_at = time.monotonic()
+        return self.max_send_rate * self.headroom
+
+
+    def refresh(self):
+        # read the quota again and apply the new rate
+        with self._refresh_lock:
+            self.set_rate(self._read_quota())
+
+
+    def acquire(self, tokens: float = 1) -> float:
+        # refresh the cached quota when it is stale, only one thread does the refresh
+        if self.refresh_interval != None and time.monotonic() - self.quota_read_at >= self.refresh_interval:
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self.set_rate(self._read_quota())
+                except Exception:
+                    # keep pacing at the last known quota, and try again after another interval
+                    self.quota_read_at = time.monotonic()
+                finally:
+                    self._refresh_lock.release()
+
+        return super().acquire(tokens)
+
+
+    def metrics(self) -> dict:
+        metrics = super().metrics()
+        metrics["max_send_rate"] = self.max_send_rate
+        metrics["max_24_hour_send"] = self.max_24_hour_send
+        metrics["sent_last_24_hours"] = self.sent_last_24_hours
+        return metrics
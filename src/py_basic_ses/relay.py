@@ -0,0 +1,398 @@
+from py_basic_ses.emailing import SESSender, BACKENDS
+from py_basic_ses.instrumentation import Instrumentation, default_metrics
+from py_basic_ses.sendqueue import SendQueue, DrainWorker
+from py_basic_ses.validation import validate_message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email import policy
+import json, socket, socketserver, threading
+
+# largest HTTP request body or SMTP message the relay accepts
+MAX_MESSAGE_BYTES = 10 * 1024 * 1024
+
+REQUIRED_FIELDS = ('sendto', 'fromaddr', 'message_txt', 'aws_region')
+
+
+def check_message(message, defaults: dict = None) -> dict:
+    # A message for the queue: a dict of SESSender message fields, with defaults filled in for the fields
+    # it leaves out. Raises ValueError when it can't be sent.
+    if not isinstance(message, dict):
+        raise ValueError("a message must be a json object")
+    unknown = set(message) - set(SESSender.message_fields)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+
+    result = dict(defaults or {})
+    result.update((field, value) for field, value in message.items() if value != None)
+    for field in REQUIRED_FIELDS:
+        if not result.get(field):
+            raise ValueError(f"{field} is required")
+    for field in ('sendto', 'cc', 'bcc'):
+        if not isinstance(result.get(field), (str, list, tuple, type(None))):
+            raise ValueError(f"{field} must be an address or a list of addresses")
+    if result.get('backend', 'ses') not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+    # a message SES would reject is refused now, rather than queued and given up on later
+    errors = validate_message(result)
+    if errors:
+        raise ValueError("; ".join(f"{error.field}: {error.message}" for error in errors))
+    return result
+
+
+def message_from_mime(data: bytes, envelope_from: str, envelope_to: list) -> dict:
+    # SESSender message fields for a message received over SMTP. The envelope recipients decide who gets it,
+    # envelope recipients that aren't in the To or Cc headers become bcc. Raises ValueError for messages the
+    # relay can't send, like ones with attachments.
+    mime = BytesParser(policy=policy.default).parsebytes(data)
+
+    def addresses(header: str) -> list:
+        return [address.addr_spec for value in mime.get_all(header, []) for address in value.addresses]
+
+    envelope = {address.lower(): address for address in envelope_to}
+    sendto = [address for address in addresses('To') if address.lower() in envelope]
+    cc = [address for address in addresses('Cc') if address.lower() in envelope]
+    listed = {address.lower() for address in sendto + cc}
+    bcc = [address for key, address in envelope.items() if key not in listed]
+    if not sendto and not cc:
+        raise ValueError("the message needs at least one To or Cc recipient")
+
+    if any(True for _ in mime.iter_attachments()):
+        raise ValueError("attachments are not supported by the relay")
+    text = mime.get_body(('plain',))
+    html = mime.get_body(('html',))
+    if text == None and html == None:
+        raise ValueError("the message has no text or html body")
+
+    fromname = None
+    fromaddr = envelope_from
+    if mime['From'] != None and mime['From'].addresses:
+        fromname = mime['From'].addresses[0].display_name or None
+        fromaddr = mime['From'].addresses[0].addr_spec
+
+    return {
+        'sendto': sendto,
+        'cc': cc or None,
+        'bcc': bcc or None,
+        'fromaddr': fromaddr,
+        'fromname': fromname,
+        'msgsubject': mime['Subject'],
+        # SESSender needs a text body, an html only message sends its html as both
+        'message_txt': (text or html).get_content(),
+        'message_html': None if html == None else html.get_content(),
+    }
+
+
+class _RelayHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if self.path != "/send":
+            self._send_json(404, {"error": "not found"})
+            return
+        relay = self.server.relay
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the body can't be found, so the connection can't be reused either
+            self.close_connection = True
+            relay.rejected.inc(protocol="http")
+            self._send_json(400, {"error": "Content-Length must be a whole number of bytes"})
+            return
+        if length > MAX_MESSAGE_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": f"request is larger than {MAX_MESSAGE_BYTES} bytes"})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(length).decode("utf-8"))
+            messages = body if isinstance(body, list) else [body]
+            # check every message before queuing any, so a rejected request can simply be fixed and sent again
+            checked = []
+            for index, message in enumerate(messages):
+                try:
+                    checked.append(relay.check(message))
+                except ValueError as e:
+                    if isinstance(body, list):
+                        raise ValueError(f"message {index}: {e}")
+                    raise
+        except ValueError as e:
+            relay.rejected.inc(protocol="http")
+            self._send_json(400, {"error": str(e)})
+            return
+
+        queue_ids = [relay.submit(message, protocol="http") for message in checked]
+        self._send_json(202, {"queued": queue_ids} if isinstance(body, list) else {"queued": queue_ids[0]})
+
+
+    def do_GET(self):
+        relay = self.server.relay
+        if self.path == "/health":
+            health = relay.health()
+            self._send_json(200 if health["status"] == "ok" else 503, health)
+        elif self.path == "/metrics":
+            self._send(200, relay.render_metrics().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+    def _send_json(self, status: int, body: dict):
+        self._send(status, json.dumps(body).encode("utf-8"), "application/json")
+
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        # one line per request on stderr is too much for a relay, results are in /metrics
+        pass
+
+
+class _RelaySMTPHandler(socketserver.StreamRequestHandler):
+    # The part of SMTP (RFC 5321) a local client needs to hand over mail: HELO/EHLO, MAIL, RCPT, DATA, RSET,
+    # NOOP, and QUIT. No TLS or AUTH, the relay is meant to listen on localhost.
+    disable_nagle_algorithm = True
+
+    def reply(self, line: str):
+        # replies are ASCII, an address echoed back in an error may not be
+        self.wfile.write(line.encode("ascii", "replace") + b"\r\n")
+
+
+    def handle(self):
+        relay = self.server.relay
+        hostname = self.server.hostname
+        self.reply(f"220 {hostname} ses-relay ready")
+        envelope_from = None
+        envelope_to = []
+
+        while True:
+            line = self.rfile.readline(65536)
+            if not line:
+                return
+            command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+            command = command.upper()
+
+            if command == "EHLO":
+                self.wfile.write(f"250-{hostname}\r\n250-SIZE {MAX_MESSAGE_BYTES}\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n".encode("ascii"))
+            elif command == "HELO":
+                self.reply(f"250 {hostname}")
+            elif command == "MAIL":
+                if not argument.upper().startswith("FROM:"):
+                    self.reply("501 syntax: MAIL FROM:<address>")
+                    continue
+                envelope_from = _smtp_address(argument[5:])
+                envelope_to = []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                if envelope_from == None:
+                    self.reply("503 MAIL first")
+                elif not argument.upper().startswith("TO:") or not _smtp_address(argument[3:]):
+                    self.reply("501 syntax: RCPT TO:<address>")
+                else:
+                    envelope_to.append(_smtp_address(argument[3:]))
+                    self.reply("250 OK")
+            elif command == "DATA":
+                if not envelope_to:
+                    self.reply("503 RCPT first")
+                    continue
+                self.reply("354 end data with <CR><LF>.<CR><LF>")
+                data = self.read_data()
+                if data == None:
+                    relay.rejected.inc(protocol="smtp")
+                    self.reply(f"552 message is larger than {MAX_MESSAGE_BYTES} bytes")
+                else:
+                    try:
+                        message = relay.check(message_from_mime(data, envelope_from, envelope_to))
+                    # LookupError is an unknown charset in the MIME
+                    except (ValueError, LookupError) as e:
+                        relay.rejected.inc(protocol="smtp")
+                        self.reply(f"554 {e}")
+                    else:
+                        self.reply(f"250 OK queued as {relay.submit(message, protocol='smtp')}")
+                envelope_from = None
+                envelope_to = []
+            elif command == "RSET":
+                envelope_from = None
+                envelope_to = []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 command not implemented")
+
+
+    def read_data(self) -> bytes:
+        # the message after DATA, up to the lone "." line, with dot stuffing undone. None when it is too large.
+        lines = []
+        size = 0
+        while True:
+            line = self.rfile.readline(65536)
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            if line.startswith(b"."):
+                line = line[1:]
+            size += len(line)
+            if size <= MAX_MESSAGE_BYTES:
+                lines.append(line)
+        if size > MAX_MESSAGE_BYTES:
+            return None
+        return b"".join(lines)
+
+
+def _smtp_address(argument: str) -> str:
+    # 'FROM:<a@b.com> SIZE=123' -> 'a@b.com'
+    argument = argument.strip()
+    if argument.startswith("<"):
+        return argument[1:argument.find(">")] if ">" in argument else argument[1:]
+    return argument.split(" ")[0]
+
+
+class _RelayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default listen backlog of 5 drops connections from bursts of local clients
+    request_queue_size = 128
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class SESRelay:
+    # Long running local relay in front of SESSender, so an app that sends mail doesn't pay for a Python
+    # interpreter, importing boto3, and a new SES connection on every message. Messages come in over a small
+    # HTTP/JSON API, and optionally SMTP, go into a SendQueue on disk, and a DrainWorker sends them with
+    # max_workers sends in flight over warm pooled clients. Accepting a message is a local insert, the
+    # send happens in the background.
+    #
+    # HTTP API:
+    #   POST /send     a json object (or list of objects) of SESSender message fields, 202 with the queue id(s)
+    #   GET  /health   200 with queue depth and send counts, 503 when the drain worker isn't running
+    #   GET  /metrics  py_basic_ses metrics in the Prometheus text format
+    #
+    # queue_path     - SQLite file of the SendQueue, messages still waiting are sent after a restart
+    # port           - HTTP port, 0 picks a free one
+    # smtp_port      - also accept SMTP on this port, None for HTTP only
+    # defaults       - message fields for messages that leave them out, like aws_region or fromaddr
+    # sender_options - extra SESSender keyword arguments for every send, like rate_limiter or retry_policy
+    # registry       - MetricsRegistry the relay and its sends record to, default_metrics by default
+    def __init__(self, queue_path: str, host: str = "127.0.0.1", port: int = 8025, smtp_port: int = None, defaults: dict = None,
+                 max_workers: int = 10, max_attempts: int = 5, sender_options: dict = None, registry = None, poll_interval: float = 0.5):
+        if registry == None:
+            registry = default_metrics
+        self.registry = registry
+        self.defaults = defaults or {}
+
+        options = {"instrumentation": Instrumentation(registry=registry)}
+        options.update(sender_options or {})
+        self.queue = SendQueue(queue_path)
+        self.worker = DrainWorker(self.queue, max_workers=max_workers, max_attempts=max_attempts, poll_interval=poll_interval, sender_options=options)
+
+        self.received = registry.counter("py_basic_ses_relay_received_total", "Messages the relay accepted, by protocol")
+        self.rejected = registry.counter("py_basic_ses_relay_rejected_total", "Messages the relay refused, by protocol")
+        self._queue_depth = registry.gauge("py_basic_ses_relay_queue_depth", "Messages waiting to be sent")
+        self._queue_dead = registry.gauge("py_basic_ses_relay_queue_dead", "Messages given up on")
+        self._oldest_age = registry.gauge("py_basic_ses_relay_oldest_age_seconds", "Age of the oldest waiting message")
+        self._drain_rate = registry.gauge("py_basic_ses_relay_drain_rate", "Messages sent per second over the last minute")
+
+        self._http = _RelayHTTPServer((host, port), _RelayHTTPHandler)
+        self._http.relay = self
+        self._smtp = None
+        if smtp_port != None:
+            self._smtp = _ThreadingSMTPServer((host, smtp_port), _RelaySMTPHandler)
+            self._smtp.relay = self
+            # looked up once, getfqdn() can wait on DNS
+            self._smtp.hostname = socket.getfqdn()
+        self._threads = []
+
+
+    @property
+    def http_url(self) -> str:
+        host, port = self._http.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    @property
+    def smtp_address(self) -> tuple:
+        return None if self._smtp == None else self._smtp.server_address[:2]
+
+
+    def check(self, message) -> dict:
+        return check_message(message, self.defaults)
+
+
+    def submit(self, message: dict, protocol: str = "python") -> int:
+        # queue a checked message and wake the worker, returns the queue id
+        queue_id = self.queue.enqueue(message)
+        self.received.inc(protocol=protocol)
+        self.worker.notify()
+        return queue_id
+
+
+    def health(self) -> dict:
+        return dict(self.worker.metrics(), status="ok" if self.worker.running else "stopped")
+
+
+    def render_metrics(self) -> str:
+        metrics = self.worker.metrics()
+        self._queue_depth.set(metrics["depth"])
+        self._queue_dead.set(metrics["dead"])
+        self._oldest_age.set(metrics["oldest_age"])
+        self._drain_rate.set(metrics["drain_rate"])
+        return self.registry.render()
+
+
+    def start(self):
+        # start the drain worker and the servers in background threads
+        if self._threads:
+            return self
+        self.worker.start()
+        for name, server in (("http", self._http), ("smtp", self._smtp)):
+            if server != None:
+                thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, name=f"py-basic-ses-relay-{name}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+
+    def serve_forever(self):
+        # start and block until stop() is called from another thread or KeyboardInterrupt
+        self.start()
+        try:
+            for thread in self._threads:
+                thread.join()
+        finally:
+            self.stop()
+
+
+    def stop(self):
+        # stop accepting messages, finish the sends in flight, and close the queue. Queued messages stay on disk.
+        for server in (self._http, self._smtp):
+            if server != None:
+                if self._threads:
+                    server.shutdown()
+                server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.worker.stop()
+        self.queue.close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,33 @@
+class SendResult:
+    # Outcome of sending one message. Exactly one of message_id or error is set.
+    # index is the position of the message in the input when the result comes from a bulk send.
+    # attempts is the number of SES calls made, more than 1 when the send was retried.
+    # message_ids lists every MessageId when the message had to be split into several SES calls,
+    # message_id is always the first one.
+    # duplicate is True when the message was already sent recently (see py_basic_ses.dedup) and SES wasn't called.
+    # endpoint names the region/account that sent the message when it went through a SenderPool.
+    # suppressed lists the recipients a suppression list (see py_basic_ses.suppression) took out, they were not sent to.
+    def __init__(self, message_id: str = None, error: Exception = None, index: int = None, attempts: int = 1, message_ids: list = None, duplicate: bool = False,
+                 endpoint: str = None, suppressed: list = None):
+        self.message_id = message_id
+        if message_ids == None and message_id != None:
+            message_ids = [message_id]
+        self.message_ids = message_ids or []
+        self.error = error
+        self.index = index
+        self.attempts = attempts
+        self.duplicate = duplicate
+        self.endpoint = endpoint
+        self.suppressed = suppressed or []
+
+
+    @property
+    def ok(self) -> bool:
+        return self.error == None
+
+
+    def __repr__(self):
+        if self.ok:
+            return f"SendResult(index={self.index}, message_id={self.message_id!r}, attempts={self.attempts})"
+        else:
+            return f"SendResult(index={self.index}, error={self.error!r}, attempts={self.attempts})"
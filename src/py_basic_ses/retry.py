@@ -0,0 +1,84 @@
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+import random, time
+
+# SES/AWS error codes that mean "try again later" rather than "this request is wrong"
+RETRYABLE_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'TooManyRequestsException',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'InternalFailure',
+    'InternalServerError',
+    'RequestTimeout',
+    'RequestTimeoutException',
+])
+
+
+def is_retryable(error: Exception) -> bool:
+    # connection problems and timeouts never reached SES, or never got an answer back, so they are safe to retry
+    if isinstance(error, (ConnectionError, HTTPClientError)):
+        return True
+
+    if isinstance(error, ClientError):
+        error_info = error.response.get('Error', {})
+        # SES reports a used up daily quota as Throttling too, but it won't clear up until the 24 hour window moves
+        if 'daily message quota exceeded' in str(error_info.get('Message', '')).lower():
+            return False
+        if error_info.get('Code') in RETRYABLE_ERROR_CODES:
+            return True
+        # any other server side error
+        status_code = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status_code != None and status_code >= 500:
+            return True
+
+    return False
+
+
+class RetryPolicy:
+    # Retries retryable errors with exponential backoff and decorrelated jitter
+    # (each delay is random between base_delay and 3x the previous delay, capped at max_delay),
+    # so workers that were throttled at the same moment don't all retry at the same moment.
+    #
+    # max_attempts - total attempts, including the first one
+    # base_delay   - smallest delay between attempts, in seconds
+    # max_delay    - largest delay between attempts, in seconds
+    # max_elapsed  - give up rather than sleep past this many seconds since the first attempt, None for no limit
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.1, max_delay: float = 20.0, max_elapsed: float = 60.0, retryable = is_retryable):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.retryable = retryable
+
+
+    def next_delay(self, previous_delay: float) -> float:
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous_delay * 3)))
+
+
+    def call(self, func, *args, **kwargs):
+        # Call func until it succeeds, raises a permanent error, or we run out of attempts or time.
+        # Returns (result, attempts). The error that ends the retries is raised with an attempts attribute.
+        start = time.monotonic()
+        delay = self.base_delay
+        attempts = 0
+
+        while True:
+            attempts += 1
+            try:
+                return func(*args, **kwargs), attempts
+            except Exception as e:
+                if attempts >= self.max_attempts or not self.retryable(e):
+                    e.attempts = attempts
+                    raise
+
+                delay = self.next_delay(delay)
+                if self.max_elapsed != None and time.monotonic() - start + delay > self.max_elapsed:
+                    e.attempts = attempts
+                    raise
+
+                time.sleep(delay)
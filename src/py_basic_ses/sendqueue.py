@@ -0,0 +1,284 @@
+from py_basic_ses.emailing import SESSender, _unsent_message
+from py_basic_ses.retry import is_retryable
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import json, sqlite3, threading, time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS messages_ready ON messages (dead, available_at, id);
+"""
+
+
+class SendQueue:
+    # Durable on disk queue of messages waiting to be sent, stored in SQLite in WAL mode.
+    # enqueue() is a single small insert, so callers don't wait on SES. A DrainWorker sends the messages.
+    #
+    # A message is claimed by pushing its available_at time into the future (a lease). It is deleted once SES
+    # returns a MessageId. If the process dies mid send, the lease runs out and the message is sent again
+    # by the next worker, so delivery is at least once.
+    def __init__(self, path: str):
+        self.path = path
+        # sqlite connections can't be shared between threads, every thread gets its own
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(_SCHEMA)
+
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection == None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # with WAL, NORMAL only risks the last transactions on power loss, never on a process crash
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+
+    def enqueue(self, message) -> int:
+        # queue an SESSender or a dict of SESSender keyword arguments and return its queue id.
+        # A suppression list can't be stored with the message, give it to the DrainWorker (sender_options) instead.
+        if isinstance(message, SESSender):
+            if message.suppression_list != None:
+                raise ValueError("a suppression list can't be queued with a message, pass it in the DrainWorker's sender_options")
+            message = message.to_dict()
+        elif message.get('suppression_list') != None:
+            raise ValueError("a suppression list can't be queued with a message, pass it in the DrainWorker's sender_options")
+        cursor = self._connection().execute("INSERT INTO messages (payload, enqueued_at) VALUES (?, ?)", (json.dumps(message), time.time()))
+        return cursor.lastrowid
+
+
+    def claim(self, limit: int, lease_seconds: float = 60) -> list:
+        # Lease up to limit ready messages and return them as (id, message dict, attempts so far) tuples.
+        # Other workers skip leased messages until the lease runs out.
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute("SELECT id, payload, attempts FROM messages WHERE dead = 0 AND available_at <= ? ORDER BY id LIMIT ?", (now, limit)).fetchall()
+            connection.executemany("UPDATE messages SET available_at = ? WHERE id = ?", [(now + lease_seconds, row[0]) for row in rows])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return [(row[0], json.loads(row[1]), row[2]) for row in rows]
+
+
+    def ack(self, message_id: int):
+        # the message was sent, remove it from the queue
+        self._connection().execute("DELETE FROM messages WHERE id = ?", (message_id,))
+
+
+    def fail(self, message_id: int, error: str, retry_in: float = None, message: dict = None):
+        # record a failed attempt. retry_in is how many seconds to wait before trying again, None means give up
+        # and keep the message as dead so it can be looked at later. message replaces the stored message,
+        # for a partly sent message that should only be retried to the recipients it didn't reach.
+        connection = self._connection()
+        if retry_in == None:
+            update, values = "UPDATE messages SET attempts = attempts + 1, last_error = ?, dead = 1", [error]
+        else:
+            update, values = "UPDATE messages SET attempts = attempts + 1, last_error = ?, available_at = ?", [error, time.time() + retry_in]
+        if message != None:
+            update += ", payload = ?"
+            values.append(json.dumps(message))
+        connection.execute(update + " WHERE id = ?", values + [message_id])
+
+
+    def depth(self) -> int:
+        # messages still waiting to be sent, including leased ones
+        return self._connection().execute("SELECT COUNT(*) FROM messages WHERE dead = 0").fetchone()[0]
+
+
+    def dead_count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM messages WHERE dead = 1").fetchone()[0]
+
+
+    def oldest_age(self) -> float:
+        # seconds since the oldest waiting message was queued, 0 if the queue is empty
+        oldest = self._connection().execute("SELECT MIN(enqueued_at) FROM messages WHERE dead = 0").fetchone()[0]
+        if oldest == None:
+            return 0.0
+        return max(0.0, time.time() - oldest)
+
+
+    def dead_messages(self, limit: int = 100) -> list:
+        # (id, message dict, attempts, last error) for messages that were given up on
+        rows = self._connection().execute("SELECT id, payload, attempts, last_error FROM messages WHERE dead = 1 ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row[0], json.loads(row[1]), row[2], row[3]) for row in rows]
+
+
+    def close(self):
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.ProgrammingError:
+                # connections made in other threads can only be closed by that thread, they close when it exits
+                pass
+        self._local = threading.local()
+
+
+class DrainWorker:
+    # Background thread that sends queued messages with up to max_workers sends in flight.
+    # Retryable errors (see py_basic_ses.retry.is_retryable) are retried with exponential backoff,
+    # up to max_attempts. Permanent errors, and messages out of attempts, are kept in the queue as dead.
+    #
+    # sender_options are extra SESSender keyword arguments for every send, like rate_limiter or client_registry.
+    def __init__(self, queue: SendQueue, max_workers: int = 4, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 300.0,
+                 poll_interval: float = 0.5, lease_seconds: float = 60, sender_options: dict = None, rate_window: float = 60.0):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.queue = queue
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.sender_options = sender_options or {}
+
+        self.sent = 0
+        self.failed = 0
+        # queue errors (like sqlite's "database is locked") the worker kept going through, and the most recent one
+        self.queue_errors = 0
+        self.last_error = None
+        # completion times of sends in the last rate_window seconds, for drain_rate()
+        self.rate_window = rate_window
+        self._recent = deque()
+        self._metrics_lock = threading.Lock()
+        self._stop = threading.Event()
+        # set by notify() so an idle worker picks up new messages without waiting out poll_interval
+        self._wake = threading.Event()
+        self._thread = None
+
+
+    def _send(self, queue_id: int, message: dict, attempts: int):
+        try:
+            # the message's own fields (like backend or configuration_set) win over the worker's sender_options
+            options = dict(self.sender_options)
+            options.update(message)
+            SESSender(**options).send_email_result()
+        except Exception as e:
+            attempts += 1
+            with self._metrics_lock:
+                self.failed += 1
+            # a message over 50 recipients that was partly sent keeps only the recipients it didn't reach,
+            # so they aren't sent to twice
+            unsent = None
+            if getattr(e, 'message_ids', None):
+                unsent = _unsent_message(message, e.unsent_recipients)
+            if is_retryable(e) and attempts < self.max_attempts:
+                self._record(self.queue.fail, queue_id, repr(e), retry_in=min(self.max_delay, self.base_delay * 2 ** (attempts - 1)), message=unsent)
+            else:
+                self._record(self.queue.fail, queue_id, repr(e), message=unsent)
+            return
+
+        self._record(self.queue.ack, queue_id)
+        with self._metrics_lock:
+            self.sent += 1
+            self._recent.append(time.monotonic())
+            self._trim_recent()
+
+
+    def _record(self, update, *args, **kwargs):
+        # Run a queue update (ack or fail) without letting a queue error end the worker. A message whose update
+        # didn't stick is claimed again once its lease runs out, so a sent message whose ack failed is sent again.
+        try:
+            update(*args, **kwargs)
+        except sqlite3.Error as e:
+            self._queue_error(e)
+
+
+    def _queue_error(self, error: Exception):
+        with self._metrics_lock:
+            self.queue_errors += 1
+            self.last_error = error
+
+
+    def drain_once(self, executor: ThreadPoolExecutor) -> int:
+        # claim a batch, send it, and return how many messages were claimed
+        claimed = self.queue.claim(self.max_workers * 2, lease_seconds=self.lease_seconds)
+        futures = [executor.submit(self._send, queue_id, message, attempts) for queue_id, message, attempts in claimed]
+        for future in futures:
+            future.result()
+        return len(claimed)
+
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="py-basic-ses-drain") as executor:
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    claimed = self.drain_once(executor)
+                except Exception as e:
+                    # keep draining, a locked or busy database usually clears up. Wait a poll before trying again.
+                    self._queue_error(e)
+                    claimed = 0
+                if claimed == 0:
+                    self._wake.wait(self.poll_interval)
+
+
+    def start(self):
+        if self._thread != None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="py-basic-ses-drain", daemon=True)
+        self._thread.start()
+
+
+    def notify(self):
+        # new messages were queued, start on them now if the worker is idle
+        self._wake.set()
+
+
+    @property
+    def running(self) -> bool:
+        return self._thread != None and self._thread.is_alive()
+
+
+    def stop(self, wait: bool = True):
+        # finish the batch in flight and stop, unsent messages stay in the queue
+        self._stop.set()
+        self._wake.set()
+        if wait and self._thread != None:
+            self._thread.join()
+
+
+    def _trim_recent(self):
+        # must be called while holding the metrics lock
+        cutoff = time.monotonic() - self.rate_window
+        while self._recent and self._recent[0] < cutoff:
+            self._recent.popleft()
+
+
+    def drain_rate(self) -> float:
+        # messages sent per second over the last rate_window seconds
+        with self._metrics_lock:
+            self._trim_recent()
+            return len(self._recent) / self.rate_window
+
+
+    def metrics(self) -> dict:
+        return {
+            "depth": self.queue.depth(),
+            "dead": self.queue.dead_count(),
+            "oldest_age": self.queue.oldest_age(),
+            "drain_rate": self.drain_rate(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "queue_errors": self.queue_errors,
+        }
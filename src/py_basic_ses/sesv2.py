@@ -0,0 +1,213 @@
+from py_basic_ses.emailing import SESBase, SESSender, MAX_RECIPIENTS_PER_MESSAGE, _address_list
+from py_basic_ses.exceptions import BulkDestinationError, SuppressedRecipientError, PayloadValidationError
+from py_basic_ses.message import EmailMessage
+from py_basic_ses.results import SendResult
+from py_basic_ses.transports import _pascal_case
+from py_basic_ses.validation import validate_message, MAX_MESSAGE_SIZE_V2
+from botocore.exceptions import ClientError
+from itertools import islice
+import json, threading, time
+
+# SESv2 accepts up to 50 entries in one SendBulkEmail call
+MAX_BULK_ENTRIES = 50
+
+# A template that is nothing but its replacement data, so every entry of a SendBulkEmail call can be a
+# completely different message. Triple braces keep SES from HTML escaping the values.
+_PASSTHROUGH_TEMPLATE = {
+    'Subject': '{{{subject}}}',
+    'Text': '{{{text}}}',
+    'Html': '{{{html}}}',
+}
+
+# The passthrough template is stored in SES under this name, created on first use. SES documents only
+# simple substitutions for template content given inline in the request, stored templates get full Handlebars.
+PASSTHROUGH_TEMPLATE_NAME = "py-basic-ses-passthrough"
+
+# entry statuses that can clear up on their own, re-sent when the sender has a retry_policy
+RETRYABLE_ENTRY_STATUSES = frozenset(['TRANSIENT_FAILURE', 'ACCOUNT_THROTTLED'])
+
+
+class BulkEmailSender(SESBase):
+    # Sends many different messages from one address with the SESv2 SendBulkEmail API, up to 50 messages per
+    # HTTP call instead of one call per message. Each message keeps its own recipients, subject, and bodies.
+    # Credentials, the shared client, rate limiting, retries, and instrumentation work the same way they do for SESSender.
+    api_operation = 'send_bulk_email'
+
+    # template_name   - name of the stored passthrough template. It is created in SES the first time this sender
+    #                   sends if it doesn't exist yet, which needs the ses:GetEmailTemplate and ses:CreateEmailTemplate
+    #                   permissions. Pass create_template=False if it is created some other way, or template_name=None
+    #                   to send the template inline in every call instead.
+    def __init__(self, fromaddr: str, aws_region: str, fromname: str = None, suppression_list = None, preflight: bool = True,
+                 template_name: str = PASSTHROUGH_TEMPLATE_NAME, create_template: bool = True, **kwargs):
+        super().__init__(aws_region, **kwargs)
+        self.template_name = template_name
+        self.create_template = create_template
+        self._template_ready = False
+        self._template_lock = threading.Lock()
+        self.fromaddr = fromaddr
+        self.fromname = fromname
+        # optional SuppressionList, suppressed recipients are left out of every entry, see SESSender
+        self.suppression_list = suppression_list
+        # check every message before it goes into a call, one bad address can fail the whole SendBulkEmail call
+        self.preflight = preflight
+
+
+    def _source(self) -> str:
+        if self.fromname == None or self.fromname == "":
+            return self.fromaddr
+        return self.fromname + " <" + self.fromaddr + ">"
+
+
+    def message_count(self, payload: dict) -> int:
+        return len(payload['BulkEmailEntries'])
+
+
+    def build_entry(self, message, suppressed: list = None) -> dict:
+        # One BulkEmailEntries item. message is an SESSender, an EmailMessage, or a dict of SESSender keyword arguments,
+        # only the message fields are used. Raises ValueError for a message this sender can't send, or
+        # PayloadValidationError (a ValueError) for one that fails the preflight checks.
+        # Recipients on the suppression list are left out and appended to suppressed, SuppressedRecipientError
+        # is raised when that leaves nobody.
+        if isinstance(message, (SESSender, EmailMessage)):
+            message = message.to_dict()
+        if message.get('fromaddr') not in (None, self.fromaddr):
+            raise ValueError(f"message is from {message['fromaddr']}, this sender sends from {self.fromaddr}")
+        if self.preflight:
+            errors = validate_message(dict(message, fromaddr=self.fromaddr), max_recipients=MAX_RECIPIENTS_PER_MESSAGE, max_size=MAX_MESSAGE_SIZE_V2)
+            if errors:
+                raise PayloadValidationError(errors)
+
+        destination = {}
+        removed = []
+        for field, key in (('sendto', 'ToAddresses'), ('cc', 'CcAddresses'), ('bcc', 'BccAddresses')):
+            addresses = _address_list(message.get(field))
+            if self.suppression_list != None:
+                addresses, field_removed = self.suppression_list.filter(addresses)
+                removed += field_removed
+            if addresses:
+                destination[key] = addresses
+        recipient_count = sum(len(addresses) for addresses in destination.values())
+        if recipient_count == 0:
+            if removed:
+                raise SuppressedRecipientError(removed)
+            raise ValueError("at least one recipient is required")
+        if suppressed != None:
+            suppressed.extend(removed)
+        if recipient_count > MAX_RECIPIENTS_PER_MESSAGE:
+            raise ValueError(f"a bulk entry can have at most {MAX_RECIPIENTS_PER_MESSAGE} recipients, use SESSender to split larger sends")
+
+        text = message.get('message_txt')
+        html = message.get('message_html')
+        # same defaults as SESSender.build_payload()
+        data = {'subject': message.get('msgsubject') or "", 'text': text, 'html': text if html == None else html}
+        return {
+            'Destination': destination,
+            'ReplacementEmailContent': {'ReplacementTemplate': {'ReplacementTemplateData': json.dumps(data)}},
+        }
+
+
+    def ensure_template(self, client):
+        # create the stored passthrough template if it doesn't exist yet, checked once per sender
+        if self.template_name == None or not self.create_template or self._template_ready:
+            return
+        with self._template_lock:
+            if self._template_ready:
+                return
+            try:
+                client.get_email_template(TemplateName=self.template_name)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'NotFoundException':
+                    raise
+                try:
+                    client.create_email_template(TemplateName=self.template_name, TemplateContent=_PASSTHROUGH_TEMPLATE)
+                except ClientError as e:
+                    # another sender created it first
+                    if e.response.get('Error', {}).get('Code') != 'AlreadyExistsException':
+                        raise
+            self._template_ready = True
+
+
+    def build_payload(self, entries: list) -> dict:
+        if self.template_name == None:
+            template = {'TemplateContent': _PASSTHROUGH_TEMPLATE, 'TemplateData': '{}'}
+        else:
+            template = {'TemplateName': self.template_name, 'TemplateData': '{}'}
+        return {
+            'FromEmailAddress': self._source(),
+            'DefaultContent': {'Template': template},
+            'BulkEmailEntries': entries,
+            **self.request_options(),
+        }
+
+
+    def send_bulk(self, messages):
+        # Send every message and yield a SendResult per message, in input order. messages can be any iterable of
+        # SESSender objects or dicts of SESSender keyword arguments. An entry SES rejects gets a BulkDestinationError,
+        # a message that can't be sent gets the ValueError, PayloadValidationError, or SuppressedRecipientError and is
+        # left out of the call, and a call that fails entirely gives every message in that call the error that was raised.
+        # With a retry_policy, entries SES reports as TRANSIENT_FAILURE or ACCOUNT_THROTTLED are sent again.
+        self.validate_credentials()
+        self.ensure_template(self.get_client(service='sesv2'))
+
+        messages = iter(messages)
+        index = 0
+        while True:
+            chunk = list(islice(messages, MAX_BULK_ENTRIES))
+            if not chunk:
+                return
+
+            results = [None] * len(chunk)
+            entries = []
+            entry_offsets = []
+            suppressed = [[] for _ in chunk]
+            for offset, message in enumerate(chunk):
+                try:
+                    entries.append(self.build_entry(message, suppressed[offset]))
+                    entry_offsets.append(offset)
+                except (ValueError, SuppressedRecipientError) as e:
+                    results[offset] = SendResult(error=e, index=index + offset, attempts=0)
+
+            if entries:
+                self._send_entries(entries, entry_offsets, results, suppressed, index)
+
+            yield from results
+            index += len(chunk)
+
+
+    def _send_entries(self, entries: list, entry_offsets: list, results: list, suppressed: list, index: int):
+        # Send one call's entries and fill in their results. With a retry_policy, entries that come back
+        # TRANSIENT_FAILURE or ACCOUNT_THROTTLED are sent again in a call of their own, with the policy's backoff,
+        # until they succeed or the policy's attempts or time run out.
+        pending = list(zip(entry_offsets, entries))
+        attempts_by_offset = dict.fromkeys(entry_offsets, 0)
+        start = time.monotonic()
+        delay = 0.0 if self.retry_policy == None else self.retry_policy.base_delay
+        rounds = 0
+        while pending:
+            rounds += 1
+            try:
+                response, attempts = self.call_api(self.api_operation, self.build_payload([entry for offset, entry in pending]))
+            except Exception as e:
+                for offset, entry in pending:
+                    results[offset] = SendResult(error=e, index=index + offset, attempts=attempts_by_offset[offset] + getattr(e, "attempts", 1))
+                return
+
+            retry = []
+            for (offset, entry), status in zip(pending, response['BulkEmailEntryResults']):
+                attempts_by_offset[offset] += attempts
+                if status.get('Status') == 'SUCCESS':
+                    results[offset] = SendResult(message_id=status.get('MessageId'), index=index + offset, attempts=attempts_by_offset[offset],
+                                                 suppressed=suppressed[offset])
+                    continue
+                error = BulkDestinationError(_pascal_case(status.get('Status', 'FAILED')), status.get('Error'))
+                results[offset] = SendResult(error=error, index=index + offset, attempts=attempts_by_offset[offset])
+                if status.get('Status') in RETRYABLE_ENTRY_STATUSES:
+                    retry.append((offset, entry))
+
+            if not retry or self.retry_policy == None or rounds >= self.retry_policy.max_attempts:
+                return
+            delay = self.retry_policy.next_delay(delay)
+            if self.retry_policy.max_elapsed != None and time.monotonic() - start + delay > self.retry_policy.max_elapsed:
+                return
+            time.sleep(delay)
+            pending = retry
@@ -0,0 +1,154 @@
+from py_basic_ses.clients import default_registry
+from email.utils import parseaddr
+import threading, time
+
+# the reasons SES puts an address on the account level suppression list
+SES_SUPPRESSION_REASONS = ('BOUNCE', 'COMPLAINT')
+
+
+def normalize_address(address: str) -> str:
+    # 'Some Name <Some.One@Domain.com> ' -> 'some.one@domain.com', SES matches suppressed addresses without case
+    if "<" not in address:
+        return address.strip().lower()
+    name, addr_spec = parseaddr(address)
+    return (addr_spec or address).strip().lower()
+
+
+def read_suppression_file(path: str) -> list:
+    # One address per line. Blank lines, '#' comments, and lines without an '@' (like a csv header) are
+    # skipped. For csv files, the address is the first column.
+    addresses = []
+    with open(path, "r", encoding="utf-8") as suppression_file:
+        for line in suppression_file:
+            address = line.split("#", 1)[0].split(",", 1)[0].strip().strip('"')
+            if "@" in address:
+                addresses.append(address)
+    return addresses
+
+
+def fetch_ses_suppressions(aws_region: str, aws_profile: str = None, client_registry = None, reasons: tuple = SES_SUPPRESSION_REASONS,
+                           page_size: int = 1000) -> list:
+    # every address on the account level suppression list (SESv2 ListSuppressedDestinations), one page at a time
+    if client_registry == None:
+        client_registry = default_registry
+    client = client_registry.get_client(aws_region, aws_profile=aws_profile, service='sesv2')
+
+    addresses = []
+    request = {'Reasons': list(reasons), 'PageSize': page_size}
+    while True:
+        response = client.list_suppressed_destinations(**request)
+        addresses.extend(summary['EmailAddress'] for summary in response.get('SuppressedDestinationSummaries', []))
+        next_token = response.get('NextToken')
+        if not next_token:
+            return addresses
+        request['NextToken'] = next_token
+
+
+class SuppressionList:
+    # Addresses that must not be sent to, like ones that hard bounced or complained. Pass it to a sender
+    # (suppression_list=...) and suppressed recipients are taken out before anything is sent.
+    #
+    # The addresses are kept normalized (see normalize_address()) in a set, so a check is one hash lookup
+    # and is exact. A refresh builds a new set and swaps it in, so checks never wait on a refresh.
+    #
+    # loader           - optional function returning every suppressed address, used by refresh()
+    # refresh_interval - seconds after which the next check reloads from loader, None to only load once.
+    #                    A failed reload keeps the old addresses and is kept in last_error.
+    def __init__(self, addresses = (), loader = None, refresh_interval: float = None):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.last_error = None
+        # held while loading, so only one thread loads at a time
+        self._refresh_lock = threading.Lock()
+        # held while swapping in a new set, never during a load
+        self._lock = threading.Lock()
+        self._added = set()
+        self._addresses = set(normalize_address(address) for address in addresses)
+        self.loaded_at = time.monotonic()
+        if loader != None:
+            self.refresh()
+
+
+    @classmethod
+    def from_file(cls, path: str, refresh_interval: float = None):
+        # addresses from a file, see read_suppression_file(). With refresh_interval the file is read again.
+        return cls(loader=lambda: read_suppression_file(path), refresh_interval=refresh_interval)
+
+
+    @classmethod
+    def from_ses(cls, aws_region: str, aws_profile: str = None, client_registry = None, reasons: tuple = SES_SUPPRESSION_REASONS,
+                 refresh_interval: float = 3600):
+        # The SES account level suppression list, fetched page by page once and then every refresh_interval seconds.
+        return cls(loader=lambda: fetch_ses_suppressions(aws_region, aws_profile=aws_profile, client_registry=client_registry, reasons=reasons),
+                   refresh_interval=refresh_interval)
+
+
+    def refresh(self):
+        # reload from loader now, raises if the loader fails
+        with self._refresh_lock:
+            self._load()
+
+
+    def _load(self):
+        # must be called while holding the refresh lock
+        addresses = set(normalize_address(address) for address in self.loader())
+        with self._lock:
+            # addresses added with add() stay suppressed even if the source doesn't have them yet
+            addresses.update(self._added)
+            self._addresses = addresses
+            self.loaded_at = time.monotonic()
+            self.last_error = None
+
+
+    def _refresh_if_stale(self):
+        if self.loader == None or self.refresh_interval == None or time.monotonic() - self.loaded_at < self.refresh_interval:
+            return
+        # only one thread reloads, the others keep checking against the current set
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self.loaded_at >= self.refresh_interval:
+                self._load()
+        except Exception as e:
+            # try again after another interval, the old addresses are better than none
+            self.loaded_at = time.monotonic()
+            self.last_error = e
+        finally:
+            self._refresh_lock.release()
+
+
+    def add(self, address: str):
+        # suppress an address right away, for example from a bounce notification
+        address = normalize_address(address)
+        with self._lock:
+            self._added.add(address)
+            self._addresses.add(address)
+
+
+    def __contains__(self, address: str) -> bool:
+        self._refresh_if_stale()
+        return normalize_address(address) in self._addresses
+
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+
+    def filter(self, addresses: list) -> tuple:
+        # split addresses into (allowed, suppressed), both in their original order and spelling
+        self._refresh_if_stale()
+        suppressed_set = self._addresses
+        allowed = []
+        suppressed = []
+        for address in addresses:
+            if normalize_address(address) in suppressed_set:
+                suppressed.append(address)
+            else:
+                allowed.append(address)
+        return allowed, suppressed
+
+
+    def __reduce__(self):
+        # pickles (for process pools) as a fixed copy of the current addresses, without the loader
+        with self._lock:
+            return (SuppressionList, (frozenset(self._addresses),))
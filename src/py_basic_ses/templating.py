@@ -0,0 +1,227 @@
+from py_basic_ses.emailing import SESBase, SESSender
+from py_basic_ses.exceptions import BulkDestinationError, PayloadValidationError
+from py_basic_ses.results import SendResult
+from py_basic_ses.validation import validate_message
+from collections import OrderedDict
+from itertools import islice
+from html import escape as escape_html_value
+import json, re, threading
+
+# SES accepts up to 50 destinations in one SendBulkTemplatedEmail call
+MAX_BULK_DESTINATIONS = 50
+
+# {{name}} placeholders, the same syntax SES templates use, so a layout can move between local and SES templates.
+# Like SES, {{name}} is HTML escaped in an html layout and {{{name}}} inserts the value as is.
+_PLACEHOLDER = re.compile(r"\{\{\{\s*([A-Za-z0-9_.\-]+)\s*\}\}\}|\{\{\s*([A-Za-z0-9_.\-]+)\s*\}\}")
+
+
+class CompiledTemplate:
+    # A template split once into literal text and placeholder names, so rendering is a single join
+    # instead of a search and replace over the whole template for every recipient.
+    # With escape_html, {{name}} values are HTML escaped and {{{name}}} values are not.
+    def __init__(self, source: str, escape_html: bool = False):
+        self.source = source
+        self.escape_html = escape_html
+        self.literals = []
+        self.names = []
+        # True for every placeholder whose value is escaped
+        self.escaped = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            self.literals.append(source[position:match.start()])
+            raw_name, name = match.group(1), match.group(2)
+            # dotted names look up nested values, like {{user.first_name}}
+            self.names.append((raw_name or name).split("."))
+            self.escaped.append(escape_html and raw_name == None)
+            position = match.end()
+        self.literals.append(source[position:])
+
+
+    def render(self, data: dict) -> str:
+        parts = [self.literals[0]]
+        for name, escaped, literal in zip(self.names, self.escaped, self.literals[1:]):
+            value = data
+            for key in name:
+                try:
+                    value = value[key]
+                except (KeyError, TypeError):
+                    raise KeyError(f"template value missing for {'.'.join(name)}")
+            parts.append(escape_html_value(str(value)) if escaped else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+
+class TemplateCache:
+    # Thread safe LRU cache of compiled templates keyed on the template text and whether it escapes html.
+    # The least recently used template is evicted once maxsize templates are cached.
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def get(self, source: str, escape_html: bool = False) -> CompiledTemplate:
+        key = (source, escape_html)
+        with self._lock:
+            template = self._templates.get(key)
+            if template != None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        # compile outside the lock, two threads compiling the same template at once is harmless
+        template = CompiledTemplate(source, escape_html)
+
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+                self.evictions += 1
+        return template
+
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+    def __len__(self):
+        return len(self._templates)
+
+
+# cache shared by every EmailTemplate that isn't given its own
+default_template_cache = TemplateCache()
+
+
+def render_template(source: str, data: dict, cache: TemplateCache = None, escape_html: bool = False) -> str:
+    if cache == None:
+        cache = default_template_cache
+    return cache.get(source, escape_html).render(data)
+
+
+class EmailTemplate:
+    # A subject, plain text, and optional html layout with {{name}} placeholders, rendered locally per recipient.
+    # Values are HTML escaped in the html layout, the way SES renders it, use {{{name}}} for a value that is already html.
+    def __init__(self, subject: str, text: str, html: str = None, cache: TemplateCache = None):
+        self.subject = subject
+        self.text = text
+        self.html = html
+        if cache == None:
+            self.cache = default_template_cache
+        else:
+            self.cache = cache
+
+
+    def render(self, data: dict):
+        # returns (subject, text, html), html is None if the template has no html layout
+        html = None
+        if self.html != None:
+            html = self.cache.get(self.html, escape_html=True).render(data)
+        return self.cache.get(self.subject).render(data), self.cache.get(self.text).render(data), html
+
+
+    def sender(self, sendto: str, fromaddr: str, aws_region: str, data: dict, **kwargs) -> SESSender:
+        # build an SESSender for one recipient, extra keyword arguments are passed on to SESSender
+        subject, text, html = self.render(data)
+        return SESSender(sendto=sendto, fromaddr=fromaddr, aws_region=aws_region, msgsubject=subject, message_txt=text, message_html=html, **kwargs)
+
+
+class BulkTemplateSender(SESBase):
+    # Sends a template stored in SES to many destinations with SendBulkTemplatedEmail, up to 50 destinations per call.
+    # Credentials, the shared client, rate limiting, and retries work the same way they do for SESSender.
+    api_operation = 'send_bulk_templated_email'
+
+    def __init__(self, fromaddr: str, aws_region: str, template_name: str, fromname: str = None, default_data: dict = None,
+                 preflight: bool = True, **kwargs):
+        super().__init__(aws_region, **kwargs)
+        self.fromaddr = fromaddr
+        self.fromname = fromname
+        self.template_name = template_name
+        self.default_data = default_data
+        # check every destination before it goes into a call, one bad address can fail the whole call
+        self.preflight = preflight
+
+
+    def _source(self) -> str:
+        if self.fromname == None or self.fromname == "":
+            return self.fromaddr
+        return self.fromname + " <" + self.fromaddr + ">"
+
+
+    def message_count(self, payload: dict) -> int:
+        return len(payload['Destinations'])
+
+
+    def preflight_check(self, address: str) -> list:
+        # The problems SES would reject one destination for, as a list of FieldErrors. The template itself is
+        # stored in SES, so only the addresses are checked.
+        return validate_message({'sendto': address, 'fromaddr': self.fromaddr, 'message_txt': ""}, max_recipients=MAX_BULK_DESTINATIONS, max_size=None)
+
+
+    def build_payload(self, destinations: list) -> dict:
+        # destinations is a list of (address, data) tuples
+        return {
+            'Source': self._source(),
+            'Template': self.template_name,
+            'DefaultTemplateData': json.dumps(self.default_data or {}),
+            'Destinations': [
+                {
+                    'Destination': {'ToAddresses': [address]},
+                    'ReplacementTemplateData': json.dumps(data or {}),
+                }
+                for address, data in destinations
+            ],
+            **self.request_options(),
+        }
+
+
+    def send_bulk(self, destinations):
+        # Send the template to every destination and yield a SendResult per destination, in input order.
+        # destinations can be addresses, or (address, data) tuples where data fills in that recipient's placeholders.
+        # A destination that fails the preflight checks gets a PayloadValidationError and is left out of the call.
+        # A destination SES rejects gets a BulkDestinationError, a call that fails entirely gives every
+        # destination in that call the error that was raised.
+        self.validate_credentials()
+        self.get_client()
+
+        normalized = ((destination, None) if isinstance(destination, str) else destination for destination in destinations)
+        index = 0
+        while True:
+            chunk = list(islice(normalized, MAX_BULK_DESTINATIONS))
+            if not chunk:
+                return
+
+            results = [None] * len(chunk)
+            valid = []
+            valid_offsets = []
+            for offset, (address, data) in enumerate(chunk):
+                errors = self.preflight_check(address) if self.preflight else []
+                if errors:
+                    results[offset] = SendResult(error=PayloadValidationError(errors), index=index + offset, attempts=0)
+                else:
+                    valid.append((address, data))
+                    valid_offsets.append(offset)
+
+            if valid:
+                try:
+                    response, attempts = self.call_api(self.api_operation, self.build_payload(valid))
+                except Exception as e:
+                    for offset in valid_offsets:
+                        results[offset] = SendResult(error=e, index=index + offset, attempts=getattr(e, "attempts", 1))
+                else:
+                    for offset, status in zip(valid_offsets, response['Status']):
+                        if status.get('Status') == 'Success':
+                            results[offset] = SendResult(message_id=status.get('MessageId'), index=index + offset, attempts=attempts)
+                        else:
+                            results[offset] = SendResult(error=BulkDestinationError(status.get('Status'), status.get('Error')), index=index + offset,
+                                                         attempts=attempts)
+
+            yield from results
+            index += len(chunk)
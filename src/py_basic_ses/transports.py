@@ -0,0 +1,411 @@
+from py_basic_ses.clients import default_registry, SESClientRegistry
+from py_basic_ses.ratelimit import TokenBucket
+from botocore.exceptions import ClientError
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from xml.sax.saxutils import escape
+import base64, itertools, random, threading, time, uuid
+
+# A transport is anything with a get_client(aws_region, aws_profile=None, service='ses', max_pool_connections=None)
+# method that returns an object with the SES (v1) client methods the senders call: send_email, send_raw_email,
+# send_bulk_templated_email, and get_send_quota, taking and returning the same shapes boto3 does.
+# A transport with requires_credentials = False skips the credentials check before sending.
+# Senders with a retry_policy also pass botocore_retries=False, asking for a client that doesn't retry on its own.
+
+# boto3 SES (v1) client, shared and pooled. This is what every sender uses when no transport is given.
+Boto3Transport = SESClientRegistry
+
+
+def _pascal_case(status: str) -> str:
+    # SESv2 reports bulk statuses as MESSAGE_REJECTED, SES (v1) as MessageRejected
+    return "".join(word.capitalize() for word in status.split("_"))
+
+
+class _SESv2Client:
+    # wraps a boto3 sesv2 client so it takes and returns SES (v1) shaped requests and responses
+    def __init__(self, client):
+        self.client = client
+
+
+    def send_email(self, Source: str, Destination: dict, Message: dict, **kwargs) -> dict:
+        content = {'Simple': {'Subject': Message['Subject'], 'Body': Message['Body']}}
+        return self.client.send_email(FromEmailAddress=Source, Destination=Destination, Content=content, **_v2_options(kwargs))
+
+
+    def send_raw_email(self, RawMessage: dict, Source: str = None, Destinations: list = None, **kwargs) -> dict:
+        options = _v2_options(kwargs)
+        if Source != None:
+            options['FromEmailAddress'] = Source
+        if Destinations:
+            options['Destination'] = {'ToAddresses': Destinations}
+        return self.client.send_email(Content={'Raw': {'Data': RawMessage['Data']}}, **options)
+
+
+    def send_bulk_templated_email(self, Source: str, Template: str, Destinations: list, DefaultTemplateData: str = None, **kwargs) -> dict:
+        template = {'TemplateName': Template}
+        if DefaultTemplateData != None:
+            template['TemplateData'] = DefaultTemplateData
+        entries = []
+        for destination in Destinations:
+            entry = {'Destination': destination['Destination']}
+            if destination.get('ReplacementTemplateData') != None:
+                entry['ReplacementEmailContent'] = {'ReplacementTemplate': {'ReplacementTemplateData': destination['ReplacementTemplateData']}}
+            entries.append(entry)
+
+        response = self.client.send_bulk_email(FromEmailAddress=Source, DefaultContent={'Template': template}, BulkEmailEntries=entries, **_v2_options(kwargs))
+        return {'Status': [
+            {'Status': _pascal_case(result['Status']), 'Error': result.get('Error'), 'MessageId': result.get('MessageId')}
+            for result in response['BulkEmailEntryResults']
+        ]}
+
+
+    def get_send_quota(self) -> dict:
+        return self.client.get_account()['SendQuota']
+
+
+    def close(self):
+        close = getattr(self.client, "close", None)
+        if callable(close):
+            close()
+
+
+def _v2_options(kwargs: dict) -> dict:
+    # the SES (v1) options the senders use that have a SESv2 equivalent
+    options = {}
+    if kwargs.get('ConfigurationSetName') != None:
+        options['ConfigurationSetName'] = kwargs['ConfigurationSetName']
+    if kwargs.get('ReplyToAddresses'):
+        options['ReplyToAddresses'] = kwargs['ReplyToAddresses']
+    return options
+
+
+class SESv2Transport:
+    # Sends through the SESv2 API (boto3 'sesv2' client) instead of SES (v1). Requests are built the
+    # same way and translated, so every sender works unchanged. The sesv2 clients come from client_registry,
+    # so they are shared and pooled like every other client. Asking for any service other than 'ses'
+    # returns that service's own client.
+    def __init__(self, client_registry: SESClientRegistry = None):
+        if client_registry == None:
+            client_registry = default_registry
+        self.client_registry = client_registry
+
+
+    def get_client(self, aws_region: str, aws_profile: str = None, service: str = 'ses', max_pool_connections: int = None, botocore_retries: bool = True):
+        if service == 'ses':
+            return _SESv2Client(self.client_registry.get_client(aws_region, aws_profile=aws_profile, service='sesv2', max_pool_connections=max_pool_connections,
+                                                                botocore_retries=botocore_retries))
+        return self.client_registry.get_client(aws_region, aws_profile=aws_profile, service=service, max_pool_connections=max_pool_connections, botocore_retries=botocore_retries)
+
+
+# botocore operation names, used in the errors the fake raises
+_OPERATION_NAMES = {
+    'send_email': 'SendEmail',
+    'send_raw_email': 'SendRawEmail',
+    'send_bulk_templated_email': 'SendBulkTemplatedEmail',
+    'get_send_quota': 'GetSendQuota',
+    'send_bulk_email': 'SendBulkEmail',
+    'get_email_template': 'GetEmailTemplate',
+    'create_email_template': 'CreateEmailTemplate',
+}
+
+
+def _client_error(code: str, message: str, status_code: int, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message, 'Type': 'Sender'}, 'ResponseMetadata': {'HTTPStatusCode': status_code}}, _OPERATION_NAMES.get(operation, operation))
+
+
+class FakeSESTransport:
+    # In process stand in for SES, for tests and offline load tests. It is both the transport and the client.
+    #
+    # latency        - seconds every call takes, plus a random 0 to latency_jitter seconds on top
+    # max_send_rate  - sends per second before calls fail with Throttling, like a real account, None for no limit
+    # error_rate     - fraction of calls that fail with error_code (ServiceUnavailable by default)
+    # keep_messages  - how many of the most recent requests to keep in sent, for checking what was sent
+    # seed           - seed for the random latency and errors, so a load test can be repeated exactly
+    requires_credentials = False
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0, max_send_rate: float = None, error_rate: float = 0.0,
+                 error_code: str = 'ServiceUnavailable', max_24_hour_send: float = 50000.0, keep_messages: int = 1000, seed: int = None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.max_send_rate = max_send_rate
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.max_24_hour_send = max_24_hour_send
+        self._random = random.Random(seed)
+        self._bucket = None
+        if max_send_rate != None:
+            self._bucket = TokenBucket(max_send_rate)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # errors queued by fail_next(), raised before anything else
+        self._scripted_errors = deque()
+
+        # SESv2 stored templates, name -> TemplateContent
+        self.templates = {}
+        self.sent = deque(maxlen=keep_messages)
+        self.calls = 0
+        self.messages_sent = 0
+        self.throttled = 0
+        self.errors = 0
+
+
+    def get_client(self, aws_region: str = None, aws_profile: str = None, service: str = 'ses', max_pool_connections: int = None, botocore_retries: bool = True):
+        return self
+
+
+    def fail_next(self, code: str, times: int = 1, message: str = None, status_code: int = 400):
+        # make the next times calls fail with code, for testing error handling
+        with self._lock:
+            for _ in range(times):
+                self._scripted_errors.append((code, message or f"fake {code}", status_code))
+
+
+    def _call(self, operation: str, payload: dict, recipients: int = 1, sends: int = 1) -> str:
+        # everything a call does besides building its response, raises the injected errors. Returns a request id.
+        with self._lock:
+            self.calls += 1
+            scripted = self._scripted_errors.popleft() if self._scripted_errors else None
+            delay = self.latency
+            if self.latency_jitter:
+                delay += self._random.uniform(0, self.latency_jitter)
+            inject_error = self.error_rate and self._random.random() < self.error_rate
+
+        if delay:
+            time.sleep(delay)
+
+        if scripted != None:
+            with self._lock:
+                self.errors += 1
+            raise _client_error(scripted[0], scripted[1], scripted[2], operation)
+
+        if operation != 'get_send_quota' and self._bucket != None and not self._bucket.try_acquire(sends):
+            with self._lock:
+                self.throttled += 1
+            raise _client_error('Throttling', 'Maximum sending rate exceeded.', 400, operation)
+
+        if inject_error:
+            with self._lock:
+                self.errors += 1
+            raise _client_error(self.error_code, f"fake {self.error_code}", 503 if self.error_code.startswith('ServiceUnavailable') else 500, operation)
+
+        if recipients == 0:
+            raise _client_error('InvalidParameterValue', 'Missing final @domain', 400, operation)
+
+        if operation != 'get_send_quota':
+            with self._lock:
+                self.sent.append((operation, payload))
+                self.messages_sent += sends
+        return str(uuid.uuid4())
+
+
+    def _message_id(self) -> str:
+        return f"fake-{next(self._ids):012d}"
+
+
+    def send_email(self, **payload) -> dict:
+        destination = payload.get('Destination', {})
+        recipients = sum(len(destination.get(field, [])) for field in ('ToAddresses', 'CcAddresses', 'BccAddresses'))
+        request_id = self._call('send_email', payload, recipients=recipients)
+        return {'MessageId': self._message_id(), 'ResponseMetadata': {'RequestId': request_id, 'HTTPStatusCode': 200}}
+
+
+    def send_raw_email(self, **payload) -> dict:
+        # without Destinations, SES sends to the addresses in the message headers
+        recipients = len(payload['Destinations']) if payload.get('Destinations') != None else 1
+        request_id = self._call('send_raw_email', payload, recipients=recipients)
+        return {'MessageId': self._message_id(), 'ResponseMetadata': {'RequestId': request_id, 'HTTPStatusCode': 200}}
+
+
+    def send_bulk_templated_email(self, **payload) -> dict:
+        destinations = payload.get('Destinations', [])
+        request_id = self._call('send_bulk_templated_email', payload, recipients=len(destinations), sends=max(1, len(destinations)))
+        return {
+            'Status': [{'Status': 'Success', 'MessageId': self._message_id()} for _ in destinations],
+            'ResponseMetadata': {'RequestId': request_id, 'HTTPStatusCode': 200},
+        }
+
+
+    def send_bulk_email(self, **payload) -> dict:
+        # the SESv2 bulk call, for py_basic_ses.sesv2.BulkEmailSender
+        entries = payload.get('BulkEmailEntries', [])
+        request_id = self._call('send_bulk_email', payload, recipients=len(entries), sends=max(1, len(entries)))
+        return {
+            'BulkEmailEntryResults': [{'Status': 'SUCCESS', 'MessageId': self._message_id()} for _ in entries],
+            'ResponseMetadata': {'RequestId': request_id, 'HTTPStatusCode': 200},
+        }
+
+
+    def get_email_template(self, TemplateName: str) -> dict:
+        # template calls are answered right away, they don't count as calls or sends
+        with self._lock:
+            content = self.templates.get(TemplateName)
+        if content == None:
+            raise _client_error('NotFoundException', f"Template {TemplateName} does not exist.", 404, 'get_email_template')
+        return {'TemplateName': TemplateName, 'TemplateContent': content}
+
+
+    def create_email_template(self, TemplateName: str, TemplateContent: dict) -> dict:
+        with self._lock:
+            if TemplateName in self.templates:
+                raise _client_error('AlreadyExistsException', f"Template {TemplateName} already exists.", 400, 'create_email_template')
+            self.templates[TemplateName] = TemplateContent
+        return {}
+
+
+    def get_send_quota(self) -> dict:
+        request_id = self._call('get_send_quota', {})
+        return {
+            'Max24HourSend': self.max_24_hour_send,
+            'MaxSendRate': float(self.max_send_rate or 14.0),
+            'SentLast24Hours': float(self.messages_sent),
+            'ResponseMetadata': {'RequestId': request_id, 'HTTPStatusCode': 200},
+        }
+
+
+    def close(self):
+        pass
+
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "messages_sent": self.messages_sent, "throttled": self.throttled, "errors": self.errors}
+
+
+# SES query API actions the fake server answers, and the FakeSESTransport method for each
+_QUERY_ACTIONS = {value: key for key, value in _OPERATION_NAMES.items()}
+_SES_XMLNS = "http://ses.amazonaws.com/doc/2010-12-01/"
+
+
+def _unflatten(params: dict) -> dict:
+    # turn query API parameters like Destination.ToAddresses.member.1 back into the nested boto3 shape
+    root = {}
+    for key, value in params.items():
+        parts = key.split(".")
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return _members_to_lists(root)
+
+
+def _members_to_lists(node):
+    if not isinstance(node, dict):
+        return node
+    if list(node) == ["member"]:
+        members = node["member"]
+        return [_members_to_lists(members[index]) for index in sorted(members, key=int)]
+    return {key: _members_to_lists(value) for key, value in node.items()}
+
+
+def _to_xml(value) -> str:
+    if isinstance(value, dict):
+        return "".join(f"<{key}>{_to_xml(item)}</{key}>" for key, item in value.items() if item != None)
+    if isinstance(value, list):
+        return "".join(f"<member>{_to_xml(item)}</member>" for item in value)
+    return escape(str(value))
+
+
+class _FakeSESRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, with Nagle on a kept alive connection waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        params = dict(parse_qsl(body, keep_blank_values=True))
+        action = params.pop("Action", None)
+        params.pop("Version", None)
+        transport = self.server.transport
+
+        operation = _QUERY_ACTIONS.get(action)
+        if operation == None:
+            self._send_error("InvalidAction", f"unknown action {action}", 400)
+            return
+
+        payload = _unflatten(params)
+        if "RawMessage" in payload:
+            payload["RawMessage"]["Data"] = base64.b64decode(payload["RawMessage"]["Data"])
+
+        try:
+            response = getattr(transport, operation)(**payload)
+        except ClientError as e:
+            self._send_error(e.response["Error"]["Code"], e.response["Error"]["Message"], e.response["ResponseMetadata"]["HTTPStatusCode"])
+            return
+
+        metadata = response.pop("ResponseMetadata", {})
+        self._send_xml(200, f'<{action}Response xmlns="{_SES_XMLNS}"><{action}Result>{_to_xml(response)}</{action}Result>'
+                            f'<ResponseMetadata><RequestId>{metadata.get("RequestId", "")}</RequestId></ResponseMetadata></{action}Response>')
+
+
+    def _send_error(self, code: str, message: str, status_code: int):
+        self._send_xml(status_code, f'<ErrorResponse xmlns="{_SES_XMLNS}"><Error><Type>Sender</Type><Code>{escape(code)}</Code>'
+                                    f'<Message>{escape(message)}</Message></Error><RequestId>{uuid.uuid4()}</RequestId></ErrorResponse>')
+
+
+    def _send_xml(self, status_code: int, document: str):
+        data = document.encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def log_message(self, format, *args):
+        # keep load tests quiet
+        pass
+
+
+class _FakeSESHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The listen() backlog. The default of 5 drops connections from load tests with more concurrent clients
+    # than that, and a dropped SYN is only retried after about a second, which swamps the latencies being measured.
+    request_queue_size = 128
+
+
+class FakeSESServer:
+    # Local HTTP server that speaks the SES (v1) query API, backed by a FakeSESTransport, so the real boto3
+    # client (request signing, connection pool, retries, XML parsing) is exercised without AWS:
+    #
+    #   with FakeSESServer(FakeSESTransport(latency=0.05)) as server:
+    #       registry = SESClientRegistry(endpoint_url=server.url)
+    #       SESSender(..., client_registry=registry).send_email()
+    #
+    # boto3 still signs requests, so some credentials (any values) must be configured.
+    def __init__(self, transport: FakeSESTransport = None, host: str = "127.0.0.1", port: int = 0):
+        if transport == None:
+            transport = FakeSESTransport()
+        self.transport = transport
+        self._server = _FakeSESHTTPServer((host, port), _FakeSESRequestHandler)
+        self._server.transport = transport
+        self._thread = None
+
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def start(self):
+        if self._thread == None:
+            self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, name="py-basic-ses-fake-ses", daemon=True)
+            self._thread.start()
+        return self
+
+
+    def stop(self):
+        if self._thread != None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,171 @@
+from py_basic_ses.message import _address_tuple
+from email.utils import parseaddr
+import re
+
+# SES rejects messages bigger than 10 MB with the v1 API and 40 MB with SESv2, after MIME encoding
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+MAX_MESSAGE_SIZE_V2 = 40 * 1024 * 1024
+
+# RFC 5321 length limits
+MAX_ADDRESS_LENGTH = 320
+MAX_LOCAL_PART_LENGTH = 64
+
+# bodies are sent base64 (or quoted printable) encoded, which grows them by up to a third
+_ENCODING_OVERHEAD = 4 / 3
+
+# strings are measured in slices this long, so a non ASCII body is never copied whole to find its UTF-8 size
+_SIZE_SLICE = 64 * 1024
+
+# An addr-spec SES accepts: an ASCII dot-atom local part, and a domain of letters, digits, and hyphens with
+# at least one dot. Internationalized domains have to be given in punycode (xn--...).
+_ADDRESS_PATTERN = re.compile(
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?"
+)
+
+# characters that would end a header line early, the start of a header injection
+_HEADER_BREAKS = re.compile(r"[\r\n\x00]")
+
+
+class FieldError:
+    # One problem with one field of a message.
+    # field   - the SESSender argument name, like 'sendto' or 'message_html'
+    # code    - short machine readable reason: invalid_address, no_recipients, too_many_recipients,
+    #           header_injection, invalid_utf8, not_text, missing, or too_large
+    # message - what is wrong, for people
+    # value   - the offending value when there is one, like the bad address
+    __slots__ = ('field', 'code', 'message', 'value')
+
+    def __init__(self, field: str, code: str, message: str, value = None):
+        self.field = field
+        self.code = code
+        self.message = message
+        self.value = value
+
+
+    def to_dict(self) -> dict:
+        result = {"field": self.field, "code": self.code, "message": self.message}
+        if self.value != None:
+            result["value"] = self.value
+        return result
+
+
+    def __eq__(self, other):
+        if not isinstance(other, FieldError):
+            return NotImplemented
+        return (self.field, self.code, self.value) == (other.field, other.code, other.value)
+
+
+    def __repr__(self):
+        return f"FieldError(field={self.field!r}, code={self.code!r}, message={self.message!r})"
+
+
+def address_spec(address: str) -> str:
+    # 'Some Name <one@domain.com>' -> 'one@domain.com', a bare address is returned as is.
+    # None when a display name form can't be parsed.
+    if "<" not in address:
+        return address
+    if _HEADER_BREAKS.search(address) != None or not address.rstrip().endswith(">"):
+        return None
+    name, addr_spec = parseaddr(address)
+    return addr_spec or None
+
+
+def is_valid_address(address: str) -> bool:
+    # syntax only, nothing is looked up. A display name is allowed ('Some Name <one@domain.com>'),
+    # only the address inside the brackets is checked.
+    if not isinstance(address, str) or len(address) > MAX_ADDRESS_LENGTH:
+        return False
+    address = address_spec(address)
+    if address == None or _ADDRESS_PATTERN.fullmatch(address) == None:
+        return False
+    return address.index("@") <= MAX_LOCAL_PART_LENGTH
+
+
+def utf8_size(text: str) -> int:
+    # Bytes text takes as UTF-8. ASCII text is counted without encoding it. Anything else is encoded a
+    # slice at a time, so at most one slice is ever copied. Raises UnicodeEncodeError for text that can't be
+    # UTF-8, like a lone surrogate.
+    if text.isascii():
+        return len(text)
+    return sum(len(text[start:start + _SIZE_SLICE].encode("utf-8")) for start in range(0, len(text), _SIZE_SLICE))
+
+
+def _message_fields(message) -> dict:
+    # SESSender, EmailMessage, or a dict of SESSender keyword arguments -> the message fields as a dict
+    if isinstance(message, dict):
+        return message
+    return {field: getattr(message, field, None) for field in ('sendto', 'cc', 'bcc', 'fromaddr', 'fromname', 'msgsubject', 'message_txt', 'message_html')}
+
+
+def validate_message(message, max_recipients: int = None, max_size: int = MAX_MESSAGE_SIZE) -> list:
+    # Check a message without calling SES and return a list of FieldErrors, empty when the message looks sendable.
+    # message is an SESSender, an EmailMessage, or a dict of SESSender keyword arguments.
+    #
+    # max_recipients - most To + CC + BCC recipients allowed, None when the sender splits large sends itself
+    #                  (SESSender does, a SendBulkEmail entry allows 50)
+    # max_size       - SES message size limit in bytes, the subject and bodies are counted after encoding
+    fields = _message_fields(message)
+    errors = []
+
+    # ---- addresses ----
+    recipient_count = 0
+    for field in ('sendto', 'cc', 'bcc'):
+        addresses = _address_tuple(fields.get(field))
+        recipient_count += len(addresses)
+        for address in addresses:
+            if not is_valid_address(address):
+                errors.append(FieldError(field, "invalid_address", f"{address!r} is not a valid email address", address))
+    if recipient_count == 0:
+        errors.append(FieldError("sendto", "no_recipients", "at least one recipient is required"))
+    elif max_recipients != None and recipient_count > max_recipients:
+        errors.append(FieldError("sendto", "too_many_recipients", f"{recipient_count} recipients, at most {max_recipients} are allowed", recipient_count))
+
+    fromaddr = fields.get('fromaddr')
+    if not fromaddr:
+        errors.append(FieldError("fromaddr", "missing", "a from address is required"))
+    elif not is_valid_address(fromaddr):
+        errors.append(FieldError("fromaddr", "invalid_address", f"{fromaddr!r} is not a valid email address", fromaddr))
+
+    # ---- header values ----
+    for field in ('fromname', 'msgsubject'):
+        value = fields.get(field)
+        if value == None:
+            continue
+        if not isinstance(value, str):
+            errors.append(FieldError(field, "not_text", f"{field} must be a str, not {type(value).__name__}"))
+        elif _HEADER_BREAKS.search(value) != None:
+            errors.append(FieldError(field, "header_injection", f"{field} contains a line break or NUL character"))
+
+    # ---- content and size ----
+    if fields.get('message_txt') == None:
+        errors.append(FieldError("message_txt", "missing", "a plain text body is required"))
+
+    size = 0.0
+    for field in ('msgsubject', 'message_txt', 'message_html'):
+        value = fields.get(field)
+        if not isinstance(value, str):
+            if value != None and field != 'msgsubject':
+                errors.append(FieldError(field, "not_text", f"{field} must be a str, not {type(value).__name__}"))
+            continue
+        try:
+            field_size = utf8_size(value) * _ENCODING_OVERHEAD
+        except UnicodeEncodeError:
+            errors.append(FieldError(field, "invalid_utf8", f"{field} has characters that can't be encoded as UTF-8"))
+            continue
+        # without an html body the text body is sent as both
+        if field == 'message_txt' and fields.get('message_html') == None:
+            field_size *= 2
+        size += field_size
+
+    if max_size != None and size > max_size:
+        errors.append(FieldError("message_html" if fields.get('message_html') != None else "message_txt", "too_large",
+                                 f"the message is about {int(size)} bytes encoded, SES allows {max_size}", int(size)))
+    return errors
+
+
+def validate_many(messages, **kwargs):
+    # validate_message() for every message, yields (index, message, errors) in input order. Takes any iterable,
+    # so a large batch can be checked while it is read.
+    for index, message in enumerate(messages):
+        yield index, message, validate_message(message, **kwargs)
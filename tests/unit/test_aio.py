@@ -0,0 +1,83 @@
+import asyncio, threading, unittest, mock
+from botocore.exceptions import ClientError
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+
+# import the async sender and helpers, so we can test them
+from py_basic_ses.aio import AsyncSESSender, send_many_async, shutdown_executor
+
+
+def fake_message(index):
+    return {"sendto": f"user{index}@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2"}
+
+
+# Testing AsyncSESSender.send_email_async()
+class TestAioAsyncSESSender(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+        shutdown_executor()
+
+    def test_unit_send_email_async_sends(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                sender = AsyncSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+                self.assertEqual(asyncio.run(sender.send_email_async()), "fakemsgID")
+
+    def test_unit_send_email_async_clienterror(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = ClientError({"Error": {"Message":"fake resp"}}, "fake op name")
+                sender = AsyncSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+                with self.assertRaises(ClientError):
+                    asyncio.run(sender.send_email_async())
+
+    def test_unit_send_email_async_same_payload(self):
+        options = {"sendto": "email@domain.com", "fromaddr": "email@domain.com", "fromname": "fake name", "message_txt": "some text", "aws_region": "us-west-2", "msgsubject": "fake subject"}
+        self.assertEqual(AsyncSESSender(**options).build_payload(), SESSender(**options).build_payload())
+
+
+# Testing send_many_async()
+class TestAioSendManyAsync(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+        shutdown_executor()
+
+    def test_unit_send_many_async_results_in_order(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = lambda **kwargs: {"MessageId": kwargs["Destination"]["ToAddresses"][0]}
+                results = asyncio.run(send_many_async([fake_message(i) for i in range(20)], concurrency=3))
+                self.assertEqual([result.message_id for result in results], [f"user{i}@domain.com" for i in range(20)])
+
+    def test_unit_send_many_async_concurrency_above_executor(self):
+        # every send waits until all 20 are in flight, so a cap below 20 breaks the barrier
+        barrier = threading.Barrier(20, timeout=5)
+        def fake_send(**kwargs):
+            barrier.wait()
+            return {"MessageId": "fakemsgID"}
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = fake_send
+                results = asyncio.run(send_many_async([fake_message(i) for i in range(20)], concurrency=20))
+                self.assertTrue(all(result.ok for result in results), [result.error for result in results])
+
+    def test_unit_send_many_async_reports_errors(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                results = asyncio.run(send_many_async([fake_message(0), {"sendto": "user1@domain.com"}]))
+                self.assertTrue(results[0].ok)
+                self.assertIsInstance(results[1].error, TypeError)
+
+    def test_unit_send_many_async_bad_concurrency(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(send_many_async([fake_message(0)], concurrency=0))
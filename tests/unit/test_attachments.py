@@ -0,0 +1,146 @@
+import email, io, os, tempfile, unittest, mock
+from email.header import decode_header, make_header
+from py_basic_ses.clients import close_clients
+from py_basic_ses.exceptions import MessageSizeError
+
+# import the raw sender, so we can test it
+from py_basic_ses.attachments import RawSESSender, Attachment
+
+
+def raw_sender(**kwargs):
+    return RawSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", **kwargs)
+
+
+# Testing the Attachment class
+class TestAttachmentsAttachment(unittest.TestCase):
+
+    def test_unit_attachment_from_path(self):
+        attachment = Attachment(os.path.join("some", "dir", "report.pdf"))
+        self.assertEqual(attachment.filename, "report.pdf")
+        self.assertEqual(attachment.content_type, "application/pdf")
+
+    def test_unit_attachment_from_file_object(self):
+        attachment = Attachment(io.BytesIO(b"a,b\n"), filename="export.csv")
+        self.assertEqual(attachment.content_type, "text/csv")
+        self.assertEqual(attachment.size_hint(), None)
+
+    def test_unit_attachment_unknown_type(self):
+        self.assertEqual(Attachment(io.BytesIO(b"")).content_type, "application/octet-stream")
+
+
+# Testing RawSESSender.build_raw_message()
+class TestAttachmentsRawSESSenderBuild(unittest.TestCase):
+
+    def test_unit_build_raw_message_parses(self):
+        attachment_data = os.urandom(200000)
+        sender = raw_sender(fromname="Zoë", msgsubject="Sübject", message_html="<p>fake html</p>", attachments=[Attachment(io.BytesIO(attachment_data), filename="data.bin")])
+        message = email.message_from_bytes(bytes(sender.build_raw_message()))
+        self.assertEqual(str(make_header(decode_header(message["Subject"]))), "Sübject")
+        self.assertEqual(message["To"], "email@domain.com")
+        parts = {part.get_content_type(): part for part in message.walk()}
+        self.assertEqual(parts["text/plain"].get_payload(decode=True), b"some text")
+        self.assertEqual(parts["text/html"].get_payload(decode=True), b"<p>fake html</p>")
+        self.assertEqual(parts["application/octet-stream"].get_filename(), "data.bin")
+        self.assertEqual(parts["application/octet-stream"].get_payload(decode=True), attachment_data)
+
+    def test_unit_build_raw_message_non_ascii_names(self):
+        sender = raw_sender(cc=["Zoë Smith <zoe@domain.com>"], attachments=[Attachment(io.BytesIO(b"some data"), filename="data.bin")])
+        message = email.message_from_bytes(bytes(sender.build_raw_message(["Jürgen <jurgen@domain.com>", "email@domain.com"], sender.cc)))
+        self.assertEqual(str(make_header(decode_header(message["To"]))), "Jürgen <jurgen@domain.com>, email@domain.com")
+        self.assertEqual(str(make_header(decode_header(message["Cc"]))), "Zoë Smith <zoe@domain.com>")
+        self.assertTrue(sender.build_payload()["Destinations"][1].isascii())
+
+    def test_unit_build_raw_message_from_path(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "export.csv")
+            with open(path, "wb") as csv_file:
+                csv_file.write(b"a,b\n1,2\n")
+            message = email.message_from_bytes(bytes(raw_sender(attachments=[path]).build_raw_message()))
+            parts = {part.get_content_type(): part for part in message.walk()}
+            self.assertEqual(parts["text/csv"].get_payload(decode=True), b"a,b\n1,2\n")
+
+    def test_unit_build_raw_message_too_big_file_object(self):
+        sender = raw_sender(attachments=[io.BytesIO(b"x" * 3000)], max_message_size=2000)
+        with self.assertRaises(MessageSizeError):
+            sender.build_raw_message()
+
+    def test_unit_build_raw_message_too_big_path_not_read(self):
+        # the size check fails before the file is opened
+        with mock.patch("py_basic_ses.attachments.os.path.getsize", return_value=20 * 1024 * 1024) as mock_getsize:
+            with mock.patch("builtins.open", side_effect=Exception("should not open the file")) as mock_file_open:
+                with self.assertRaises(MessageSizeError):
+                    raw_sender(attachments=["big.pdf"]).build_raw_message()
+                mock_file_open.assert_not_called()
+
+    def test_unit_build_raw_message_leaves_file_object_open(self):
+        fileobj = io.BytesIO(b"some data")
+        raw_sender(attachments=[fileobj]).build_raw_message()
+        self.assertFalse(fileobj.closed)
+
+
+# Testing RawSESSender.send_email()
+class TestAttachmentsRawSESSenderSendEmail(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_send_email_uses_send_raw_email(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_raw_email.return_value = {"MessageId":"fakemsgID"}
+                self.assertEqual(raw_sender(attachments=[io.BytesIO(b"some data")]).send_email(), "fakemsgID")
+                kwargs = mock_botoclient.return_value.send_raw_email.call_args.kwargs
+                self.assertEqual(kwargs["Destinations"], ["email@domain.com"])
+                self.assertIsInstance(kwargs["RawMessage"]["Data"], bytearray)
+                mock_botoclient.return_value.send_email.assert_not_called()
+
+    def test_unit_send_email_cc_bcc_headers(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_raw_email.return_value = {"MessageId":"fakemsgID"}
+                raw_sender(cc=["cc@domain.com"], bcc=["bcc@domain.com"], attachments=[io.BytesIO(b"some data")]).send_email()
+                kwargs = mock_botoclient.return_value.send_raw_email.call_args.kwargs
+                self.assertEqual(kwargs["Destinations"], ["email@domain.com", "cc@domain.com", "bcc@domain.com"])
+                message = email.message_from_bytes(bytes(kwargs["RawMessage"]["Data"]))
+                self.assertEqual(message["Cc"], "cc@domain.com")
+                self.assertIsNone(message["Bcc"])
+
+    def test_unit_send_email_chunks_rereads_attachment(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_raw_email.return_value = {"MessageId":"fakemsgID"}
+                result = RawSESSender(sendto=[f"to{i}@domain.com" for i in range(60)], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                                      attachments=[Attachment(io.BytesIO(b"some data"), filename="data.bin")]).send_email_result()
+                self.assertEqual(len(result.message_ids), 2)
+                for call in mock_botoclient.return_value.send_raw_email.call_args_list:
+                    message = email.message_from_bytes(bytes(call.kwargs["RawMessage"]["Data"]))
+                    parts = {part.get_content_type(): part for part in message.walk()}
+                    self.assertEqual(parts["application/octet-stream"].get_payload(decode=True), b"some data")
+
+    def test_unit_send_email_chunks_unseekable_attachment(self):
+        stream = io.BytesIO(b"some data")
+        stream.seekable = lambda: False
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_raw_email.return_value = {"MessageId":"fakemsgID"}
+                sender = RawSESSender(sendto=[f"to{i}@domain.com" for i in range(60)], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                                      attachments=[Attachment(stream, filename="data.bin")])
+                with self.assertRaises(ValueError):
+                    sender.send_email()
+                # nothing went out with an empty attachment
+                mock_botoclient.return_value.send_raw_email.assert_not_called()
+
+    def test_unit_send_email_unseekable_attachment_read_once(self):
+        stream = io.BytesIO(b"some data")
+        stream.seekable = lambda: False
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_raw_email.return_value = {"MessageId":"fakemsgID"}
+                sender = raw_sender(attachments=[Attachment(stream, filename="data.bin")])
+                sender.send_email()
+                with self.assertRaises(ValueError):
+                    sender.send_email()
+                self.assertEqual(mock_botoclient.return_value.send_raw_email.call_count, 1)
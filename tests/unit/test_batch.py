@@ -0,0 +1,34 @@
+import io, unittest
+
+# import the batch input reader, so we can test it
+from py_basic_ses.batch import read_records, MalformedRecord
+
+
+# Testing read_records()
+class TestBatchReadRecords(unittest.TestCase):
+
+    def test_unit_read_records_jsonl(self):
+        stream = io.StringIO('{"to": "user@domain.com", "subject": "hi"}\n\n{"to": ["a@domain.com", "b@domain.com"]}\n')
+        records = list(read_records(stream, "jsonl", {"fromaddr": "from@domain.com", "awsregion": "us-west-2", "message_txt": "default text"}))
+        self.assertEqual(records[0], (1, {"sendto": "user@domain.com", "msgsubject": "hi", "fromaddr": "from@domain.com", "aws_region": "us-west-2", "message_txt": "default text"}))
+        # blank lines are skipped but still counted
+        self.assertEqual(records[1][0], 3)
+        self.assertEqual(records[1][1]["sendto"], ["a@domain.com", "b@domain.com"])
+
+    def test_unit_read_records_jsonl_malformed(self):
+        stream = io.StringIO('not json\n["a list"]\n{"to": "user@domain.com", "unknown": 1}\n{"to": "user@domain.com"}\n')
+        records = list(read_records(stream, "jsonl"))
+        self.assertTrue(all(isinstance(record, MalformedRecord) for record in records))
+        self.assertEqual([record.line for record in records], [1, 2, 3, 4])
+        self.assertIn("unknown", records[2].error)
+        self.assertIn("fromaddr", records[3].error)
+
+    def test_unit_read_records_csv(self):
+        stream = io.StringIO("to,fromaddr,awsregion,message_txt,subject\nuser@domain.com,from@domain.com,us-west-2,text,\nuser2@domain.com,from@domain.com,us-west-2,text,extra,cell\n")
+        records = list(read_records(stream, "csv", {"subject": "default subject"}))
+        self.assertEqual(records[0][1]["msgsubject"], "default subject")
+        self.assertIsInstance(records[1], MalformedRecord)
+
+    def test_unit_read_records_bad_format(self):
+        with self.assertRaises(ValueError):
+            list(read_records(io.StringIO(""), "xml"))
@@ -0,0 +1,83 @@
+import unittest, mock
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+
+# import send_many, so we can test it
+from py_basic_ses.bulk import send_many
+
+
+def fake_message(index):
+    return {"sendto": f"user{index}@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2"}
+
+
+# Testing the bulk send_many() generator
+class TestBulkSendMany(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_send_many_ordered(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = lambda **kwargs: {"MessageId": kwargs["Destination"]["ToAddresses"][0]}
+                results = list(send_many((fake_message(i) for i in range(25)), max_workers=4))
+                self.assertEqual([result.index for result in results], list(range(25)))
+                self.assertEqual([result.message_id for result in results], [f"user{i}@domain.com" for i in range(25)])
+                # every worker shares the same client
+                self.assertEqual(mock_botoclient.call_count, 1)
+
+    def test_unit_send_many_unordered(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId": "fakemsgID"}
+                results = list(send_many((fake_message(i) for i in range(25)), max_workers=4, ordered=False))
+                self.assertEqual(sorted(result.index for result in results), list(range(25)))
+                self.assertTrue(all(result.ok for result in results))
+
+    def test_unit_send_many_reports_errors(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId": "fakemsgID"}
+                # the second message is missing required arguments
+                results = list(send_many([fake_message(0), {"sendto": "user1@domain.com"}, fake_message(2)]))
+                self.assertTrue(results[0].ok)
+                self.assertIsInstance(results[1].error, TypeError)
+                self.assertTrue(results[2].ok)
+
+    def test_unit_send_many_accepts_senders(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId": "fakemsgID"}
+                results = list(send_many([SESSender(**fake_message(0))]))
+                self.assertEqual(results[0].message_id, "fakemsgID")
+
+    def test_unit_send_many_backpressure(self):
+        # count how many messages have been pulled from the input before the first result is consumed
+        pulled = []
+        def messages():
+            for i in range(1000):
+                pulled.append(i)
+                yield fake_message(i)
+
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId": "fakemsgID"}
+                results = send_many(messages(), max_workers=2)
+                next(results)
+                self.assertLessEqual(len(pulled), 5)
+                results.close()
+
+    def test_unit_send_many_rate_limit(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                with mock.patch("py_basic_ses.ratelimit.time.sleep") as mock_sleep:
+                    mock_botoclient.return_value.send_email.return_value = {"MessageId": "fakemsgID"}
+                    list(send_many((fake_message(i) for i in range(5)), rate_limit=1))
+                    self.assertGreaterEqual(mock_sleep.call_count, 1)
+
+    def test_unit_send_many_bad_max_workers(self):
+        with self.assertRaises(ValueError):
+            list(send_many([fake_message(0)], max_workers=0))
@@ -0,0 +1,60 @@
+import unittest, mock
+
+# import the client registry, so we can test it
+from py_basic_ses.clients import SESClientRegistry
+
+# Testing the shared boto3 client registry
+class TestClientsSESClientRegistry(unittest.TestCase):
+
+    def test_unit_registry_reuses_client(self):
+        with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+            registry = SESClientRegistry()
+            first_client = registry.get_client("us-west-2")
+            second_client = registry.get_client("us-west-2")
+            self.assertIs(first_client, second_client)
+            self.assertEqual(mock_botoclient.call_count, 1)
+
+    def test_unit_registry_keys_on_region(self):
+        with mock.patch("py_basic_ses.clients.boto3.client", side_effect=lambda *args, **kwargs: mock.MagicMock()) as mock_botoclient:
+            registry = SESClientRegistry()
+            self.assertIsNot(registry.get_client("us-west-2"), registry.get_client("us-east-1"))
+            self.assertEqual(len(registry), 2)
+
+    def test_unit_registry_max_pool_connections(self):
+        with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+            registry = SESClientRegistry(max_pool_connections=25)
+            registry.get_client("us-west-2")
+            self.assertEqual(mock_botoclient.call_args.kwargs["config"].max_pool_connections, 25)
+
+    def test_unit_registry_botocore_retries(self):
+        with mock.patch("py_basic_ses.clients.boto3.client", side_effect=lambda *args, **kwargs: mock.MagicMock()) as mock_botoclient:
+            registry = SESClientRegistry()
+            retrying = registry.get_client("us-west-2")
+            single = registry.get_client("us-west-2", botocore_retries=False)
+            # a client without botocore retries is cached apart from the default one
+            self.assertIsNot(retrying, single)
+            self.assertIs(single, registry.get_client("us-west-2", botocore_retries=False))
+            self.assertEqual(mock_botoclient.call_args.kwargs["config"].retries, {"total_max_attempts": 1})
+            self.assertEqual(mock_botoclient.call_args_list[0].kwargs["config"].retries, None)
+
+    def test_unit_registry_profile_uses_session(self):
+        with mock.patch("py_basic_ses.clients.boto3.session.Session") as mock_session:
+            registry = SESClientRegistry()
+            registry.get_client("us-west-2", aws_profile="sending")
+            mock_session.assert_called_once_with(profile_name="sending")
+
+    def test_unit_registry_refresh_closes_old_client(self):
+        with mock.patch("py_basic_ses.clients.boto3.client", side_effect=lambda *args, **kwargs: mock.MagicMock()) as mock_botoclient:
+            registry = SESClientRegistry()
+            old_client = registry.get_client("us-west-2")
+            new_client = registry.refresh_client("us-west-2")
+            self.assertIsNot(old_client, new_client)
+            old_client.close.assert_called_once()
+
+    def test_unit_registry_close(self):
+        with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+            registry = SESClientRegistry()
+            client = registry.get_client("us-west-2")
+            registry.close()
+            client.close.assert_called_once()
+            self.assertEqual(len(registry), 0)
@@ -0,0 +1,151 @@
+import io, os, tempfile, unittest, mock
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.attachments import RawSESSender, Attachment
+
+# import the dedup caches, so we can test them
+from py_basic_ses.dedup import DedupCache, SQLiteDedupCache, message_key
+
+
+def sender(**kwargs):
+    return SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", msgsubject="fake subject", **kwargs)
+
+
+# Testing the message_key() function
+class TestDedupMessageKey(unittest.TestCase):
+
+    def test_unit_message_key_stable(self):
+        self.assertEqual(message_key("a", ["b", "c"]), message_key("a", ["b", "c"]))
+        self.assertNotEqual(message_key("a", ["b", "c"]), message_key("a", ["c", "b"]))
+
+    def test_unit_dedup_key_follows_message(self):
+        self.assertEqual(sender().dedup_key(), sender().dedup_key())
+        self.assertNotEqual(sender().dedup_key(), sender(cc="cc@domain.com").dedup_key())
+        self.assertEqual(sender(idempotency_key="order-1234").dedup_key(), "order-1234")
+
+    def test_unit_dedup_key_raw_covers_attachments(self):
+        first = RawSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                             attachments=[Attachment(io.BytesIO(b""), filename="a.pdf")])
+        second = RawSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                              attachments=[Attachment(io.BytesIO(b""), filename="b.pdf")])
+        self.assertNotEqual(first.dedup_key(), second.dedup_key())
+
+
+    def test_unit_dedup_key_raw_covers_attachment_content(self):
+        def raw_sender(data):
+            return RawSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                                attachments=[Attachment(io.BytesIO(data), filename="a.pdf")])
+        self.assertNotEqual(raw_sender(b"first").dedup_key(), raw_sender(b"second").dedup_key())
+        self.assertEqual(raw_sender(b"first").dedup_key(), raw_sender(b"first").dedup_key())
+        # hashing rewinds the file, so it is still sent whole
+        sender = raw_sender(b"first")
+        sender.dedup_key()
+        self.assertEqual(sender.attachments[0].source.read(), b"first")
+
+    def test_unit_dedup_key_raw_covers_attachment_file_content(self):
+        with tempfile.TemporaryDirectory() as attachment_dir:
+            path = os.path.join(attachment_dir, "a.pdf")
+            def raw_sender(data):
+                with open(path, "wb") as attachment_file:
+                    attachment_file.write(data)
+                return RawSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                                    attachments=[Attachment(path)])
+            # same size, different bytes
+            self.assertNotEqual(raw_sender(b"first").dedup_key(), raw_sender(b"fresh").dedup_key())
+            self.assertEqual(raw_sender(b"first").dedup_key(), raw_sender(b"first").dedup_key())
+
+    def test_unit_dedup_key_raw_unseekable_attachment(self):
+        stream = mock.Mock(spec=["read", "seekable"], name="stream")
+        stream.seekable.return_value = False
+        options = {"sendto": "email@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2",
+                   "attachments": [Attachment(stream, filename="a.pdf")]}
+        with self.assertRaises(ValueError):
+            RawSESSender(dedup_cache=DedupCache(), **options)
+        RawSESSender(dedup_cache=DedupCache(), idempotency_key="order-1234", **options)
+
+# Testing the DedupCache class
+class TestDedupDedupCache(unittest.TestCase):
+
+    def test_unit_dedup_cache_get_put(self):
+        cache = DedupCache()
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", ["fakemsgID"])
+        self.assertEqual(cache.get("key"), ["fakemsgID"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_unit_dedup_cache_expires(self):
+        cache = DedupCache(ttl=10)
+        with mock.patch("py_basic_ses.dedup.time.monotonic", return_value=100.0):
+            cache.put("key", ["fakemsgID"])
+        with mock.patch("py_basic_ses.dedup.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_unit_dedup_cache_evicts_least_recently_used(self):
+        cache = DedupCache(max_entries=2)
+        cache.put("one", ["1"])
+        cache.put("two", ["2"])
+        cache.get("one")
+        cache.put("three", ["3"])
+        self.assertIsNone(cache.get("two"))
+        self.assertEqual(cache.get("one"), ["1"])
+
+
+# Testing the SQLiteDedupCache class
+class TestDedupSQLiteDedupCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.cache_dir.name, "dedup.db")
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_unit_sqlite_dedup_cache_shared(self):
+        # two caches on the same file, like two processes
+        SQLiteDedupCache(self.path).put("key", ["fakemsgID1", "fakemsgID2"])
+        self.assertEqual(SQLiteDedupCache(self.path).get("key"), ["fakemsgID1", "fakemsgID2"])
+
+    def test_unit_sqlite_dedup_cache_expires(self):
+        cache = SQLiteDedupCache(self.path, ttl=10, purge_every=1)
+        with mock.patch("py_basic_ses.dedup.time.time", return_value=1000.0):
+            cache.put("key", ["fakemsgID"])
+        with mock.patch("py_basic_ses.dedup.time.time", return_value=1011.0):
+            self.assertIsNone(cache.get("key"))
+            cache.put("other", ["fakemsgID"])
+            self.assertEqual(cache._connection().execute("SELECT COUNT(*) FROM sent").fetchone()[0], 1)
+
+
+# Testing SESSender.send_email_result() with a dedup cache
+class TestDedupSendEmail(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_send_email_duplicate_not_sent(self):
+        cache = DedupCache()
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                self.assertFalse(sender(dedup_cache=cache).send_email_result().duplicate)
+                result = sender(dedup_cache=cache).send_email_result()
+                self.assertTrue(result.duplicate)
+                self.assertEqual(result.message_id, "fakemsgID")
+                self.assertEqual(result.attempts, 0)
+                self.assertEqual(mock_botoclient.return_value.send_email.call_count, 1)
+
+    def test_unit_send_email_failure_not_cached(self):
+        cache = DedupCache()
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = [Exception("fake error"), {"MessageId":"fakemsgID"}]
+                with self.assertRaises(Exception):
+                    sender(dedup_cache=cache).send_email()
+                self.assertEqual(sender(dedup_cache=cache).send_email(), "fakemsgID")
+                self.assertEqual(mock_botoclient.return_value.send_email.call_count, 2)
+
+    def test_unit_send_email_idempotency_key_in_dict(self):
+        self.assertEqual(sender(idempotency_key="order-1234").to_dict()["idempotency_key"], "order-1234")
@@ -1,11 +1,13 @@
-import os, unittest, mock
+import os, tempfile, unittest, mock
 import boto3
 from botocore.stub import Stubber
 from botocore.exceptions import ClientError
 from py_basic_ses.exceptions import CredError
 
 # import the SESSender class, so we can test it
-from py_basic_ses.emailing import SESSender
+from py_basic_ses.emailing import SESSender, clear_validation_cache
+from py_basic_ses.clients import SESClientRegistry, close_clients
+from py_basic_ses.retry import RetryPolicy
 
 # Testing the SESSender.ses_validate() method
 class TestEmailingSESSenderSesValidate(unittest.TestCase):
@@ -120,8 +122,73 @@ class TestEmailingSESSenderSesValidate(unittest.TestCase):
         self.assertEqual(validation_obj.ses_validate(), True, "SESSender.ses_validate: expecting True")
 
 
+# Testing the cached credentials validation in SESSender.ses_validate()
+class TestEmailingSESSenderSesValidateCache(unittest.TestCase):
+
+    def setUp(self):
+        clear_validation_cache()
+        # write a real credentials file, so the cache has an mtime and size to key on
+        self.cred_dir = tempfile.TemporaryDirectory()
+        self.credpath = os.path.join(self.cred_dir.name, "credentials")
+        with open(self.credpath, "w") as cred_file:
+            cred_file.write("[default]\naws_access_key_id = BKIAYPKAJ70YPSLMJ9BZ\naws_secret_access_key = 7GRwZHFWy8DHpqNXZTgcvSaY/T9/nZ+6Xm1E9FxS\n")
+
+    def tearDown(self):
+        clear_validation_cache()
+        self.cred_dir.cleanup()
+
+    def validation_obj(self, **kwargs):
+        return SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", **kwargs)
+
+    # the file is only read the first time
+    @mock.patch.dict(os.environ, {"RANDOM_ENV_VAR" : "value"}, clear=True )
+    @mock.patch('py_basic_ses.emailing.platform.system', return_value="Linux")
+    def test_unit_ses_validate_cache_reads_once(self, mock_platform_system):
+        with mock.patch('py_basic_ses.emailing.os.path.expanduser', return_value=self.credpath):
+            self.assertEqual(self.validation_obj().ses_validate(), True)
+            with mock.patch('builtins.open', side_effect=Exception("should not read the file again")) as mock_file_open:
+                self.assertEqual(self.validation_obj().ses_validate(), True)
+                mock_file_open.assert_not_called()
+
+    # force=True reads the file again
+    @mock.patch.dict(os.environ, {"RANDOM_ENV_VAR" : "value"}, clear=True )
+    @mock.patch('py_basic_ses.emailing.platform.system', return_value="Linux")
+    def test_unit_ses_validate_cache_force(self, mock_platform_system):
+        with mock.patch('py_basic_ses.emailing.os.path.expanduser', return_value=self.credpath):
+            self.validation_obj().ses_validate()
+            with mock.patch('builtins.open', new_callable=mock.mock_open, read_data="string with no aws cred info") as mock_file_open:
+                with self.assertRaises(CredError):
+                    self.validation_obj().ses_validate(force=True)
+
+    # changing the file invalidates the cache
+    @mock.patch.dict(os.environ, {"RANDOM_ENV_VAR" : "value"}, clear=True )
+    @mock.patch('py_basic_ses.emailing.platform.system', return_value="Linux")
+    def test_unit_ses_validate_cache_file_changed(self, mock_platform_system):
+        with mock.patch('py_basic_ses.emailing.os.path.expanduser', return_value=self.credpath):
+            self.validation_obj().ses_validate()
+            with open(self.credpath, "w") as cred_file:
+                cred_file.write("string with no aws cred info")
+            with self.assertRaises(CredError):
+                self.validation_obj().ses_validate()
+
+    # a named profile needs its own section in the file
+    @mock.patch.dict(os.environ, {"RANDOM_ENV_VAR" : "value"}, clear=True )
+    @mock.patch('py_basic_ses.emailing.platform.system', return_value="Linux")
+    def test_unit_ses_validate_missing_profile(self, mock_platform_system):
+        with mock.patch('py_basic_ses.emailing.os.path.expanduser', return_value=self.credpath):
+            with self.assertRaises(CredError):
+                self.validation_obj(aws_profile="sending").ses_validate()
+
+
 # Testing the SESSender.send_email() method
 class TestEmailingSESSenderSendEmail(unittest.TestCase):
+
+    def setUp(self):
+        # start every test with an empty client registry, so a client cached by one test isn't reused by the next
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
     
     def test_unit_send_email_ses_validate_exception(self):
         with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", side_effect=Exception("fake validate exception")) as mock_sesvalidate:
@@ -131,7 +198,7 @@ class TestEmailingSESSenderSendEmail(unittest.TestCase):
   
     def test_unit_send_email_boto3_init_exception(self):
         with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
-            with mock.patch("py_basic_ses.emailing.boto3.client", side_effect=Exception("fake boto3 exception")) as mock_botoclient:
+            with mock.patch("py_basic_ses.clients.boto3.client", side_effect=Exception("fake boto3 exception")) as mock_botoclient:
                 validation_obj = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", msgsubject="fake subject")
                 with self.assertRaises(Exception):
                     validation_obj.send_email()
@@ -142,7 +209,7 @@ class TestEmailingSESSenderSendEmail(unittest.TestCase):
         stubber.add_client_error('send_email')
         stubber.activate()
         with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
-            with mock.patch("py_basic_ses.emailing.boto3.client") as mock_botoclient:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
                 mock_botoclient.return_value = stubbed_client
                 validation_obj = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", message_html="<p>fake html</p>")
                 with self.assertRaises(ClientError):
@@ -150,7 +217,7 @@ class TestEmailingSESSenderSendEmail(unittest.TestCase):
 
     def test_unit_send_email_unexpected_exception(self):
         with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
-            with mock.patch("py_basic_ses.emailing.boto3.client") as mock_botoclient:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
                 mock_botoclient.return_value.send_email.side_effect = Exception("fake unexpected exception")
                 validation_obj = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", fromname="fake name")
                 with self.assertRaises(Exception):
@@ -159,9 +226,65 @@ class TestEmailingSESSenderSendEmail(unittest.TestCase):
 
     def test_unit_send_email_sends(self):
         with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
-            with mock.patch("py_basic_ses.emailing.boto3.client") as mock_botoclient:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
                 mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
                 validation_obj = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
                 self.assertEqual(validation_obj.send_email(), "fakemsgID")
 
+    def test_unit_send_email_reuses_client(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                registry = SESClientRegistry()
+                for i in range(3):
+                    SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", client_registry=registry).send_email()
+                self.assertEqual(mock_botoclient.call_count, 1)
+                self.assertEqual(mock_botoclient.return_value.send_email.call_count, 3)
+
+    def test_unit_send_email_retry_policy_no_botocore_retries(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", retry_policy=RetryPolicy()).send_email()
+                # the retry policy makes every attempt, botocore must not retry inside them
+                self.assertEqual(mock_botoclient.call_args.kwargs["config"].retries, {"total_max_attempts": 1})
 
+    def test_unit_send_email_cc_bcc(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                validation_obj = SESSender(sendto=["one@domain.com", "two@domain.com"], cc="three@domain.com", bcc=["four@domain.com"], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+                result = validation_obj.send_email_result()
+                self.assertEqual(result.message_ids, ["fakemsgID"])
+                destination = mock_botoclient.return_value.send_email.call_args.kwargs["Destination"]
+                self.assertEqual(destination, {"ToAddresses": ["one@domain.com", "two@domain.com"], "CcAddresses": ["three@domain.com"], "BccAddresses": ["four@domain.com"]})
+
+    def test_unit_send_email_chunks_recipients(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = [{"MessageId":"fakemsgID1"}, {"MessageId":"fakemsgID2"}, {"MessageId":"fakemsgID3"}]
+                validation_obj = SESSender(sendto=[f"to{i}@domain.com" for i in range(60)], bcc=[f"bcc{i}@domain.com" for i in range(60)], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+                result = validation_obj.send_email_result()
+                self.assertEqual(result.message_id, "fakemsgID1")
+                self.assertEqual(result.message_ids, ["fakemsgID1", "fakemsgID2", "fakemsgID3"])
+                calls = mock_botoclient.return_value.send_email.call_args_list
+                self.assertEqual(len(calls[0].kwargs["Destination"]["ToAddresses"]), 50)
+                self.assertEqual(len(calls[1].kwargs["Destination"]["ToAddresses"]), 10)
+                self.assertEqual(len(calls[1].kwargs["Destination"]["BccAddresses"]), 40)
+                self.assertEqual(len(calls[2].kwargs["Destination"]["BccAddresses"]), 20)
+
+    def test_unit_send_email_chunk_failure_reports_sent(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = [{"MessageId":"fakemsgID1"}, ClientError({"Error": {"Message":"fake resp"}}, "SendEmail")]
+                validation_obj = SESSender(sendto=[f"to{i}@domain.com" for i in range(60)], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+                with self.assertRaises(ClientError) as raised:
+                    validation_obj.send_email()
+                self.assertEqual(raised.exception.message_ids, ["fakemsgID1"])
+                self.assertEqual(raised.exception.unsent_recipients, ([f"to{i}@domain.com" for i in range(50, 60)], [], []))
+
+    def test_unit_send_email_no_recipients(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            validation_obj = SESSender(sendto=[], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+            with self.assertRaises(ValueError):
+                validation_obj.send_email()
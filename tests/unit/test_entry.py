@@ -1,8 +1,10 @@
-import unittest, mock
+import multiprocessing, json, os, subprocess, sys, tempfile, unittest, mock
 from click.testing import CliRunner
-from py_basic_ses.entry import send_test_email, send_email
-from py_basic_ses.exceptions import CredError
+from py_basic_ses.entry import send_test_email, send_email, ses_relay
+from py_basic_ses.exceptions import CredError, SuppressedRecipientError, PayloadValidationError
+from py_basic_ses.validation import FieldError
 from botocore.exceptions import ClientError
+from py_basic_ses.clients import close_clients
 
 
 class TestEntrySendTestEmail(unittest.TestCase):
@@ -56,6 +58,15 @@ class TestEntrySendTestEmail(unittest.TestCase):
             test_result = test_runner.invoke(send_test_email, '--to youraddress --fromaddr myaddress --awsregion myregion')
             self.assertEqual(test_result.exit_code, 5)
 
+    def test_unit_send_test_email_sessender_send_invalid(self):
+        self.addCleanup(close_clients)
+        with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+            test_runner = CliRunner()
+            test_result = test_runner.invoke(send_test_email, '--to notanaddress --fromaddr myaddress@domain.com --awsregion myregion')
+            self.assertEqual(test_result.exit_code, 8)
+            self.assertIn("sendto: 'notanaddress' is not a valid email address", test_result.output)
+            mock_botoclient.return_value.send_email.assert_not_called()
+
     def test_unit_send_test_email_sessender_send_success(self):
         with mock.patch("py_basic_ses.entry.SESSender") as mock_sessender:
             mock_sessender.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
@@ -114,6 +125,21 @@ class TestEntrySendEmail(unittest.TestCase):
             test_result = test_runner.invoke(send_email, '--to youraddress --fromaddr myaddress --awsregion myregion --message_txt myplainmsg')
             self.assertEqual(test_result.exit_code, 4)
 
+    def test_unit_send_email_sessender_send_suppressed(self):
+        with mock.patch("py_basic_ses.entry.SESSender") as mock_sessender:
+            mock_sessender.return_value.send_email.side_effect = SuppressedRecipientError(["youraddress"])
+            test_runner = CliRunner()
+            test_result = test_runner.invoke(send_email, '--to youraddress --fromaddr myaddress --awsregion myregion --message_txt myplainmsg')
+            self.assertEqual(test_result.exit_code, 7)
+
+    def test_unit_send_email_sessender_send_invalid(self):
+        with mock.patch("py_basic_ses.entry.SESSender") as mock_sessender:
+            mock_sessender.return_value.send_email.side_effect = PayloadValidationError([FieldError("sendto", "invalid_address", "'youraddress' is not a valid email address")])
+            test_runner = CliRunner()
+            test_result = test_runner.invoke(send_email, '--to youraddress --fromaddr myaddress --awsregion myregion --message_txt myplainmsg')
+            self.assertEqual(test_result.exit_code, 8)
+            self.assertIn("sendto: 'youraddress' is not a valid email address", test_result.output)
+
     def test_unit_send_email_sessender_send_unexpected_exception(self):
         with mock.patch("py_basic_ses.entry.SESSender") as mock_sessender:
             mock_sessender.return_value.send_email.side_effect = Exception("fake exception")
@@ -121,9 +147,160 @@ class TestEntrySendEmail(unittest.TestCase):
             test_result = test_runner.invoke(send_email, '--to youraddress --fromaddr myaddress --awsregion myregion --message_txt myplainmsg')
             self.assertEqual(test_result.exit_code, 5)
 
+    def test_unit_send_email_validate_only(self):
+        with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+            test_runner = CliRunner()
+            test_result = test_runner.invoke(send_email, '--to you@domain.com --fromaddr me@domain.com --awsregion myregion --message_txt myplainmsg --validate_only')
+            self.assertEqual(test_result.exit_code, 0)
+            test_result = test_runner.invoke(send_email, '--to youraddress --fromaddr me@domain.com --awsregion myregion --message_txt myplainmsg --validate_only')
+            self.assertEqual(test_result.exit_code, 8)
+            self.assertIn("sendto: 'youraddress' is not a valid email address", test_result.output)
+            mock_botoclient.assert_not_called()
+
     def test_unit_send_email_sessender_send_success(self):
         with mock.patch("py_basic_ses.entry.SESSender") as mock_sessender:
             mock_sessender.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
             test_runner = CliRunner()
             test_result = test_runner.invoke(send_email, '--to youraddress --fromaddr myaddress --awsregion myregion --message_txt myplainmsg')
-            self.assertEqual(test_result.exit_code, 0)
\ No newline at end of file
+            self.assertEqual(test_result.exit_code, 0)
+
+
+
+class TestEntrySendEmailBatch(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def invoke_batch(self, args, batch_input, send_side_effect):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = send_side_effect
+                test_runner = CliRunner()
+                test_result = test_runner.invoke(send_email, args, input=batch_input)
+                lines = [json.loads(line) for line in test_result.output.splitlines()]
+                return test_result, lines, mock_botoclient
+
+    def test_unit_send_email_batch_jsonl_stdin(self):
+        batch_input = "\n".join(json.dumps({"to": f"user{i}@domain.com", "message_txt": f"message {i}"}) for i in range(5))
+        test_result, lines, mock_botoclient = self.invoke_batch('--batch - --fromaddr myaddress@domain.com --awsregion myregion', batch_input,
+                                                                lambda **kwargs: {"MessageId": kwargs["Destination"]["ToAddresses"][0]})
+        self.assertEqual(test_result.exit_code, 0)
+        self.assertEqual([line["message_id"] for line in lines[:-1]], [f"user{i}@domain.com" for i in range(5)])
+        self.assertEqual(lines[-1]["summary"]["sent"], 5)
+        # the command line options fill in the fields the records leave out
+        self.assertEqual(mock_botoclient.return_value.send_email.call_args.kwargs["Source"], "myaddress@domain.com")
+
+    def test_unit_send_email_batch_csv(self):
+        batch_input = "to,message_txt\nuser0@domain.com,message 0\nuser1@domain.com,message 1\n"
+        test_result, lines, mock_botoclient = self.invoke_batch('--batch - --batch_format csv --fromaddr myaddress@domain.com --awsregion myregion', batch_input,
+                                                                lambda **kwargs: {"MessageId": "fakemsgID"})
+        self.assertEqual(test_result.exit_code, 0)
+        self.assertEqual([line["line"] for line in lines[:-1]], [2, 3])
+
+    def test_unit_send_email_batch_malformed_and_failed(self):
+        batch_input = "\n".join([
+            json.dumps({"to": "user0@domain.com", "message_txt": "message 0"}),
+            "not json",
+            json.dumps({"message_txt": "no recipient"}),
+            json.dumps({"to": "user3@domain.com", "message_txt": "message 3"}),
+        ])
+        test_result, lines, mock_botoclient = self.invoke_batch('--batch - --fromaddr myaddress@domain.com --awsregion myregion', batch_input,
+                                                                [{"MessageId": "fakemsgID"}, ClientError({"Error": {"Message":"fake resp"}}, "SendEmail")])
+        self.assertEqual(test_result.exit_code, 6)
+        by_line = {line["line"]: line for line in lines[:-1]}
+        self.assertEqual(by_line[1]["status"], "sent")
+        self.assertEqual(by_line[2]["status"], "malformed")
+        self.assertEqual(by_line[3]["status"], "malformed")
+        self.assertEqual(by_line[4]["status"], "failed")
+        self.assertEqual(by_line[4]["error"], "fake resp")
+        self.assertEqual(lines[-1]["summary"], dict(lines[-1]["summary"], total=4, sent=1, failed=1, malformed=2))
+
+    # the mocks only reach the worker processes when they are forked
+    @unittest.skipUnless(multiprocessing.get_context().get_start_method() == "fork", "needs fork as the default start method")
+    def test_unit_send_email_batch_processes(self):
+        batch_input = "\n".join(json.dumps({"to": f"user{i}@domain.com", "message_txt": f"message {i}"}) for i in range(5))
+        test_result, lines, mock_botoclient = self.invoke_batch('--batch - --fromaddr myaddress@domain.com --awsregion myregion --processes 2 --workers 2', batch_input,
+                                                                lambda **kwargs: {"MessageId": kwargs["Destination"]["ToAddresses"][0]})
+        self.assertEqual(test_result.exit_code, 0)
+        self.assertEqual([line["message_id"] for line in lines[:-1]], [f"user{i}@domain.com" for i in range(5)])
+
+    def test_unit_send_email_batch_suppression_list(self):
+        batch_input = "\n".join(json.dumps({"to": to, "message_txt": "some text"}) for to in (["user0@domain.com", "gone@domain.com"], "gone@domain.com"))
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as suppression_file:
+            suppression_file.write("gone@domain.com\n")
+        try:
+            test_result, lines, mock_botoclient = self.invoke_batch(f'--batch - --fromaddr myaddress@domain.com --awsregion myregion --suppression_list {suppression_file.name}', batch_input,
+                                                                    lambda **kwargs: {"MessageId": "fakemsgID"})
+        finally:
+            os.remove(suppression_file.name)
+        self.assertEqual(test_result.exit_code, 0)
+        self.assertEqual(lines[0]["suppressed"], ["gone@domain.com"])
+        self.assertEqual(lines[1]["status"], "suppressed")
+        self.assertEqual(lines[-1]["summary"]["suppressed"], 1)
+        self.assertEqual(mock_botoclient.return_value.send_email.call_count, 1)
+
+    def test_unit_send_email_batch_invalid(self):
+        batch_input = "\n".join(json.dumps({"to": to, "message_txt": "some text"}) for to in ("user0@domain.com", "not an address"))
+        test_result, lines, mock_botoclient = self.invoke_batch('--batch - --fromaddr myaddress@domain.com --awsregion myregion', batch_input,
+                                                                lambda **kwargs: {"MessageId": "fakemsgID"})
+        self.assertEqual(test_result.exit_code, 6)
+        self.assertEqual(lines[1]["status"], "invalid")
+        self.assertEqual(lines[1]["errors"][0]["code"], "invalid_address")
+        self.assertEqual(lines[-1]["summary"]["invalid"], 1)
+        # the invalid message never reached SES
+        self.assertEqual(mock_botoclient.return_value.send_email.call_count, 1)
+
+    def test_unit_send_email_batch_validate_only(self):
+        batch_input = "\n".join(json.dumps({"to": to, "message_txt": "some text"}) for to in ("user0@domain.com", "not an address"))
+        test_result, lines, mock_botoclient = self.invoke_batch('--batch - --fromaddr myaddress@domain.com --awsregion myregion --validate_only', batch_input,
+                                                                lambda **kwargs: {"MessageId": "fakemsgID"})
+        self.assertEqual(test_result.exit_code, 6)
+        self.assertEqual([line["status"] for line in lines[:-1]], ["valid", "invalid"])
+        self.assertEqual(lines[-1]["summary"]["valid"], 1)
+        mock_botoclient.return_value.send_email.assert_not_called()
+
+    def test_unit_send_email_batch_missing_file(self):
+        test_runner = CliRunner()
+        test_result = test_runner.invoke(send_email, '--batch /no/such/file.jsonl')
+        self.assertEqual(test_result.exit_code, 1)
+
+
+
+class TestEntrySESRelay(unittest.TestCase):
+
+    def test_unit_ses_relay_serves(self):
+        with mock.patch("py_basic_ses.relay.SESRelay.serve_forever", side_effect=KeyboardInterrupt) as mock_serve:
+            with mock.patch("py_basic_ses.relay.SESRelay.__init__", return_value=None) as mock_init:
+                with mock.patch("py_basic_ses.relay.SESRelay.http_url", "http://127.0.0.1:8025"):
+                    test_runner = CliRunner()
+                    test_result = test_runner.invoke(ses_relay, '--awsregion us-west-2 --rate_limit 14')
+                    self.assertEqual(test_result.exit_code, 0)
+                    self.assertIn("listening on http://127.0.0.1:8025", test_result.output)
+                    self.assertEqual(mock_init.call_args.kwargs["defaults"], {"aws_region": "us-west-2"})
+                    self.assertEqual(mock_init.call_args.kwargs["sender_options"]["rate_limiter"].rate, 14)
+
+    def test_unit_ses_relay_port_in_use(self):
+        with mock.patch("py_basic_ses.relay.SESRelay.__init__", side_effect=OSError("address already in use")) as mock_init:
+            test_runner = CliRunner()
+            test_result = test_runner.invoke(ses_relay, '--port 8025')
+            self.assertEqual(test_result.exit_code, 1)
+
+
+
+class TestEntryLazyImports(unittest.TestCase):
+
+    # importing the console script module must not pull in boto3 or botocore
+    def test_unit_entry_import_skips_boto3(self):
+        code = "import sys, py_basic_ses.entry; print('boto3' in sys.modules, 'botocore' in sys.modules)"
+        completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(completed.stdout.split(), ["False", "False"])
+
+    def test_unit_entry_lazy_attribute(self):
+        import py_basic_ses.entry
+        from py_basic_ses.emailing import SESSender
+        self.assertIs(py_basic_ses.entry.SESSender, SESSender)
+        with self.assertRaises(AttributeError):
+            py_basic_ses.entry.not_a_real_attribute
@@ -0,0 +1,115 @@
+import unittest, mock
+from botocore.exceptions import ClientError
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.retry import RetryPolicy
+from py_basic_ses.transports import FakeSESTransport
+
+# import the instrumentation, so we can test it
+from py_basic_ses.instrumentation import Instrumentation, MetricsRegistry, error_code
+
+
+def sender(**kwargs):
+    return SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", **kwargs)
+
+
+# Testing the MetricsRegistry class
+class TestInstrumentationMetricsRegistry(unittest.TestCase):
+
+    def test_unit_metrics_registry_counter(self):
+        registry = MetricsRegistry()
+        registry.counter("fake_total", "fake help").inc(operation="send_email")
+        registry.counter("fake_total").inc(2, operation="send_email")
+        self.assertEqual(registry.counter("fake_total").value(operation="send_email"), 3)
+        self.assertIn('fake_total{operation="send_email"} 3', registry.render())
+
+    def test_unit_metrics_registry_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("fake_seconds", "fake help", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        rendered = registry.render()
+        self.assertIn('fake_seconds_bucket{le="0.1"} 1', rendered)
+        self.assertIn('fake_seconds_bucket{le="1.0"} 2', rendered)
+        self.assertIn('fake_seconds_bucket{le="+Inf"} 3', rendered)
+        self.assertIn("fake_seconds_count 3", rendered)
+
+    def test_unit_metrics_registry_gauge(self):
+        registry = MetricsRegistry()
+        registry.gauge("fake_depth", "fake help").set(5)
+        registry.gauge("fake_depth").set(2)
+        self.assertEqual(registry.gauge("fake_depth").value(), 2)
+        rendered = registry.render()
+        self.assertIn("# TYPE fake_depth gauge", rendered)
+        self.assertIn("fake_depth 2", rendered)
+
+    def test_unit_metrics_registry_type_clash(self):
+        registry = MetricsRegistry()
+        registry.counter("fake")
+        with self.assertRaises(ValueError):
+            registry.histogram("fake")
+
+    def test_unit_metrics_registry_escapes_labels(self):
+        registry = MetricsRegistry()
+        registry.counter("fake_total").inc(error_code='a"b')
+        self.assertIn('fake_total{error_code="a\\"b"} 1', registry.render())
+
+
+# Testing the Instrumentation class with a sender
+class TestInstrumentationInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+        self.registry = MetricsRegistry()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_instrumentation_phases(self):
+        instrumentation = Instrumentation(self.registry)
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                sender(instrumentation=instrumentation).send_email()
+        for phase in ("validate", "client", "send", "total"):
+            self.assertEqual(instrumentation.phase_seconds.count(phase=phase), 1)
+        self.assertEqual(instrumentation.sent.value(operation="send_email"), 1)
+
+    def test_unit_instrumentation_failed_by_code(self):
+        instrumentation = Instrumentation(self.registry)
+        transport = FakeSESTransport()
+        transport.fail_next("MessageRejected")
+        with self.assertRaises(ClientError):
+            sender(transport=transport, instrumentation=instrumentation).send_email()
+        self.assertEqual(instrumentation.failed.value(operation="send_email", error_code="MessageRejected"), 1)
+        self.assertEqual(instrumentation.send_seconds.count(operation="send_email"), 1)
+
+    def test_unit_instrumentation_throttled_and_retries(self):
+        instrumentation = Instrumentation(self.registry)
+        transport = FakeSESTransport()
+        transport.fail_next("Throttling", times=2)
+        with mock.patch("py_basic_ses.retry.time.sleep") as mock_sleep:
+            sender(transport=transport, instrumentation=instrumentation, retry_policy=RetryPolicy(max_attempts=3)).send_email()
+        self.assertEqual(instrumentation.throttled.value(operation="send_email"), 2)
+        self.assertEqual(instrumentation.retries.value(operation="send_email"), 2)
+        self.assertEqual(instrumentation.sent.value(operation="send_email"), 1)
+
+    def test_unit_instrumentation_hooks(self):
+        pre_send = mock.Mock()
+        post_send = mock.Mock()
+        ses_sender = sender(transport=FakeSESTransport(), instrumentation=Instrumentation(self.registry, pre_send=pre_send, post_send=post_send))
+        ses_sender.send_email()
+        self.assertEqual(pre_send.call_args.args[:2], (ses_sender, "send_email"))
+        self.assertEqual(post_send.call_args.args[2]["MessageId"], "fake-000000000001")
+        self.assertIsNone(post_send.call_args.args[3])
+
+    def test_unit_instrumentation_tracer_spans(self):
+        tracer = mock.MagicMock()
+        sender(transport=FakeSESTransport(), instrumentation=Instrumentation(self.registry, tracer=tracer)).send_email()
+        span_names = [call.args[0] for call in tracer.start_as_current_span.call_args_list]
+        self.assertEqual(span_names, ["ses.total", "ses.client", "ses.send"])
+
+    def test_unit_instrumentation_error_code(self):
+        self.assertEqual(error_code(ClientError({"Error": {"Code": "Throttling"}}, "SendEmail")), "Throttling")
+        self.assertEqual(error_code(ValueError()), "ValueError")
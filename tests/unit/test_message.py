@@ -0,0 +1,113 @@
+import pickle, unittest, mock
+from py_basic_ses.emailing import SESSender
+
+# import the message type and payload builder, so we can test them
+from py_basic_ses.message import EmailMessage, PayloadBuilder
+
+
+def email_message(**kwargs):
+    options = {"sendto": ["one@domain.com", "two@domain.com"], "fromaddr": "email@domain.com", "message_txt": "some text",
+               "fromname": "Fake Name", "msgsubject": "fake subject"}
+    options.update(kwargs)
+    return EmailMessage(**options)
+
+
+# Testing the EmailMessage class
+class TestMessageEmailMessage(unittest.TestCase):
+
+    def test_unit_email_message_immutable(self):
+        message = email_message()
+        with self.assertRaises(AttributeError):
+            message.msgsubject = "changed"
+        with self.assertRaises(AttributeError):
+            del message.fromaddr
+        # __slots__ means no per instance dict
+        self.assertFalse(hasattr(message, "__dict__"))
+
+    def test_unit_email_message_recipients_tuples(self):
+        message = email_message(sendto="one@domain.com", cc=["two@domain.com"])
+        self.assertEqual(message.sendto, ("one@domain.com",))
+        self.assertEqual(message.cc, ("two@domain.com",))
+        self.assertEqual(message.bcc, ())
+
+    def test_unit_email_message_eq_hash(self):
+        self.assertEqual(email_message(), email_message())
+        self.assertEqual(len({email_message(), email_message()}), 1)
+        self.assertNotEqual(email_message(), email_message(msgsubject="other"))
+
+    def test_unit_email_message_replace(self):
+        message = email_message()
+        changed = message.replace(sendto="three@domain.com")
+        self.assertEqual(changed.sendto, ("three@domain.com",))
+        self.assertEqual(changed.msgsubject, "fake subject")
+        self.assertEqual(message.sendto, ("one@domain.com", "two@domain.com"))
+
+    def test_unit_email_message_pickle(self):
+        message = email_message(message_html="<p>some html</p>", bcc="three@domain.com")
+        self.assertEqual(pickle.loads(pickle.dumps(message)), message)
+
+    def test_unit_email_message_to_dict(self):
+        self.assertEqual(email_message().to_dict(), {"sendto": ["one@domain.com", "two@domain.com"], "fromaddr": "email@domain.com",
+                                                     "message_txt": "some text", "fromname": "Fake Name", "msgsubject": "fake subject"})
+
+
+# Testing the PayloadBuilder class
+class TestMessagePayloadBuilder(unittest.TestCase):
+
+    def test_unit_payload_builder_payload(self):
+        payload = PayloadBuilder().build(email_message(), options={"ConfigurationSetName": "fake-set"})
+        self.assertEqual(payload, {
+            "Destination": {"ToAddresses": ["one@domain.com", "two@domain.com"]},
+            "Message": {
+                "Body": {"Html": {"Charset": "UTF-8", "Data": "some text"}, "Text": {"Charset": "UTF-8", "Data": "some text"}},
+                "Subject": {"Charset": "UTF-8", "Data": "fake subject"},
+            },
+            "Source": "Fake Name <email@domain.com>",
+            "ConfigurationSetName": "fake-set",
+        })
+
+    def test_unit_payload_builder_shares_parts(self):
+        builder = PayloadBuilder()
+        first = builder.build(email_message(sendto="one@domain.com"))
+        second = builder.build(email_message(sendto="two@domain.com"))
+        self.assertIs(first["Message"]["Subject"], second["Message"]["Subject"])
+        self.assertIs(first["Message"]["Body"]["Text"], second["Message"]["Body"]["Text"])
+        self.assertIs(first["Source"], second["Source"])
+        self.assertIsNot(first["Destination"], second["Destination"])
+
+    def test_unit_payload_builder_cache_bounds(self):
+        builder = PayloadBuilder(max_cached_parts=2, max_cached_length=20)
+        for i in range(5):
+            builder.build(email_message(msgsubject=f"subject {i}"))
+        self.assertLessEqual(len(builder._parts), 2)
+        # long bodies are never cached
+        builder.build(email_message(message_txt="x" * 21))
+        self.assertNotIn("x" * 21, builder._parts)
+
+
+# Testing SESSender on top of EmailMessage
+class TestMessageSESSender(unittest.TestCase):
+
+    def test_unit_sessender_message(self):
+        sender = SESSender(sendto="one@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", msgsubject="fake subject")
+        message = sender.message()
+        self.assertEqual(message, EmailMessage("one@domain.com", "email@domain.com", "some text", msgsubject="fake subject"))
+        self.assertEqual(sender.build_payload(), PayloadBuilder().build(message))
+
+    def test_unit_sessender_from_message(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                sender = SESSender.from_message(email_message(), "us-west-2", configuration_set="fake-set")
+                self.assertEqual(sender.configuration_set, "fake-set")
+                self.assertEqual(sender.send_email(), "fakemsgID")
+                kwargs = mock_botoclient.return_value.send_email.call_args.kwargs
+                self.assertEqual(kwargs["Destination"], {"ToAddresses": ["one@domain.com", "two@domain.com"]})
+
+    def test_unit_sessender_uppercase_attributes(self):
+        sender = SESSender(sendto="one@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", fromname="Fake Name")
+        self.assertEqual(sender.SENDER, "Fake Name <email@domain.com>")
+        self.assertEqual(sender.SUBJECT, "")
+        self.assertEqual(sender.BODY_HTML, "some text")
+        self.assertEqual(sender.CHARSET, "UTF-8")
+        self.assertEqual(sender.AWS_REGION, "us-west-2")
@@ -0,0 +1,147 @@
+import unittest, mock
+from botocore.exceptions import ClientError
+from py_basic_ses.dedup import DedupCache
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.exceptions import CredError, SuppressedRecipientError
+from py_basic_ses.retry import RetryPolicy
+from py_basic_ses.suppression import SuppressionList
+from py_basic_ses.transports import FakeSESTransport
+
+# import the sender pool, so we can test it
+from py_basic_ses.pool import SenderPool, SenderEndpoint, is_endpoint_error
+
+
+def message(index=0):
+    return {"sendto": f"to{index}@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-east-1"}
+
+
+def endpoint(aws_region, **kwargs):
+    kwargs.setdefault("transport", FakeSESTransport())
+    return SenderEndpoint(aws_region, **kwargs)
+
+
+# Testing the is_endpoint_error() function
+class TestPoolIsEndpointError(unittest.TestCase):
+
+    def test_unit_is_endpoint_error(self):
+        self.assertTrue(is_endpoint_error(ClientError({"Error": {"Code": "Throttling", "Message": "Maximum sending rate exceeded."}}, "SendEmail")))
+        self.assertTrue(is_endpoint_error(ClientError({"Error": {"Code": "Throttling", "Message": "Daily message quota exceeded."}}, "SendEmail")))
+        self.assertTrue(is_endpoint_error(ClientError({"Error": {"Code": "AccountSendingPausedException"}}, "SendEmail")))
+        self.assertTrue(is_endpoint_error(CredError("fake")))
+        self.assertFalse(is_endpoint_error(ClientError({"Error": {"Code": "MessageRejected"}}, "SendEmail")))
+
+
+# Testing the SenderPool class
+class TestPoolSenderPool(unittest.TestCase):
+
+    def test_unit_pool_sends_with_endpoint_region(self):
+        west = endpoint("us-west-2")
+        result = SenderPool([west]).send_email_result(message())
+        self.assertEqual(result.endpoint, "us-west-2")
+        self.assertEqual(west.sent, 1)
+        # the quota was read from the endpoint's own account
+        self.assertEqual(west.rate_limiter.max_send_rate, 14.0)
+
+    def test_unit_pool_weight_from_quota(self):
+        fast = endpoint("us-east-1", transport=FakeSESTransport(max_send_rate=1000))
+        slow = endpoint("us-west-2", transport=FakeSESTransport(max_send_rate=10))
+        pool = SenderPool([fast, slow], seed=1)
+        for endpoint_ in (fast, slow):
+            endpoint_.limiter()
+        with mock.patch("py_basic_ses.ratelimit.time.sleep") as mock_sleep:
+            for i in range(200):
+                pool.send_email_result(message(i))
+        self.assertGreater(fast.sent, slow.sent * 10)
+
+    def test_unit_pool_fails_over(self):
+        broken = endpoint("us-east-1", quota_aware=False, failure_threshold=2)
+        broken.sender_options["transport"].fail_next("ServiceUnavailable", times=10, status_code=503)
+        working = endpoint("us-west-2", quota_aware=False)
+        pool = SenderPool([broken, working], routing="least_loaded")
+        for i in range(3):
+            self.assertEqual(pool.send_email_result(message(i)).endpoint, "us-west-2")
+        # two failures in a row took the broken endpoint out of rotation, the third send went straight to the working one
+        self.assertFalse(broken.healthy())
+        self.assertEqual(broken.failed, 2)
+        self.assertEqual(working.sent, 3)
+
+    def test_unit_pool_unhealthy_comes_back(self):
+        flaky = endpoint("us-east-1", quota_aware=False, failure_threshold=1, cooldown=10)
+        flaky.sender_options["transport"].fail_next("Throttling")
+        pool = SenderPool([flaky])
+        with mock.patch("py_basic_ses.pool.time.monotonic", return_value=100.0):
+            with self.assertRaises(ClientError):
+                pool.send_email_result(message())
+            self.assertFalse(flaky.healthy())
+        with mock.patch("py_basic_ses.pool.time.monotonic", return_value=111.0):
+            self.assertTrue(flaky.healthy())
+            self.assertEqual(pool.send_email_result(message()).endpoint, "us-east-1")
+
+    def test_unit_pool_message_error_no_failover(self):
+        first = endpoint("us-east-1", quota_aware=False)
+        first.sender_options["transport"].fail_next("MessageRejected")
+        second = endpoint("us-west-2", quota_aware=False)
+        with self.assertRaises(ClientError) as error:
+            SenderPool([first, second], routing="least_loaded").send_email_result(message())
+        self.assertEqual(error.exception.endpoint, "us-east-1")
+        self.assertEqual(second.sent, 0)
+        self.assertTrue(first.healthy())
+
+    def test_unit_pool_send_many(self):
+        # sends have to overlap for least_loaded to spread them, an instant fake never has more than one in flight
+        east = endpoint("us-east-1", quota_aware=False, transport=FakeSESTransport(latency=0.005))
+        west = endpoint("us-west-2", quota_aware=False, transport=FakeSESTransport(latency=0.005))
+        results = list(SenderPool([east, west], routing="least_loaded").send_many((message(i) for i in range(40)), max_workers=4))
+        self.assertEqual([result.index for result in results], list(range(40)))
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(east.sent + west.sent, 40)
+        self.assertGreater(east.sent, 0)
+        self.assertGreater(west.sent, 0)
+
+    def test_unit_pool_keeps_suppression_list(self):
+        west = endpoint("us-west-2")
+        suppression = SuppressionList(["to0@domain.com"])
+        sender = SESSender(sendto=["to0@domain.com", "to1@domain.com"], fromaddr="email@domain.com", message_txt="some text", aws_region="us-east-1", suppression_list=suppression)
+        result = SenderPool([west]).send_email_result(sender)
+        self.assertEqual(result.suppressed, ["to0@domain.com"])
+        self.assertEqual(west.sender_options["transport"].sent[0][1]["Destination"]["ToAddresses"], ["to1@domain.com"])
+        # a message with every recipient suppressed is never sent
+        with self.assertRaises(SuppressedRecipientError):
+            SenderPool([west]).send_email_result(SESSender(sendto="to0@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-east-1", suppression_list=suppression))
+        self.assertEqual(west.sent, 1)
+
+    def test_unit_pool_keeps_sender_settings(self):
+        west = endpoint("us-west-2", quota_aware=False)
+        west.sender_options["transport"].fail_next("Throttling", message="Maximum sending rate exceeded.")
+        options = dict(message(), retry_policy=RetryPolicy(base_delay=0), dedup_cache=DedupCache(), backend="sesv2")
+        pool = SenderPool([west], sender_class=mock.Mock(wraps=SESSender))
+        first = pool.send_email_result(SESSender(**options))
+        again = pool.send_email_result(SESSender(**options))
+        # the sender's retry policy retried the throttled call, and its dedup cache caught the second send
+        self.assertEqual(pool.sender_class.call_args.kwargs["backend"], "sesv2")
+        self.assertEqual(first.attempts, 2)
+        self.assertTrue(again.duplicate)
+        self.assertEqual(west.sender_options["transport"].messages_sent, 1)
+
+    def test_unit_pool_partial_send_fails_over_rest(self):
+        broken = endpoint("us-east-1", quota_aware=False)
+        transport = broken.sender_options["transport"]
+        send_email = transport.send_email
+        def fail_second_call(**payload):
+            if transport.calls == 1:
+                transport.calls += 1
+                raise ClientError({"Error": {"Code": "ServiceUnavailable", "Message": "fake"}, "ResponseMetadata": {"HTTPStatusCode": 503}}, "SendEmail")
+            return send_email(**payload)
+        transport.send_email = fail_second_call
+        working = endpoint("us-west-2", quota_aware=False)
+        recipients = [f"to{i}@domain.com" for i in range(60)]
+        result = SenderPool([broken, working], routing="least_loaded").send_email_result(dict(message(), sendto=recipients))
+        # the first 50 went out from us-east-1, only the last 10 were failed over
+        self.assertEqual(result.endpoint, "us-west-2")
+        self.assertEqual(len(result.message_ids), 2)
+        self.assertEqual(working.sender_options["transport"].sent[0][1]["Destination"]["ToAddresses"], recipients[50:])
+        self.assertEqual(working.sent, 1)
+
+    def test_unit_pool_bad_routing(self):
+        with self.assertRaises(ValueError):
+            SenderPool([endpoint("us-east-1")], routing="random")
@@ -0,0 +1,108 @@
+import multiprocessing, os, time, unittest
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.results import SendResult
+from py_basic_ses.suppression import SuppressionList
+from py_basic_ses.message import EmailMessage
+from py_basic_ses.transports import FakeSESTransport
+
+# import the process pool sender, so we can test it
+from py_basic_ses.procpool import send_many_processes, _picklable_error
+
+
+def message(index):
+    return {"sendto": f"to{index}@domain.com", "fromaddr": "email@domain.com", "message_txt": f"text {index}", "aws_region": "us-east-1"}
+
+
+def render(index):
+    # runs in the worker process
+    return dict(message(index), msgsubject=f"rendered in {os.getpid()}")
+
+
+class StartTimeSender(SESSender):
+    # reports which process started the send and when, instead of sending
+    def send_email_result(self):
+        return SendResult(message_id=f"{os.getpid()} {time.monotonic()}")
+
+
+class Unpicklable(Exception):
+    def __reduce__(self):
+        raise TypeError("can't pickle")
+
+
+# Testing send_many_processes()
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "the fake transport is handed to the workers by fork")
+class TestProcPoolSendManyProcesses(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+        self.context = multiprocessing.get_context("fork")
+
+    def tearDown(self):
+        close_clients()
+
+    def send(self, messages, **kwargs):
+        kwargs.setdefault("transport", FakeSESTransport())
+        return list(send_many_processes(messages, processes=2, mp_context=self.context, **kwargs))
+
+    def test_unit_send_many_processes_ordered(self):
+        results = self.send((message(i) for i in range(50)), chunk_size=4)
+        self.assertEqual([result.index for result in results], list(range(50)))
+        self.assertTrue(all(result.ok for result in results))
+        # every worker numbers its own fake message ids, repeats mean more than one process did the work
+        self.assertLess(len(set(result.message_id for result in results)), 50)
+
+    def test_unit_send_many_processes_unordered(self):
+        results = self.send((message(i) for i in range(30)), chunk_size=4, ordered=False, threads_per_process=1)
+        self.assertEqual(sorted(result.index for result in results), list(range(30)))
+
+    def test_unit_send_many_processes_message_types(self):
+        sender = SESSender(**message(1))
+        results = self.send([message(0), sender, EmailMessage("to2@domain.com", "email@domain.com", "text 2")], aws_region="us-east-1")
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_unit_send_many_processes_keeps_suppression_list(self):
+        sender = SESSender(sendto=["user0@domain.com", "user1@domain.com"], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", suppression_list=SuppressionList(["user0@domain.com"]))
+        result = self.send([sender])[0]
+        self.assertTrue(result.ok)
+        self.assertEqual(result.suppressed, ["user0@domain.com"])
+
+    def test_unit_send_many_processes_render(self):
+        results = self.send(range(6), render=render, chunk_size=2)
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_unit_send_many_processes_errors(self):
+        results = self.send([message(0), {"fromaddr": "email@domain.com"}])
+        self.assertTrue(results[0].ok)
+        self.assertIsInstance(results[1].error, TypeError)
+        self.assertEqual(results[1].index, 1)
+
+    def test_unit_send_many_processes_rate_limit_per_message(self):
+        # 20 per second over 2 workers is 10 per second each, one message at a time even inside a chunk
+        results = self.send((message(i) for i in range(12)), chunk_size=6, threads_per_process=4, rate_limit=20, sender_class=StartTimeSender)
+        starts = {}
+        for result in results:
+            pid, started = result.message_id.split()
+            starts.setdefault(pid, []).append(float(started))
+        for times in starts.values():
+            times.sort()
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            self.assertGreater(min(gaps), 0.08)
+
+    def test_unit_send_many_processes_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            list(send_many_processes([], processes=0))
+        with self.assertRaises(ValueError):
+            list(send_many_processes([], chunk_size=0))
+        with self.assertRaises(ValueError):
+            list(send_many_processes([], rate_limit=0))
+
+
+# Testing _picklable_error()
+class TestProcPoolPicklableError(unittest.TestCase):
+
+    def test_unit_picklable_error(self):
+        error = ValueError("fake")
+        self.assertIs(_picklable_error(error), error)
+        replaced = _picklable_error(Unpicklable("fake"))
+        self.assertEqual(str(replaced), "Unpicklable: fake")
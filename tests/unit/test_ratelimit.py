@@ -0,0 +1,101 @@
+import unittest, mock
+from py_basic_ses.clients import SESClientRegistry, close_clients
+from py_basic_ses.emailing import SESSender
+
+# import the rate limiters, so we can test them
+from py_basic_ses.ratelimit import TokenBucket, SESQuotaRateLimiter
+
+
+# Testing the TokenBucket class
+class TestRatelimitTokenBucket(unittest.TestCase):
+
+    def test_unit_token_bucket_bad_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_unit_token_bucket_burst_without_waiting(self):
+        with mock.patch("py_basic_ses.ratelimit.time.sleep") as mock_sleep:
+            bucket = TokenBucket(5)
+            for i in range(5):
+                self.assertEqual(bucket.acquire(), 0.0)
+            mock_sleep.assert_not_called()
+
+    def test_unit_token_bucket_waits_when_empty(self):
+        with mock.patch("py_basic_ses.ratelimit.time.monotonic", return_value=100.0) as mock_monotonic:
+            with mock.patch("py_basic_ses.ratelimit.time.sleep") as mock_sleep:
+                bucket = TokenBucket(2, capacity=1)
+                bucket.acquire()
+                # the bucket is empty, the next token is half a second away at 2 tokens per second
+                self.assertAlmostEqual(bucket.acquire(), 0.5)
+                mock_sleep.assert_called_once_with(0.5)
+                # a third caller queues behind the second
+                self.assertAlmostEqual(bucket.acquire(), 1.0)
+
+    def test_unit_token_bucket_refills(self):
+        with mock.patch("py_basic_ses.ratelimit.time.monotonic", side_effect=[100.0, 100.0, 100.0, 101.0]) as mock_monotonic:
+            bucket = TokenBucket(1, capacity=1)
+            self.assertTrue(bucket.try_acquire())
+            self.assertFalse(bucket.try_acquire())
+            self.assertTrue(bucket.try_acquire())
+
+    def test_unit_token_bucket_metrics(self):
+        with mock.patch("py_basic_ses.ratelimit.time.sleep") as mock_sleep:
+            bucket = TokenBucket(1, capacity=1)
+            bucket.acquire()
+            bucket.acquire()
+            metrics = bucket.metrics()
+            self.assertEqual(metrics["acquired"], 2)
+            self.assertEqual(metrics["waits"], 1)
+            self.assertGreater(metrics["total_wait_time"], 0)
+            self.assertEqual(bucket.tokens, 0.0)
+
+
+# Testing the SESQuotaRateLimiter class
+class TestRatelimitSESQuotaRateLimiter(unittest.TestCase):
+
+    def fake_registry(self, max_send_rate):
+        registry = mock.MagicMock(spec=SESClientRegistry)
+        registry.get_client.return_value.get_send_quota.return_value = {"Max24HourSend": 50000.0, "MaxSendRate": max_send_rate, "SentLast24Hours": 10.0}
+        return registry
+
+    def test_unit_quota_limiter_reads_quota(self):
+        limiter = SESQuotaRateLimiter("us-west-2", client_registry=self.fake_registry(14.0))
+        self.assertEqual(limiter.rate, 14.0)
+        self.assertEqual(limiter.metrics()["max_send_rate"], 14.0)
+
+    def test_unit_quota_limiter_headroom(self):
+        limiter = SESQuotaRateLimiter("us-west-2", headroom=0.5, client_registry=self.fake_registry(14.0))
+        self.assertEqual(limiter.rate, 7.0)
+
+    def test_unit_quota_limiter_refreshes_when_stale(self):
+        registry = self.fake_registry(14.0)
+        limiter = SESQuotaRateLimiter("us-west-2", refresh_interval=0, client_registry=registry)
+        registry.get_client.return_value.get_send_quota.return_value = {"Max24HourSend": 50000.0, "MaxSendRate": 28.0, "SentLast24Hours": 10.0}
+        limiter.acquire()
+        self.assertEqual(limiter.rate, 28.0)
+
+    def test_unit_quota_limiter_keeps_rate_on_refresh_error(self):
+        registry = self.fake_registry(14.0)
+        limiter = SESQuotaRateLimiter("us-west-2", refresh_interval=0, client_registry=registry)
+        registry.get_client.return_value.get_send_quota.side_effect = Exception("fake quota exception")
+        limiter.acquire()
+        self.assertEqual(limiter.rate, 14.0)
+
+
+# Testing that SESSender uses the rate limiter
+class TestRatelimitSESSender(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_send_email_acquires_token(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                limiter = mock.MagicMock()
+                sender = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", rate_limiter=limiter)
+                self.assertEqual(sender.send_email(), "fakemsgID")
+                limiter.acquire.assert_called_once()
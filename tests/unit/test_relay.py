@@ -0,0 +1,175 @@
+import http.client, json, os, smtplib, socket, tempfile, time, unittest, urllib.error, urllib.request
+from email.message import EmailMessage
+from py_basic_ses.instrumentation import MetricsRegistry
+from py_basic_ses.transports import FakeSESTransport
+
+# import the relay, so we can test it
+from py_basic_ses.relay import SESRelay, check_message, message_from_mime
+
+
+def mime_message(**headers) -> bytes:
+    message = EmailMessage()
+    message["From"] = headers.pop("From", "Fake Name <email@domain.com>")
+    message["To"] = headers.pop("To", "one@domain.com")
+    for name, value in headers.items():
+        message[name] = value
+    message.set_content("some text")
+    message.add_alternative("<p>some html</p>", subtype="html")
+    return bytes(message)
+
+
+# Testing check_message() and message_from_mime()
+class TestRelayMessages(unittest.TestCase):
+
+    def test_unit_check_message_defaults(self):
+        message = check_message({"sendto": "one@domain.com", "message_txt": "some text", "fromaddr": None},
+                                {"fromaddr": "email@domain.com", "aws_region": "us-west-2"})
+        self.assertEqual(message, {"sendto": "one@domain.com", "message_txt": "some text", "fromaddr": "email@domain.com", "aws_region": "us-west-2"})
+
+    def test_unit_check_message_backend(self):
+        message = check_message({"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2", "backend": "sesv2"})
+        self.assertEqual(message["backend"], "sesv2")
+
+    def test_unit_check_message_bad(self):
+        with self.assertRaises(ValueError):
+            check_message(["not", "a", "dict"])
+        with self.assertRaises(ValueError):
+            check_message({"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2", "client_registry": 1})
+        with self.assertRaises(ValueError):
+            check_message({"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text"})
+        with self.assertRaisesRegex(ValueError, "sendto must be an address"):
+            check_message({"sendto": 5, "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2"})
+        with self.assertRaisesRegex(ValueError, "backend must be one of"):
+            check_message({"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2", "backend": "smtp"})
+        # preflight validation refuses what SES would reject
+        with self.assertRaisesRegex(ValueError, "sendto: 'not an address' is not a valid email address"):
+            check_message({"sendto": "not an address", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2"})
+
+    def test_unit_message_from_mime(self):
+        message = message_from_mime(mime_message(Cc="two@domain.com", Subject="fake subject"), "bounce@domain.com",
+                                    ["one@domain.com", "TWO@domain.com", "hidden@domain.com"])
+        self.assertEqual(message["sendto"], ["one@domain.com"])
+        self.assertEqual(message["cc"], ["two@domain.com"])
+        self.assertEqual(message["bcc"], ["hidden@domain.com"])
+        self.assertEqual(message["fromname"], "Fake Name")
+        self.assertEqual(message["fromaddr"], "email@domain.com")
+        self.assertEqual(message["msgsubject"], "fake subject")
+        self.assertEqual(message["message_txt"].strip(), "some text")
+        self.assertEqual(message["message_html"].strip(), "<p>some html</p>")
+
+    def test_unit_message_from_mime_attachment(self):
+        message = EmailMessage()
+        message["From"] = "email@domain.com"
+        message["To"] = "one@domain.com"
+        message.set_content("some text")
+        message.add_attachment(b"data", maintype="application", subtype="octet-stream", filename="fake.bin")
+        with self.assertRaises(ValueError):
+            message_from_mime(bytes(message), "email@domain.com", ["one@domain.com"])
+
+
+# Testing the SESRelay class
+class TestRelaySESRelay(unittest.TestCase):
+
+    def setUp(self):
+        self.queue_dir = tempfile.TemporaryDirectory()
+        self.transport = FakeSESTransport()
+        self.registry = MetricsRegistry()
+        self.relay = SESRelay(os.path.join(self.queue_dir.name, "relay.db"), port=0, smtp_port=0, defaults={"aws_region": "us-west-2"},
+                              max_workers=4, sender_options={"transport": self.transport}, registry=self.registry).start()
+
+    def tearDown(self):
+        self.relay.stop()
+        self.queue_dir.cleanup()
+
+    def request(self, path, body=None):
+        data = None if body == None else json.dumps(body).encode("utf-8")
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.relay.http_url + path, data=data), timeout=5) as response:
+                return response.status, response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8")
+
+    def wait_for_sends(self, count):
+        deadline = time.monotonic() + 5
+        while self.transport.messages_sent < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.transport.messages_sent, count)
+
+    def test_unit_relay_http_send(self):
+        status, body = self.request("/send", [{"sendto": f"user{i}@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text"} for i in range(5)])
+        self.assertEqual(status, 202)
+        self.assertEqual(len(json.loads(body)["queued"]), 5)
+        self.wait_for_sends(5)
+        self.assertEqual(self.registry.counter("py_basic_ses_relay_received_total").value(protocol="http"), 5)
+
+    def test_unit_relay_http_rejects(self):
+        status, body = self.request("/send", [{"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text"}, {"sendto": "one@domain.com"}])
+        self.assertEqual(status, 400)
+        self.assertIn("message 1", json.loads(body)["error"])
+        # nothing from a rejected request is queued
+        self.assertEqual(self.relay.queue.depth(), 0)
+        self.assertEqual(self.request("/nowhere")[0], 404)
+
+    def test_unit_relay_http_bad_content_length(self):
+        for length in ("abc", "-5"):
+            connection = http.client.HTTPConnection(self.relay.http_url[len("http://"):], timeout=5)
+            connection.putrequest("POST", "/send")
+            connection.putheader("Content-Length", length)
+            connection.endheaders()
+            response = connection.getresponse()
+            self.assertEqual(response.status, 400)
+            connection.close()
+
+    def test_unit_relay_smtp_send(self):
+        with smtplib.SMTP(*self.relay.smtp_address, timeout=5) as client:
+            client.sendmail("bounce@domain.com", ["one@domain.com", "hidden@domain.com"], mime_message(Subject="fake subject"))
+        self.wait_for_sends(1)
+        operation, payload = self.transport.sent[0]
+        self.assertEqual(payload["Destination"], {"ToAddresses": ["one@domain.com"], "BccAddresses": ["hidden@domain.com"]})
+        self.assertEqual(payload["Message"]["Subject"]["Data"], "fake subject")
+
+    def test_unit_relay_smtp_rejects(self):
+        with smtplib.SMTP(*self.relay.smtp_address, timeout=5) as client:
+            with self.assertRaises(smtplib.SMTPDataError) as error:
+                client.sendmail("bounce@domain.com", ["hidden@domain.com"], mime_message())
+            self.assertEqual(error.exception.smtp_code, 554)
+
+    def test_unit_relay_smtp_unknown_charset(self):
+        data = (b"From: email@domain.com\r\nTo: one@domain.com\r\nSubject: fake subject\r\n"
+                b"Content-Type: text/plain; charset=x-unknown-cs\r\n\r\nsome text\r\n")
+        with smtplib.SMTP(*self.relay.smtp_address, timeout=5) as client:
+            with self.assertRaises(smtplib.SMTPDataError) as error:
+                client.sendmail("bounce@domain.com", ["one@domain.com"], data)
+            self.assertEqual(error.exception.smtp_code, 554)
+            # the session is still usable after the rejection
+            client.sendmail("bounce@domain.com", ["one@domain.com"], mime_message())
+        self.wait_for_sends(1)
+
+    def test_unit_relay_health_and_metrics(self):
+        status, body = self.request("/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["status"], "ok")
+        self.request("/send", {"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text"})
+        self.wait_for_sends(1)
+        status, body = self.request("/metrics")
+        self.assertIn("py_basic_ses_relay_queue_depth", body)
+        self.assertIn("py_basic_ses_sent_total", body)
+
+
+# Testing the relay listen backlog
+class TestRelayBacklog(unittest.TestCase):
+
+    def test_unit_relay_backlog(self):
+        # before start() nothing accepts, so every connection has to wait in the listen backlog
+        with tempfile.TemporaryDirectory() as queue_dir:
+            relay = SESRelay(os.path.join(queue_dir, "relay.db"), port=0, smtp_port=0)
+            connections = []
+            try:
+                for address in (relay._http.server_address[:2], relay.smtp_address):
+                    for _ in range(32):
+                        connections.append(socket.create_connection(address, timeout=0.5))
+            finally:
+                for connection in connections:
+                    connection.close()
+                relay.stop()
+            self.assertEqual(len(connections), 64)
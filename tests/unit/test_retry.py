@@ -0,0 +1,112 @@
+import unittest, mock
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+
+# import the retry engine, so we can test it
+from py_basic_ses.retry import RetryPolicy, is_retryable
+
+
+def client_error(code, message="fake message", status_code=400):
+    return ClientError({"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status_code}}, "SendEmail")
+
+
+# Testing the is_retryable() error classification
+class TestRetryIsRetryable(unittest.TestCase):
+
+    def test_unit_is_retryable_throttling(self):
+        self.assertTrue(is_retryable(client_error("Throttling", "Maximum sending rate exceeded.")))
+
+    def test_unit_is_retryable_daily_quota(self):
+        self.assertFalse(is_retryable(client_error("Throttling", "Daily message quota exceeded.")))
+
+    def test_unit_is_retryable_service_unavailable(self):
+        self.assertTrue(is_retryable(client_error("ServiceUnavailable", status_code=503)))
+
+    def test_unit_is_retryable_server_error(self):
+        self.assertTrue(is_retryable(client_error("SomethingNew", status_code=502)))
+
+    def test_unit_is_retryable_message_rejected(self):
+        self.assertFalse(is_retryable(client_error("MessageRejected")))
+
+    def test_unit_is_retryable_connection_errors(self):
+        self.assertTrue(is_retryable(EndpointConnectionError(endpoint_url="https://email.us-west-2.amazonaws.com")))
+        self.assertTrue(is_retryable(ReadTimeoutError(endpoint_url="https://email.us-west-2.amazonaws.com")))
+
+    def test_unit_is_retryable_other_exception(self):
+        self.assertFalse(is_retryable(ValueError("fake value error")))
+
+
+# Testing the RetryPolicy class
+class TestRetryRetryPolicy(unittest.TestCase):
+
+    def test_unit_retry_policy_bad_max_attempts(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    @mock.patch("py_basic_ses.retry.time.sleep")
+    def test_unit_retry_policy_recovers(self, mock_sleep):
+        func = mock.Mock(side_effect=[client_error("Throttling"), client_error("Throttling"), "fakemsgID"])
+        self.assertEqual(RetryPolicy().call(func), ("fakemsgID", 3))
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @mock.patch("py_basic_ses.retry.time.sleep")
+    def test_unit_retry_policy_permanent_error(self, mock_sleep):
+        func = mock.Mock(side_effect=client_error("MessageRejected"))
+        with self.assertRaises(ClientError) as raised:
+            RetryPolicy().call(func)
+        self.assertEqual(raised.exception.attempts, 1)
+        mock_sleep.assert_not_called()
+
+    @mock.patch("py_basic_ses.retry.time.sleep")
+    def test_unit_retry_policy_max_attempts(self, mock_sleep):
+        func = mock.Mock(side_effect=client_error("Throttling"))
+        with self.assertRaises(ClientError) as raised:
+            RetryPolicy(max_attempts=3).call(func)
+        self.assertEqual(raised.exception.attempts, 3)
+        self.assertEqual(func.call_count, 3)
+
+    @mock.patch("py_basic_ses.retry.time.sleep")
+    def test_unit_retry_policy_max_elapsed(self, mock_sleep):
+        func = mock.Mock(side_effect=client_error("Throttling"))
+        with self.assertRaises(ClientError) as raised:
+            RetryPolicy(max_attempts=10, base_delay=1, max_elapsed=0.5).call(func)
+        self.assertEqual(raised.exception.attempts, 1)
+        mock_sleep.assert_not_called()
+
+    def test_unit_retry_policy_delay_bounds(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=2)
+        delay = policy.base_delay
+        for i in range(50):
+            delay = policy.next_delay(delay)
+            self.assertGreaterEqual(delay, 0.1)
+            self.assertLessEqual(delay, 2)
+
+
+# Testing SESSender with a retry policy
+class TestRetrySESSender(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    @mock.patch("py_basic_ses.retry.time.sleep")
+    def test_unit_send_email_result_reports_attempts(self, mock_sleep):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = [client_error("Throttling"), {"MessageId":"fakemsgID"}]
+                sender = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", retry_policy=RetryPolicy())
+                result = sender.send_email_result()
+                self.assertEqual(result.message_id, "fakemsgID")
+                self.assertEqual(result.attempts, 2)
+
+    def test_unit_send_email_no_policy_no_retry(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = client_error("Throttling")
+                sender = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2")
+                with self.assertRaises(ClientError):
+                    sender.send_email()
+                self.assertEqual(mock_botoclient.return_value.send_email.call_count, 1)
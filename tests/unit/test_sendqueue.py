@@ -0,0 +1,225 @@
+import os, sqlite3, tempfile, time, unittest, mock
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.suppression import SuppressionList
+
+# import the durable queue and drain worker, so we can test them
+from py_basic_ses.sendqueue import SendQueue, DrainWorker
+
+
+def fake_message(index):
+    return {"sendto": f"user{index}@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "aws_region": "us-west-2"}
+
+
+def claim_failing_once(claim):
+    # the first claim fails like a locked database, later ones work
+    calls = []
+    def fake_claim(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return claim(*args, **kwargs)
+    return fake_claim
+
+
+# Testing the SendQueue class
+class TestSendQueueSendQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.queue_dir.name, "queue.db")
+        self.queue = SendQueue(self.path)
+
+    def tearDown(self):
+        self.queue.close()
+        self.queue_dir.cleanup()
+
+    def test_unit_send_queue_enqueue_sender(self):
+        sender = SESSender(sendto=["one@domain.com", "two@domain.com"], fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", msgsubject="fake subject")
+        self.queue.enqueue(sender)
+        self.assertEqual(self.queue.depth(), 1)
+        queue_id, message, attempts = self.queue.claim(10)[0]
+        self.assertEqual(message, sender.to_dict())
+        self.assertEqual(attempts, 0)
+
+    def test_unit_send_queue_rejects_suppression_list(self):
+        # the suppression list can't be stored with the message, it belongs to the drain worker
+        sender = SESSender(sendto="one@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", suppression_list=SuppressionList(["one@domain.com"]))
+        with self.assertRaises(ValueError):
+            self.queue.enqueue(sender)
+        with self.assertRaises(ValueError):
+            self.queue.enqueue(dict(fake_message(0), suppression_list=SuppressionList(["user0@domain.com"])))
+        self.assertEqual(self.queue.depth(), 0)
+
+    def test_unit_send_queue_claim_leases(self):
+        for i in range(3):
+            self.queue.enqueue(fake_message(i))
+        self.assertEqual(len(self.queue.claim(2)), 2)
+        # the first two are leased, only the third is left to claim
+        remaining = self.queue.claim(10)
+        self.assertEqual([message["sendto"] for queue_id, message, attempts in remaining], ["user2@domain.com"])
+
+    def test_unit_send_queue_expired_lease_is_reclaimed(self):
+        # a worker that crashed mid send never acks, the message comes back once its lease runs out
+        self.queue.enqueue(fake_message(0))
+        self.queue.claim(10, lease_seconds=0)
+        self.assertEqual(len(self.queue.claim(10)), 1)
+
+    def test_unit_send_queue_survives_reopen(self):
+        self.queue.enqueue(fake_message(0))
+        self.queue.claim(10, lease_seconds=0)
+        self.queue.close()
+        self.queue = SendQueue(self.path)
+        self.assertEqual(self.queue.depth(), 1)
+        self.assertEqual(len(self.queue.claim(10)), 1)
+
+    def test_unit_send_queue_ack_and_fail(self):
+        first = self.queue.enqueue(fake_message(0))
+        second = self.queue.enqueue(fake_message(1))
+        self.queue.ack(first)
+        self.queue.fail(second, "fake error")
+        self.assertEqual(self.queue.depth(), 0)
+        self.assertEqual(self.queue.dead_count(), 1)
+        self.assertEqual(self.queue.dead_messages()[0][3], "fake error")
+
+    def test_unit_send_queue_fail_retry_later(self):
+        queue_id = self.queue.enqueue(fake_message(0))
+        self.queue.fail(queue_id, "fake error", retry_in=60)
+        self.assertEqual(self.queue.claim(10), [])
+        self.assertEqual(self.queue.depth(), 1)
+
+    def test_unit_send_queue_oldest_age(self):
+        self.assertEqual(self.queue.oldest_age(), 0.0)
+        with mock.patch("py_basic_ses.sendqueue.time.time", return_value=1000.0):
+            self.queue.enqueue(fake_message(0))
+        with mock.patch("py_basic_ses.sendqueue.time.time", return_value=1030.0):
+            self.assertEqual(self.queue.oldest_age(), 30.0)
+
+
+# Testing the DrainWorker class
+class TestSendQueueDrainWorker(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+        self.queue_dir = tempfile.TemporaryDirectory()
+        self.queue = SendQueue(os.path.join(self.queue_dir.name, "queue.db"))
+
+    def tearDown(self):
+        close_clients()
+        self.queue.close()
+        self.queue_dir.cleanup()
+
+    def test_unit_drain_worker_sends_and_acks(self):
+        for i in range(5):
+            self.queue.enqueue(fake_message(i))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                worker = DrainWorker(self.queue, max_workers=2)
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    while worker.drain_once(executor):
+                        pass
+                self.assertEqual(self.queue.depth(), 0)
+                self.assertEqual(worker.sent, 5)
+                self.assertGreater(worker.metrics()["drain_rate"], 0)
+
+    def test_unit_drain_worker_retryable_error(self):
+        queue_id = self.queue.enqueue(fake_message(0))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = ClientError({"Error": {"Code": "Throttling", "Message":"fake resp"}}, "SendEmail")
+                worker = DrainWorker(self.queue)
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    worker.drain_once(executor)
+                # still queued, waiting for its backoff
+                self.assertEqual(self.queue.depth(), 1)
+                self.assertEqual(self.queue.dead_count(), 0)
+                self.assertEqual(worker.failed, 1)
+
+    def test_unit_drain_worker_permanent_error(self):
+        self.queue.enqueue(fake_message(0))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = ClientError({"Error": {"Code": "MessageRejected", "Message":"fake resp"}}, "SendEmail")
+                worker = DrainWorker(self.queue)
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    worker.drain_once(executor)
+                self.assertEqual(self.queue.depth(), 0)
+                self.assertEqual(self.queue.dead_count(), 1)
+
+    def test_unit_drain_worker_partial_send_retries_rest(self):
+        self.queue.enqueue(dict(fake_message(0), sendto=[f"user{i}@domain.com" for i in range(60)]))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.side_effect = [{"MessageId":"fakemsgID1"}, ClientError({"Error": {"Code": "Throttling", "Message":"fake resp"}}, "SendEmail"),
+                                                                       {"MessageId":"fakemsgID2"}]
+                worker = DrainWorker(self.queue, base_delay=0)
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    worker.drain_once(executor)
+                    worker.drain_once(executor)
+                self.assertEqual(self.queue.depth(), 0)
+                # the retry only went to the 10 recipients the first chunk didn't cover
+                self.assertEqual(mock_botoclient.return_value.send_email.call_count, 3)
+                retried = mock_botoclient.return_value.send_email.call_args.kwargs["Destination"]["ToAddresses"]
+                self.assertEqual(retried, [f"user{i}@domain.com" for i in range(50, 60)])
+
+    def test_unit_drain_worker_keeps_backend(self):
+        self.queue.enqueue(SESSender(backend="sesv2", **fake_message(0)))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                worker = DrainWorker(self.queue)
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    worker.drain_once(executor)
+                self.assertEqual(self.queue.depth(), 0)
+                # sent through the SESv2 API, like the queued sender would have been
+                self.assertEqual(mock_botoclient.call_args.args[0], "sesv2")
+                self.assertIn("FromEmailAddress", mock_botoclient.return_value.send_email.call_args.kwargs)
+
+    def test_unit_drain_worker_background_thread(self):
+        for i in range(3):
+            self.queue.enqueue(fake_message(i))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                worker = DrainWorker(self.queue, poll_interval=0.01)
+                worker.start()
+                deadline = time.monotonic() + 5
+                while self.queue.depth() and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                worker.stop()
+                self.assertEqual(self.queue.depth(), 0)
+
+    def test_unit_drain_worker_ack_error(self):
+        self.queue.enqueue(fake_message(0))
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                worker = DrainWorker(self.queue)
+                with mock.patch.object(self.queue, "ack", side_effect=sqlite3.OperationalError("database is locked")):
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        self.assertEqual(worker.drain_once(executor), 1)
+                self.assertEqual(worker.queue_errors, 1)
+                self.assertIsInstance(worker.last_error, sqlite3.OperationalError)
+                # not acked, so it is sent again once its lease runs out
+                self.assertEqual(self.queue.depth(), 1)
+
+    def test_unit_drain_worker_survives_claim_error(self):
+        for i in range(3):
+            self.queue.enqueue(fake_message(i))
+        claim = self.queue.claim
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                worker = DrainWorker(self.queue, poll_interval=0.01)
+                with mock.patch.object(self.queue, "claim", side_effect=claim_failing_once(claim)):
+                    worker.start()
+                    deadline = time.monotonic() + 5
+                    while self.queue.depth() and time.monotonic() < deadline:
+                        time.sleep(0.01)
+                    self.assertTrue(worker.running)
+                    worker.stop()
+                self.assertEqual(self.queue.depth(), 0)
+                self.assertEqual(worker.queue_errors, 1)
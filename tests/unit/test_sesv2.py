@@ -0,0 +1,178 @@
+import json, unittest, mock
+from py_basic_ses.clients import close_clients
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.exceptions import BulkDestinationError, PayloadValidationError
+from py_basic_ses.retry import RetryPolicy
+from py_basic_ses.templating import CompiledTemplate
+from py_basic_ses.transports import FakeSESTransport
+
+# import the SESv2 bulk sender, so we can test it
+from py_basic_ses.sesv2 import BulkEmailSender, PASSTHROUGH_TEMPLATE_NAME, _PASSTHROUGH_TEMPLATE
+
+
+def message(index, **kwargs):
+    options = {"sendto": f"to{index}@domain.com", "msgsubject": f"subject {index}", "message_txt": f"text {index}"}
+    options.update(kwargs)
+    return options
+
+
+# Testing the backend and configuration_set options of SESSender
+class TestSESv2SESSenderBackend(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_backend_sesv2(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                          backend="sesv2", configuration_set="fake-set").send_email()
+                self.assertEqual(mock_botoclient.call_args.args[0], "sesv2")
+                kwargs = mock_botoclient.return_value.send_email.call_args.kwargs
+                self.assertEqual(kwargs["ConfigurationSetName"], "fake-set")
+                self.assertIn("Simple", kwargs["Content"])
+
+    def test_unit_backend_ses_configuration_set(self):
+        payload = SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                            configuration_set="fake-set").build_payload()
+        self.assertEqual(payload["ConfigurationSetName"], "fake-set")
+
+    def test_unit_backend_unknown(self):
+        with self.assertRaises(ValueError):
+            SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", backend="smtp")
+
+
+# Testing the BulkEmailSender class
+class TestSESv2BulkEmailSender(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_bulk_email_fewer_calls(self):
+        transport = FakeSESTransport()
+        results = list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport).send_bulk(message(i) for i in range(120)))
+        self.assertEqual([result.index for result in results], list(range(120)))
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(transport.calls, 3)
+        self.assertEqual(transport.messages_sent, 120)
+
+    def test_unit_bulk_email_entry_content(self):
+        transport = FakeSESTransport()
+        sender = SESSender(sendto="one@domain.com", cc="two@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                           msgsubject="fake subject", message_html="<p>{{not a placeholder}}</p>")
+        list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport, configuration_set="fake-set").send_bulk([sender]))
+        operation, payload = transport.sent[0]
+        self.assertEqual(payload["ConfigurationSetName"], "fake-set")
+        entry = payload["BulkEmailEntries"][0]
+        self.assertEqual(entry["Destination"], {"ToAddresses": ["one@domain.com"], "CcAddresses": ["two@domain.com"]})
+        data = json.loads(entry["ReplacementEmailContent"]["ReplacementTemplate"]["ReplacementTemplateData"])
+        self.assertEqual(data, {"subject": "fake subject", "text": "some text", "html": "<p>{{not a placeholder}}</p>"})
+
+    def test_unit_bulk_email_passthrough_renders_values_unchanged(self):
+        # render the passthrough template the way SES does (Handlebars, html escaped {{x}}, raw {{{x}}})
+        transport = FakeSESTransport()
+        sender = SESSender(sendto="one@domain.com", fromaddr="email@domain.com", message_txt="a < b & {{name}}", aws_region="us-west-2",
+                           msgsubject="Tom & Jerry", message_html="<p>{{not a placeholder}} &amp;</p>")
+        list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport).send_bulk([sender]))
+        entry = transport.sent[0][1]["BulkEmailEntries"][0]
+        data = json.loads(entry["ReplacementEmailContent"]["ReplacementTemplate"]["ReplacementTemplateData"])
+        rendered = {part: CompiledTemplate(source, escape_html=True).render(data) for part, source in _PASSTHROUGH_TEMPLATE.items()}
+        self.assertEqual(rendered, {"Subject": "Tom & Jerry", "Text": "a < b & {{name}}", "Html": "<p>{{not a placeholder}} &amp;</p>"})
+
+    def test_unit_bulk_email_stored_template(self):
+        transport = FakeSESTransport()
+        sender = BulkEmailSender("email@domain.com", "us-west-2", transport=transport)
+        list(sender.send_bulk([message(0)]))
+        list(sender.send_bulk([message(1)]))
+        self.assertEqual(transport.templates, {PASSTHROUGH_TEMPLATE_NAME: _PASSTHROUGH_TEMPLATE})
+        self.assertEqual(transport.sent[0][1]["DefaultContent"]["Template"]["TemplateName"], PASSTHROUGH_TEMPLATE_NAME)
+        self.assertEqual(transport.calls, 2)
+
+    def test_unit_bulk_email_existing_template(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_email.return_value = {"BulkEmailEntryResults": [{"Status": "SUCCESS", "MessageId": "fakemsgID"}]}
+                list(BulkEmailSender("email@domain.com", "us-west-2").send_bulk([message(0)]))
+                mock_botoclient.return_value.get_email_template.assert_called_once_with(TemplateName=PASSTHROUGH_TEMPLATE_NAME)
+                mock_botoclient.return_value.create_email_template.assert_not_called()
+
+    def test_unit_bulk_email_inline_template(self):
+        transport = FakeSESTransport()
+        list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport, template_name=None).send_bulk([message(0)]))
+        self.assertEqual(transport.templates, {})
+        self.assertEqual(transport.sent[0][1]["DefaultContent"]["Template"]["TemplateContent"], _PASSTHROUGH_TEMPLATE)
+
+    def test_unit_bulk_email_retries_transient_entries(self):
+        responses = [
+            {"BulkEmailEntryResults": [{"Status": "SUCCESS", "MessageId": "id0"}, {"Status": "TRANSIENT_FAILURE", "Error": "try again"},
+                                       {"Status": "MESSAGE_REJECTED", "Error": "rejected"}, {"Status": "ACCOUNT_THROTTLED", "Error": "slow down"}]},
+            {"BulkEmailEntryResults": [{"Status": "SUCCESS", "MessageId": "id1"}, {"Status": "ACCOUNT_THROTTLED", "Error": "slow down"}]},
+            {"BulkEmailEntryResults": [{"Status": "SUCCESS", "MessageId": "id3"}]},
+        ]
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_email.side_effect = responses
+                sender = BulkEmailSender("email@domain.com", "us-west-2", retry_policy=RetryPolicy(base_delay=0, max_delay=0))
+                results = list(sender.send_bulk([message(i) for i in range(4)]))
+                self.assertEqual([result.message_id for result in results], ["id0", "id1", None, "id3"])
+                self.assertEqual([result.attempts for result in results], [1, 2, 1, 3])
+                self.assertEqual(results[2].error.status, "MessageRejected")
+                calls = mock_botoclient.return_value.send_bulk_email.call_args_list
+                self.assertEqual([len(call.kwargs["BulkEmailEntries"]) for call in calls], [4, 2, 1])
+
+    def test_unit_bulk_email_no_entry_retries_without_policy(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_email.return_value = {"BulkEmailEntryResults": [{"Status": "TRANSIENT_FAILURE", "Error": "try again"}]}
+                results = list(BulkEmailSender("email@domain.com", "us-west-2").send_bulk([message(0)]))
+                self.assertEqual(results[0].error.status, "TransientFailure")
+                self.assertEqual(mock_botoclient.return_value.send_bulk_email.call_count, 1)
+
+    def test_unit_bulk_email_entry_status(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_email.return_value = {"BulkEmailEntryResults": [
+                    {"Status": "SUCCESS", "MessageId": "fakemsgID"}, {"Status": "ACCOUNT_DAILY_QUOTA_EXCEEDED", "Error": "fake error"}]}
+                results = list(BulkEmailSender("email@domain.com", "us-west-2").send_bulk([message(0), message(1)]))
+                self.assertEqual(mock_botoclient.call_args.args[0], "sesv2")
+                self.assertEqual(results[0].message_id, "fakemsgID")
+                self.assertIsInstance(results[1].error, BulkDestinationError)
+                self.assertEqual(results[1].error.status, "AccountDailyQuotaExceeded")
+
+    def test_unit_bulk_email_bad_message(self):
+        transport = FakeSESTransport()
+        results = list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport).send_bulk(
+            [message(0), message(1, fromaddr="other@domain.com"), message(2, sendto=None)]))
+        self.assertTrue(results[0].ok)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertIsInstance(results[2].error, ValueError)
+        self.assertEqual(len(transport.sent[0][1]["BulkEmailEntries"]), 1)
+
+    def test_unit_bulk_email_preflight(self):
+        transport = FakeSESTransport()
+        results = list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport).send_bulk(
+            [message(0), message(1, sendto="not an address"), message(2, sendto=[f"to{i}@domain.com" for i in range(51)])]))
+        self.assertTrue(results[0].ok)
+        self.assertEqual(results[1].error.errors[0].code, "invalid_address")
+        self.assertEqual(results[2].error.errors[0].code, "too_many_recipients")
+        self.assertIsInstance(results[2].error, PayloadValidationError)
+        self.assertEqual(results[1].attempts, 0)
+        self.assertEqual(len(transport.sent[0][1]["BulkEmailEntries"]), 1)
+
+    def test_unit_bulk_email_call_fails(self):
+        transport = FakeSESTransport()
+        transport.fail_next("MessageRejected")
+        results = list(BulkEmailSender("email@domain.com", "us-west-2", transport=transport).send_bulk([message(0), message(1)]))
+        self.assertTrue(all(not result.ok for result in results))
+
+    def test_unit_bulk_email_rate_limiter_counts_entries(self):
+        limiter = mock.Mock()
+        list(BulkEmailSender("email@domain.com", "us-west-2", transport=FakeSESTransport(), rate_limiter=limiter).send_bulk(message(i) for i in range(60)))
+        self.assertEqual([call.args[0] for call in limiter.acquire.call_args_list], [50, 10])
@@ -0,0 +1,98 @@
+import os, pickle, tempfile, unittest, mock
+from botocore.exceptions import ClientError
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.exceptions import SuppressedRecipientError
+from py_basic_ses.transports import FakeSESTransport
+
+# import the suppression list, so we can test it
+from py_basic_ses.suppression import SuppressionList, normalize_address, read_suppression_file, fetch_ses_suppressions
+
+
+# Testing normalize_address() and read_suppression_file()
+class TestSuppressionHelpers(unittest.TestCase):
+
+    def test_unit_normalize_address(self):
+        self.assertEqual(normalize_address(" Some.One@Domain.com "), "some.one@domain.com")
+        self.assertEqual(normalize_address("Some Name <Some.One@Domain.com>"), "some.one@domain.com")
+
+    def test_unit_read_suppression_file(self):
+        with tempfile.TemporaryDirectory() as suppression_dir:
+            path = os.path.join(suppression_dir, "suppressed.csv")
+            with open(path, "w") as suppression_file:
+                suppression_file.write("email,reason\n# a comment\n\none@domain.com,BOUNCE\n\"two@domain.com\"\n")
+            self.assertEqual(read_suppression_file(path), ["one@domain.com", "two@domain.com"])
+
+    def test_unit_fetch_ses_suppressions_pages(self):
+        registry = mock.Mock()
+        client = registry.get_client.return_value
+        client.list_suppressed_destinations.side_effect = [
+            {"SuppressedDestinationSummaries": [{"EmailAddress": "one@domain.com", "Reason": "BOUNCE"}], "NextToken": "page2"},
+            {"SuppressedDestinationSummaries": [{"EmailAddress": "two@domain.com", "Reason": "COMPLAINT"}]},
+        ]
+        self.assertEqual(fetch_ses_suppressions("us-west-2", client_registry=registry), ["one@domain.com", "two@domain.com"])
+        self.assertEqual(registry.get_client.call_args.kwargs["service"], "sesv2")
+        self.assertEqual(client.list_suppressed_destinations.call_args.kwargs["NextToken"], "page2")
+
+
+# Testing the SuppressionList class
+class TestSuppressionSuppressionList(unittest.TestCase):
+
+    def test_unit_suppression_list_filter(self):
+        suppression = SuppressionList(["One@Domain.com"])
+        self.assertIn("one@domain.com", suppression)
+        self.assertEqual(suppression.filter(["ONE@domain.com", "two@domain.com"]), (["two@domain.com"], ["ONE@domain.com"]))
+        suppression.add("two@domain.com")
+        self.assertEqual(len(suppression), 2)
+
+    def test_unit_suppression_list_refresh(self):
+        loader = mock.Mock(side_effect=[["one@domain.com"], ["two@domain.com"], ClientError({"Error": {"Code": "Throttling"}}, "ListSuppressedDestinations")])
+        with mock.patch("py_basic_ses.suppression.time.monotonic", return_value=0.0):
+            suppression = SuppressionList(loader=loader, refresh_interval=60)
+            suppression.add("added@domain.com")
+        with mock.patch("py_basic_ses.suppression.time.monotonic", return_value=30.0):
+            self.assertIn("one@domain.com", suppression)
+        with mock.patch("py_basic_ses.suppression.time.monotonic", return_value=61.0):
+            self.assertNotIn("one@domain.com", suppression)
+            self.assertIn("two@domain.com", suppression)
+            # added addresses survive a refresh
+            self.assertIn("added@domain.com", suppression)
+        with mock.patch("py_basic_ses.suppression.time.monotonic", return_value=122.0):
+            # a failed refresh keeps the old addresses
+            self.assertIn("two@domain.com", suppression)
+            self.assertIsInstance(suppression.last_error, ClientError)
+        self.assertEqual(loader.call_count, 3)
+
+    def test_unit_suppression_list_pickle(self):
+        suppression = pickle.loads(pickle.dumps(SuppressionList(loader=lambda: ["one@domain.com"])))
+        self.assertIn("one@domain.com", suppression)
+
+
+# Testing senders with a suppression list
+class TestSuppressionSenders(unittest.TestCase):
+
+    def test_unit_sessender_suppressed_recipients(self):
+        transport = FakeSESTransport()
+        result = SESSender(sendto=["one@domain.com", "two@domain.com"], bcc="three@domain.com", fromaddr="email@domain.com", message_txt="some text",
+                           aws_region="us-west-2", transport=transport, suppression_list=SuppressionList(["two@domain.com", "three@domain.com"])).send_email_result()
+        self.assertEqual(result.suppressed, ["two@domain.com", "three@domain.com"])
+        self.assertEqual(transport.sent[0][1]["Destination"], {"ToAddresses": ["one@domain.com"]})
+
+    def test_unit_sessender_all_suppressed(self):
+        transport = FakeSESTransport()
+        with self.assertRaises(SuppressedRecipientError) as error:
+            SESSender(sendto="one@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", transport=transport,
+                      suppression_list=SuppressionList(["one@domain.com"])).send_email()
+        self.assertEqual(error.exception.suppressed, ["one@domain.com"])
+        self.assertEqual(transport.calls, 0)
+
+    def test_unit_bulk_email_sender_suppressed(self):
+        from py_basic_ses.sesv2 import BulkEmailSender
+        transport = FakeSESTransport()
+        sender = BulkEmailSender("email@domain.com", "us-west-2", transport=transport, suppression_list=SuppressionList(["two@domain.com"]))
+        results = list(sender.send_bulk([
+            {"sendto": ["one@domain.com", "two@domain.com"], "message_txt": "some text"},
+            {"sendto": "two@domain.com", "message_txt": "some text"},
+        ]))
+        self.assertEqual(results[0].suppressed, ["two@domain.com"])
+        self.assertIsInstance(results[1].error, SuppressedRecipientError)
+        self.assertEqual(transport.messages_sent, 1)
@@ -0,0 +1,143 @@
+import json, unittest, mock
+from botocore.exceptions import ClientError
+from py_basic_ses.clients import close_clients
+from py_basic_ses.exceptions import BulkDestinationError, PayloadValidationError
+
+# import the template helpers, so we can test them
+from py_basic_ses.templating import CompiledTemplate, TemplateCache, EmailTemplate, BulkTemplateSender, render_template
+
+
+# Testing CompiledTemplate and render_template()
+class TestTemplatingCompiledTemplate(unittest.TestCase):
+
+    def test_unit_compiled_template_renders(self):
+        template = CompiledTemplate("Hi {{name}}, your order {{ order.id }} shipped.")
+        self.assertEqual(template.render({"name": "Sam", "order": {"id": 42}}), "Hi Sam, your order 42 shipped.")
+
+    def test_unit_compiled_template_no_placeholders(self):
+        self.assertEqual(CompiledTemplate("plain text").render({}), "plain text")
+
+    def test_unit_compiled_template_missing_value(self):
+        with self.assertRaises(KeyError):
+            CompiledTemplate("Hi {{name}}").render({})
+
+    def test_unit_compiled_template_escape_html(self):
+        data = {"name": "<b>Sam & Co</b>", "user": {"bio": "<i>hi</i>"}}
+        template = CompiledTemplate("<p>{{name}} {{{ name }}} {{{user.bio}}}</p>", escape_html=True)
+        self.assertEqual(template.render(data), "<p>&lt;b&gt;Sam &amp; Co&lt;/b&gt; <b>Sam & Co</b> <i>hi</i></p>")
+        # without escape_html both forms insert the value as is
+        self.assertEqual(CompiledTemplate("{{name}} {{{name}}}").render(data), "<b>Sam & Co</b> <b>Sam & Co</b>")
+
+    def test_unit_render_template(self):
+        self.assertEqual(render_template("{{a}}{{b}}", {"a": 1, "b": 2}), "12")
+
+
+# Testing the TemplateCache LRU
+class TestTemplatingTemplateCache(unittest.TestCase):
+
+    def test_unit_template_cache_compiles_once(self):
+        cache = TemplateCache()
+        self.assertIs(cache.get("Hi {{name}}"), cache.get("Hi {{name}}"))
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_unit_template_cache_evicts_least_recently_used(self):
+        cache = TemplateCache(maxsize=2)
+        first = cache.get("one")
+        cache.get("two")
+        cache.get("one")
+        cache.get("three")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        # "two" was evicted, "one" was used more recently and is still cached
+        self.assertIs(cache.get("one"), first)
+        self.assertEqual(cache.misses, 3)
+
+    def test_unit_template_cache_bad_maxsize(self):
+        with self.assertRaises(ValueError):
+            TemplateCache(maxsize=0)
+
+
+# Testing EmailTemplate
+class TestTemplatingEmailTemplate(unittest.TestCase):
+
+    def test_unit_email_template_sender(self):
+        template = EmailTemplate(subject="Hello {{name}}", text="Hi {{name}}", html="<p>Hi {{name}}</p>")
+        sender = template.sender("email@domain.com", "from@domain.com", "us-west-2", {"name": "Sam"})
+        self.assertEqual(sender.msgsubject, "Hello Sam")
+        self.assertEqual(sender.message_txt, "Hi Sam")
+        self.assertEqual(sender.message_html, "<p>Hi Sam</p>")
+
+    def test_unit_email_template_escapes_html_only(self):
+        template = EmailTemplate(subject="Hello {{name}}", text="Hi {{name}}", html="<p>Hi {{name}}</p>{{{footer}}}")
+        subject, text, html = template.render({"name": "<Sam>", "footer": "<hr>"})
+        self.assertEqual(subject, "Hello <Sam>")
+        self.assertEqual(text, "Hi <Sam>")
+        self.assertEqual(html, "<p>Hi &lt;Sam&gt;</p><hr>")
+
+    def test_unit_email_template_no_html(self):
+        self.assertEqual(EmailTemplate(subject="s", text="t").render({}), ("s", "t", None))
+
+
+# Testing BulkTemplateSender.send_bulk()
+class TestTemplatingBulkTemplateSender(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def fake_bulk_response(self, **kwargs):
+        return {"Status": [{"Status": "Success", "MessageId": destination["Destination"]["ToAddresses"][0]} for destination in kwargs["Destinations"]]}
+
+    def test_unit_send_bulk_chunks_by_50(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_templated_email.side_effect = self.fake_bulk_response
+                sender = BulkTemplateSender(fromaddr="from@domain.com", aws_region="us-west-2", template_name="welcome", default_data={"name": "friend"})
+                results = list(sender.send_bulk((f"user{i}@domain.com", {"name": f"user {i}"}) for i in range(120)))
+                self.assertEqual(mock_botoclient.return_value.send_bulk_templated_email.call_count, 3)
+                self.assertEqual([result.index for result in results], list(range(120)))
+                self.assertEqual(results[119].message_id, "user119@domain.com")
+
+                kwargs = mock_botoclient.return_value.send_bulk_templated_email.call_args_list[0].kwargs
+                self.assertEqual(kwargs["Template"], "welcome")
+                self.assertEqual(json.loads(kwargs["DefaultTemplateData"]), {"name": "friend"})
+                self.assertEqual(json.loads(kwargs["Destinations"][1]["ReplacementTemplateData"]), {"name": "user 1"})
+
+    def test_unit_send_bulk_maps_destination_errors(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_templated_email.return_value = {"Status": [
+                    {"Status": "Success", "MessageId": "fakemsgID"},
+                    {"Status": "MessageRejected", "Error": "Email address is not verified."},
+                ]}
+                sender = BulkTemplateSender(fromaddr="from@domain.com", aws_region="us-west-2", template_name="welcome")
+                results = list(sender.send_bulk(["user0@domain.com", "user1@domain.com"]))
+                self.assertEqual(results[0].message_id, "fakemsgID")
+                self.assertIsInstance(results[1].error, BulkDestinationError)
+                self.assertEqual(results[1].error.status, "MessageRejected")
+
+    def test_unit_send_bulk_preflight(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_templated_email.side_effect = self.fake_bulk_response
+                sender = BulkTemplateSender(fromaddr="from@domain.com", aws_region="us-west-2", template_name="welcome")
+                results = list(sender.send_bulk(["user0@domain.com", "not an address", "User Two <user2@domain.com>"]))
+                self.assertEqual([result.index for result in results], [0, 1, 2])
+                self.assertEqual(results[0].message_id, "user0@domain.com")
+                self.assertIsInstance(results[1].error, PayloadValidationError)
+                self.assertEqual(results[1].attempts, 0)
+                self.assertEqual(results[2].message_id, "User Two <user2@domain.com>")
+                kwargs = mock_botoclient.return_value.send_bulk_templated_email.call_args.kwargs
+                self.assertEqual(len(kwargs["Destinations"]), 2)
+
+    def test_unit_send_bulk_call_error(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_templated_email.side_effect = ClientError({"Error": {"Code": "TemplateDoesNotExist", "Message": "fake resp"}}, "SendBulkTemplatedEmail")
+                sender = BulkTemplateSender(fromaddr="from@domain.com", aws_region="us-west-2", template_name="missing")
+                results = list(sender.send_bulk(["user0@domain.com", "user1@domain.com"]))
+                self.assertEqual(len(results), 2)
+                self.assertTrue(all(isinstance(result.error, ClientError) for result in results))
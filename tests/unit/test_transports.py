@@ -0,0 +1,147 @@
+import email, io, os, socket, unittest, mock
+from botocore.exceptions import ClientError
+from py_basic_ses.clients import SESClientRegistry, close_clients
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.attachments import RawSESSender
+from py_basic_ses.templating import BulkTemplateSender
+from py_basic_ses.retry import RetryPolicy
+
+# import the transports, so we can test them
+from py_basic_ses.transports import FakeSESTransport, FakeSESServer, SESv2Transport
+
+
+def sender(**kwargs):
+    return SESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2", msgsubject="fake subject", **kwargs)
+
+
+# Testing the FakeSESTransport class
+class TestTransportsFakeSESTransport(unittest.TestCase):
+
+    def test_unit_fake_send_no_credentials_needed(self):
+        transport = FakeSESTransport()
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", side_effect=Exception("should not validate")) as mock_sesvalidate:
+            self.assertTrue(sender(transport=transport).send_email().startswith("fake-"))
+        operation, payload = transport.sent[0]
+        self.assertEqual(operation, "send_email")
+        self.assertEqual(payload["Destination"]["ToAddresses"], ["email@domain.com"])
+
+    def test_unit_fake_throttles(self):
+        transport = FakeSESTransport(max_send_rate=2)
+        sender(transport=transport).send_email()
+        sender(transport=transport).send_email()
+        with self.assertRaises(ClientError) as error:
+            sender(transport=transport).send_email()
+        self.assertEqual(error.exception.response["Error"]["Code"], "Throttling")
+        self.assertEqual(transport.metrics()["throttled"], 1)
+
+    def test_unit_fake_fail_next_with_retries(self):
+        transport = FakeSESTransport()
+        transport.fail_next("ServiceUnavailable", times=2, status_code=503)
+        with mock.patch("py_basic_ses.retry.time.sleep") as mock_sleep:
+            result = sender(transport=transport, retry_policy=RetryPolicy(max_attempts=3)).send_email_result()
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(transport.metrics(), {"calls": 3, "messages_sent": 1, "throttled": 0, "errors": 2})
+
+    def test_unit_fake_error_rate(self):
+        transport = FakeSESTransport(error_rate=1.0, error_code="InternalFailure")
+        with self.assertRaises(ClientError) as error:
+            sender(transport=transport).send_email()
+        self.assertEqual(error.exception.response["Error"]["Code"], "InternalFailure")
+
+    def test_unit_fake_latency(self):
+        with mock.patch("py_basic_ses.transports.time.sleep") as mock_sleep:
+            sender(transport=FakeSESTransport(latency=0.05)).send_email()
+            mock_sleep.assert_called_once_with(0.05)
+
+    def test_unit_fake_bulk_templated(self):
+        transport = FakeSESTransport()
+        bulk = BulkTemplateSender("email@domain.com", "us-west-2", "fake-template", transport=transport)
+        results = list(bulk.send_bulk([f"to{i}@domain.com" for i in range(60)]))
+        self.assertEqual(len(results), 60)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(transport.messages_sent, 60)
+
+
+# Testing the FakeSESServer class with the real boto3 client
+@mock.patch.dict(os.environ, {"AWS_ACCESS_KEY_ID": "fakekey", "AWS_SECRET_ACCESS_KEY": "fakesecret"})
+class TestTransportsFakeSESServer(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = FakeSESTransport()
+        self.server = FakeSESServer(self.transport).start()
+        self.registry = SESClientRegistry(endpoint_url=self.server.url)
+
+    def tearDown(self):
+        self.registry.close()
+        self.server.stop()
+
+    def test_unit_fake_server_send_email(self):
+        message_id = sender(cc=["cc@domain.com"], client_registry=self.registry).send_email()
+        self.assertTrue(message_id.startswith("fake-"))
+        operation, payload = self.transport.sent[0]
+        self.assertEqual(payload["Destination"], {"ToAddresses": ["email@domain.com"], "CcAddresses": ["cc@domain.com"]})
+        self.assertEqual(payload["Message"]["Subject"]["Data"], "fake subject")
+
+    def test_unit_fake_server_send_raw_email(self):
+        RawSESSender(sendto="email@domain.com", fromaddr="email@domain.com", message_txt="some text", aws_region="us-west-2",
+                     attachments=[io.BytesIO(b"some data")], client_registry=self.registry).send_email()
+        operation, payload = self.transport.sent[0]
+        self.assertEqual(operation, "send_raw_email")
+        self.assertEqual(email.message_from_bytes(payload["RawMessage"]["Data"])["To"], "email@domain.com")
+
+    def test_unit_fake_server_error(self):
+        self.transport.fail_next("MessageRejected", message="Email address is not verified.")
+        with self.assertRaises(ClientError) as error:
+            sender(client_registry=self.registry).send_email()
+        self.assertEqual(error.exception.response["Error"]["Code"], "MessageRejected")
+
+    def test_unit_fake_server_send_quota(self):
+        quota = self.registry.get_client("us-west-2").get_send_quota()
+        self.assertEqual(quota["Max24HourSend"], 50000.0)
+
+
+# Testing the FakeSESServer connection backlog
+class TestTransportsFakeSESServerBacklog(unittest.TestCase):
+
+    def test_unit_fake_server_backlog(self):
+        # before start() nothing accepts, so every connection has to wait in the listen backlog
+        server = FakeSESServer()
+        host, port = server._server.server_address[:2]
+        connections = []
+        try:
+            for _ in range(64):
+                connections.append(socket.create_connection((host, port), timeout=0.5))
+        finally:
+            for connection in connections:
+                connection.close()
+            server.stop()
+        self.assertEqual(len(connections), 64)
+
+
+# Testing the SESv2Transport class
+class TestTransportsSESv2Transport(unittest.TestCase):
+
+    def setUp(self):
+        close_clients()
+
+    def tearDown(self):
+        close_clients()
+
+    def test_unit_sesv2_send_email(self):
+        with mock.patch("py_basic_ses.emailing.SESSender.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_email.return_value = {"MessageId":"fakemsgID"}
+                self.assertEqual(sender(transport=SESv2Transport()).send_email(), "fakemsgID")
+                self.assertEqual(mock_botoclient.call_args.args[0], "sesv2")
+                kwargs = mock_botoclient.return_value.send_email.call_args.kwargs
+                self.assertEqual(kwargs["FromEmailAddress"], "email@domain.com")
+                self.assertEqual(kwargs["Content"]["Simple"]["Subject"]["Data"], "fake subject")
+
+    def test_unit_sesv2_bulk_status(self):
+        with mock.patch("py_basic_ses.emailing.SESBase.ses_validate", return_value=True) as mock_sesvalidate:
+            with mock.patch("py_basic_ses.clients.boto3.client") as mock_botoclient:
+                mock_botoclient.return_value.send_bulk_email.return_value = {"BulkEmailEntryResults": [
+                    {"Status": "SUCCESS", "MessageId": "fakemsgID"}, {"Status": "MESSAGE_REJECTED", "Error": "fake error"}]}
+                results = list(BulkTemplateSender("email@domain.com", "us-west-2", "fake-template", transport=SESv2Transport()).send_bulk(["one@domain.com", "two@domain.com"]))
+                self.assertEqual(results[0].message_id, "fakemsgID")
+                self.assertEqual(results[1].error.status, "MessageRejected")
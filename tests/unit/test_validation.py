@@ -0,0 +1,111 @@
+import pickle, unittest
+from py_basic_ses.emailing import SESSender
+from py_basic_ses.exceptions import PayloadValidationError
+from py_basic_ses.message import EmailMessage
+from py_basic_ses.transports import FakeSESTransport
+
+# import the preflight checks, so we can test them
+from py_basic_ses.validation import FieldError, validate_message, validate_many, is_valid_address, utf8_size
+
+
+def message(**kwargs):
+    options = {"sendto": "one@domain.com", "fromaddr": "email@domain.com", "message_txt": "some text", "msgsubject": "fake subject"}
+    options.update(kwargs)
+    return options
+
+
+def codes(errors):
+    return [(error.field, error.code) for error in errors]
+
+
+# Testing the address and size helpers
+class TestValidationHelpers(unittest.TestCase):
+
+    def test_unit_is_valid_address(self):
+        for address in ("one@domain.com", "first.last+tag@sub.domain.co.uk", "o'brien@xn--bcher-kva.example", "Jane Doe <jane@example.com>",
+                        '"Doe, Jane" <jane@example.com>', "<jane@example.com>"):
+            self.assertTrue(is_valid_address(address), address)
+        for address in ("myaddress", "one@domain", "one@@domain.com", ".one@domain.com", "one@-domain.com", "one two@domain.com",
+                        "one@domain.com\r\nBcc: x@domain.com", "ü@domain.com", "x" * 65 + "@domain.com", "Jane <bad>",
+                        "Jane <jane@example.com> extra", "Jane\r\n <jane@example.com>", None):
+            self.assertFalse(is_valid_address(address), address)
+
+    def test_unit_utf8_size(self):
+        self.assertEqual(utf8_size("abc"), 3)
+        self.assertEqual(utf8_size("é" * 100000), 200000)
+        with self.assertRaises(UnicodeEncodeError):
+            utf8_size("bad \ud800 text")
+
+
+# Testing validate_message()
+class TestValidationValidateMessage(unittest.TestCase):
+
+    def test_unit_validate_message_ok(self):
+        self.assertEqual(validate_message(message(cc=["two@domain.com"], message_html="<p>some html</p>")), [])
+        self.assertEqual(validate_message(EmailMessage("one@domain.com", "email@domain.com", "some text")), [])
+
+    def test_unit_validate_message_display_names(self):
+        self.assertEqual(validate_message(message(sendto="Jane Doe <jane@example.com>", cc=["Bob <bob@example.com>"], fromaddr="Sender <email@domain.com>")), [])
+
+    def test_unit_validate_message_addresses(self):
+        errors = validate_message(message(sendto=["one@domain.com", "not an address"], bcc="also bad", fromaddr="myaddress"))
+        self.assertEqual(codes(errors), [("sendto", "invalid_address"), ("bcc", "invalid_address"), ("fromaddr", "invalid_address")])
+        self.assertEqual(errors[0].value, "not an address")
+
+    def test_unit_validate_message_recipient_counts(self):
+        self.assertEqual(codes(validate_message(message(sendto=None))), [("sendto", "no_recipients")])
+        many = [f"user{i}@domain.com" for i in range(51)]
+        self.assertEqual(validate_message(message(sendto=many)), [])
+        self.assertEqual(codes(validate_message(message(sendto=many), max_recipients=50)), [("sendto", "too_many_recipients")])
+
+    def test_unit_validate_message_header_injection(self):
+        errors = validate_message(message(msgsubject="hi\r\nBcc: victim@domain.com", fromname="name\n"))
+        self.assertEqual(codes(errors), [("fromname", "header_injection"), ("msgsubject", "header_injection")])
+
+    def test_unit_validate_message_content(self):
+        self.assertEqual(codes(validate_message(message(message_txt=None))), [("message_txt", "missing")])
+        self.assertEqual(codes(validate_message(message(message_html="bad \udc80"))), [("message_html", "invalid_utf8")])
+        self.assertEqual(codes(validate_message(message(message_txt=b"bytes"))), [("message_txt", "not_text")])
+
+    def test_unit_validate_message_size(self):
+        # without html the text body is sent twice, base64 adds a third
+        text = "x" * (4 * 1024 * 1024)
+        self.assertEqual(codes(validate_message(message(message_txt=text))), [("message_txt", "too_large")])
+        self.assertEqual(validate_message(message(message_txt=text, message_html="<p>short</p>")), [])
+        self.assertEqual(validate_message(message(message_txt=text), max_size=None), [])
+
+    def test_unit_validate_many(self):
+        results = list(validate_many([message(), message(sendto="bad")]))
+        self.assertEqual([index for index, _, errors in results if errors], [1])
+
+
+# Testing preflight in SESSender
+class TestValidationSESSender(unittest.TestCase):
+
+    def test_unit_sessender_preflight_fails_fast(self):
+        transport = FakeSESTransport()
+        with self.assertRaises(PayloadValidationError) as error:
+            SESSender(aws_region="us-west-2", transport=transport, **message(sendto="bad")).send_email()
+        self.assertEqual(error.exception.errors, [FieldError("sendto", "invalid_address", "", "bad")])
+        self.assertIsInstance(error.exception, ValueError)
+        self.assertEqual(transport.calls, 0)
+
+    def test_unit_sessender_preflight_display_name(self):
+        transport = FakeSESTransport()
+        SESSender(aws_region="us-west-2", transport=transport, **message(sendto="Jane Doe <jane@example.com>")).send_email()
+        self.assertEqual(transport.calls, 1)
+
+    def test_unit_sessender_preflight_off(self):
+        transport = FakeSESTransport()
+        SESSender(aws_region="us-west-2", transport=transport, preflight=False, **message(sendto="bad")).send_email()
+        self.assertEqual(transport.calls, 1)
+
+    def test_unit_sessender_preflight_sesv2_limit(self):
+        text = "x" * (4 * 1024 * 1024)
+        self.assertEqual(len(SESSender(aws_region="us-west-2", **message(message_txt=text)).preflight_check()), 1)
+        self.assertEqual(SESSender(aws_region="us-west-2", backend="sesv2", **message(message_txt=text)).preflight_check(), [])
+
+    def test_unit_payload_validation_error_pickle(self):
+        error = pickle.loads(pickle.dumps(PayloadValidationError([FieldError("sendto", "invalid_address", "bad address", "bad")])))
+        self.assertEqual(error.errors[0].code, "invalid_address")
+        self.assertIn("sendto: bad address", str(error))